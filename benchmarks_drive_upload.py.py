@@ -0,0 +1,291 @@
+"""
+Benchmark per-upload latency of upload_to_drive against a local stub Drive server.
+
+Compares a fresh DriveClientPool per upload ("unpooled": credentials,
+discovery client and access token rebuilt every time) with one shared pool
+("pooled"). Only the client pool differs between the two; the upload
+journal, tracing and the streamed upload body are the same in both, so the
+difference is the cost of building clients and fetching tokens alone, not
+of the pre-pool upload path as a whole.
+
+Usage:
+    python -m benchmarks.drive_upload --uploads 20 --latency 0.05
+"""
+import os
+import ssl
+import json
+import time
+import uuid
+import datetime
+import shutil
+import argparse
+import tempfile
+import statistics
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import httplib2
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.oauth2 import service_account
+
+from config import CONFIG
+from modules import storage
+
+class StubDriveHandler(BaseHTTPRequestHandler):
+    """
+    Minimal imitation of the OAuth token, Drive resumable upload, permissions,
+    files.get and batch endpoints.
+
+    Resumable sessions follow the real protocol closely enough to exercise
+    chunked uploads: partial chunks get a 308 with the committed Range, and a
+    "bytes */total" status query reports how much of a session has arrived.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send_batch(self, body):
+        # Answer every call of a multipart/mixed batch request with a canned 200
+        boundary = self.headers['Content-Type'].split('boundary=')[1].strip('"')
+        parts = []
+        for part in body.decode('utf-8').replace('\r\n', '\n').split(f"--{boundary}")[1:-1]:
+            headers, _, inner = part.strip('\n').partition('\n\n')
+            headers = headers.replace('\n ', ' ')
+            content_id = next(
+                line.split(':', 1)[1].strip()
+                for line in headers.splitlines()
+                if line.lower().startswith('content-id')
+            ).strip('<>')
+            method, inner_path, _ = inner.splitlines()[0].split(' ')
+            self.server.count('batched_permission' if inner_path.split('?')[0].endswith('/permissions') else 'batched_get')
+            payload = json.dumps({'id': inner_path.split('/')[4].split('?')[0], 'trashed': False})
+            parts.append(
+                f"--batch_stub\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{payload}\r\n"
+            )
+
+        response = (''.join(parts) + "--batch_stub--\r\n").encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/mixed; boundary=batch_stub')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.server.count('get')
+        file_id = urlparse(self.path).path.rstrip('/').split('/')[-1]
+        self._send_json(200, {'id': file_id, 'trashed': False})
+
+    def do_POST(self):
+        body = self._read_body()
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+
+        if url.path.startswith('/batch/'):
+            self.server.count('batch')
+            self._send_batch(body)
+        elif url.path == '/token':
+            self.server.count('token')
+            self._send_json(200, {'access_token': uuid.uuid4().hex, 'expires_in': 3600, 'token_type': 'Bearer'})
+        elif url.path.endswith('/files') and 'resumable' in parse_qs(url.query).get('uploadType', []):
+            self.server.count('upload_session')
+            upload_id = uuid.uuid4().hex
+            location = f"https://{self.headers['Host']}{url.path}?uploadType=resumable&upload_id={upload_id}"
+            self._send_json(200, {}, headers={'Location': location})
+        elif url.path.endswith('/permissions'):
+            self.server.count('permission')
+            self._send_json(200, {'id': 'anyoneWithLink', 'type': 'anyone', 'role': 'reader'})
+        else:
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+    def do_PUT(self):
+        body = self._read_body()
+        time.sleep(self.server.latency)
+        self.server.count('upload_chunk')
+
+        # Content-Range is "bytes first-last/total" for data or "bytes */total" for a status query
+        upload_id = parse_qs(urlparse(self.path).query)['upload_id'][0]
+        byte_range, total = self.headers.get('Content-Range', 'bytes */0')[len('bytes '):].split('/')
+        total = int(total)
+        received = self.server.sessions.get(upload_id, 0)
+        if byte_range != '*':
+            first = int(byte_range.split('-')[0])
+            received = max(received, first + len(body))
+            self.server.sessions[upload_id] = received
+
+        if received >= total:
+            self._send_json(200, {'id': upload_id[:28]})
+        else:
+            headers = {'Range': f"bytes=0-{received - 1}"} if received else {}
+            self._send_json(308, {}, headers=headers)
+
+def self_signed_context(workdir):
+    """
+    Create a TLS server context with a throwaway certificate for 127.0.0.1.
+
+    googleapiclient keeps the https scheme of the media upload URL even when
+    api_endpoint points elsewhere, so the stub has to speak TLS.
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, '127.0.0.1')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+
+    cert_path = os.path.join(workdir, 'stub.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()
+        ))
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path)
+    return context
+
+class StubDriveServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, ssl_context, latency=0.0, handler=StubDriveHandler):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.socket = ssl_context.wrap_socket(self.socket, server_side=True)
+        self.latency = latency
+        self.sessions = {}
+        self.calls = {}
+        self._calls_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"https://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, name):
+        with self._calls_lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+def fake_service_account_info(token_uri):
+    """
+    Build a throwaway service account whose tokens are minted by the stub server.
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_key = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode('utf-8')
+    return {
+        'type': 'service_account',
+        'client_email': 'bench@example.iam.gserviceaccount.com',
+        'private_key': private_key,
+        'private_key_id': 'bench',
+        'token_uri': token_uri,
+    }
+
+def stub_http():
+    """
+    Unverified-TLS transport that, like googleapiclient's build_http, treats 308 as a status.
+    """
+    http = httplib2.Http(disable_ssl_certificate_validation=True)
+    http.redirect_codes = http.redirect_codes - {308}
+    return http
+
+def run(mode, server, file_path, uploads):
+    """
+    Upload file_path repeatedly and return per-upload latencies in seconds.
+
+    mode is "unpooled" to replace the client pool before every upload, or
+    "pooled" to keep one pool for the whole run.
+    """
+    credentials_info = fake_service_account_info(f"{server.url}/token")
+
+    def new_pool():
+        return storage.DriveClientPool(
+            credentials_factory=lambda: service_account.Credentials.from_service_account_info(
+                credentials_info, scopes=storage.DRIVE_SCOPES
+            ),
+            client_options={'api_endpoint': f"{server.url}/drive/v3/"},
+            http_factory=stub_http
+        )
+
+    storage._drive_pool = new_pool()
+    latencies = []
+    for _ in range(uploads):
+        if mode == 'unpooled':
+            storage._drive_pool = new_pool()
+        start = time.perf_counter()
+        storage.upload_to_drive(file_path)
+        latencies.append(time.perf_counter() - start)
+
+    storage._drive_pool = None
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--uploads', type=int, default=20, help="Uploads per mode")
+    parser.add_argument('--latency', type=float, default=0.02, help="Stub server latency per request (s)")
+    parser.add_argument('--size', type=int, default=1024 * 1024, help="Upload size in bytes")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    # Every upload sends the same file, so dedup would turn all but the first
+    # into cache hits; keep upload state out of the repo as well
+    CONFIG.update({
+        'DRIVE_DEDUP': False,
+        'DRIVE_UPLOAD_CACHE_PATH': os.path.join(workdir, 'drive_upload_cache.json'),
+        'UPLOAD_JOURNAL_PATH': os.path.join(workdir, 'upload_journal.json')
+    })
+    storage._upload_cache = None
+    server = StubDriveServer(self_signed_context(workdir), latency=args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    video_path = os.path.join(workdir, 'render.mp4')
+    with open(video_path, 'wb') as f:
+        f.write(os.urandom(args.size))
+
+    try:
+        for mode in ('unpooled', 'pooled'):
+            server.calls = {}
+            latencies = run(mode, server, video_path, args.uploads)
+            print(
+                f"{mode:>8}: mean {statistics.mean(latencies) * 1000:.1f} ms, "
+                f"median {statistics.median(latencies) * 1000:.1f} ms, "
+                f"max {max(latencies) * 1000:.1f} ms, "
+                f"token fetches {server.calls.get('token', 0)}"
+            )
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+    main()
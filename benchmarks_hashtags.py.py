@@ -0,0 +1,56 @@
+"""
+Micro-benchmark hashtag selection: list-based sampling vs HashtagSampler.
+
+The list-based version is the original caption generator logic: random.sample
+over the raw pools plus a random long word from the title, with no
+deduplication. Both are timed on the default templates, and the share of
+hashtag lists containing a duplicate tag is reported for each.
+
+Usage:
+    python -m benchmarks.hashtags --draws 100000
+"""
+import random
+import argparse
+import timeit
+
+from modules.caption_generator import DEFAULT_TEMPLATES, DEFAULT_HASHTAGS, CompiledTemplates
+
+TITLE = "Delhi metro mein amazing shaadi dance"
+
+def list_hashtags(content_type, title):
+    hashtags = random.sample(DEFAULT_HASHTAGS["common"], 3)
+    hashtags.extend(random.sample(DEFAULT_HASHTAGS[content_type], 2))
+    keywords = [word for word in title.split() if len(word) > 3]
+    if keywords:
+        keyword = ''.join(c for c in random.choice(keywords).lower() if c.isalnum())
+        if keyword:
+            hashtags.append(f"#{keyword}")
+    return hashtags
+
+def duplicate_rate(draw, draws):
+    duplicates = 0
+    for _ in range(draws):
+        hashtags = draw()
+        duplicates += len(set(hashtags)) != len(hashtags)
+    return duplicates / draws
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--draws', type=int, default=100000, help="Hashtag lists drawn per method")
+    args = parser.parse_args()
+
+    templates = CompiledTemplates({"templates": DEFAULT_TEMPLATES, "hashtags": DEFAULT_HASHTAGS})
+    methods = {
+        'list': lambda: list_hashtags("youtube", TITLE),
+        'sampler': lambda: templates.hashtags("youtube", TITLE),
+    }
+
+    for name, draw in methods.items():
+        seconds = min(timeit.repeat(draw, number=args.draws, repeat=3))
+        print(
+            f"{name:>7}: {seconds / args.draws * 1e6:.2f} us per list, "
+            f"duplicates in {duplicate_rate(draw, args.draws):.2%} of lists"
+        )
+
+if __name__ == '__main__':
+    main()
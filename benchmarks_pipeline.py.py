@@ -0,0 +1,395 @@
+"""
+End-to-end publish benchmark against local stubs of every platform API.
+
+Each video is uploaded with upload_to_drive and then posted with every
+post_to_* function, the posts running concurrently as in publish_all. The
+stub server imitates the Drive upload and permission endpoints, the YouTube
+videos.insert resumable upload, the Graph API Facebook /videos and Instagram
+Reels endpoints and LinkedIn ugcPosts, with configurable latency and
+injected 503 failures per platform.
+
+Reports p50/p95 latency per stage, videos/hour and bytes/s, and writes the
+results as JSON; --compare prints the change against an earlier results file.
+
+Usage:
+    python -m benchmarks.pipeline --videos 20 --latency 0.02 --latency youtube=0.1 --failure-rate 0.05
+    python -m benchmarks.pipeline --compare bench_pipeline_20260101-120000.json
+"""
+import os
+import json
+import math
+import time
+import uuid
+import random
+import shutil
+import argparse
+import datetime
+import tempfile
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+import google_auth_httplib2
+import google.oauth2.credentials
+from google.oauth2 import service_account
+from googleapiclient.discovery import build_from_document
+
+from config import CONFIG
+from modules import rate_limit, resumable, retry, social_media, storage
+from modules.http import get_session
+from benchmarks.drive_upload import (
+    StubDriveHandler,
+    StubDriveServer,
+    fake_service_account_info,
+    self_signed_context,
+    stub_http,
+)
+
+PLATFORMS = ('drive', 'youtube', 'facebook', 'instagram', 'linkedin')
+
+# IDs the stub uses to tell Facebook page calls from Instagram account calls
+FACEBOOK_PAGE_ID = 'bench-page'
+INSTAGRAM_USER_ID = 'bench-ig'
+
+def platform_of(path):
+    """
+    Return which platform a stub request path belongs to.
+    """
+    if path.startswith(('/upload/youtube/', '/youtube/')):
+        return 'youtube'
+    if path.startswith('/ig-api-upload/'):
+        return 'instagram'
+    if path.startswith('/v18.0/'):
+        return 'facebook' if path.startswith(f"/v18.0/{FACEBOOK_PAGE_ID}/") else 'instagram'
+    if path.startswith('/v2/'):
+        return 'linkedin'
+    return 'drive'
+
+class StubPlatformHandler(StubDriveHandler):
+    """
+    StubDriveHandler plus the YouTube, Graph API and LinkedIn endpoints.
+
+    Every request first sleeps for its platform's latency and then fails with
+    a 503 at the platform's failure rate; the rest is answered like the real API.
+    """
+
+    def _inject(self):
+        platform = platform_of(urlparse(self.path).path)
+        time.sleep(self.server.latencies.get(platform, 0.0))
+        if random.random() < self.server.failure_rates.get(platform, 0.0):
+            self._read_body()
+            self.server.count(f"{platform}_injected_failure")
+            self._send_json(503, {'error': {'code': 503, 'message': 'Injected failure'}})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._inject():
+            return
+        path = urlparse(self.path).path
+        if path.startswith('/v18.0/'):
+            # Instagram container status; processing is instant
+            self.server.count('instagram_status')
+            self._send_json(200, {'status_code': 'FINISHED', 'status': 'Finished'})
+        else:
+            super().do_GET()
+
+    def do_POST(self):
+        if not self._inject():
+            return
+        path = urlparse(self.path).path
+        platform = platform_of(path)
+
+        if platform == 'youtube':
+            self._read_body()
+            self.server.count('youtube_upload_session')
+            upload_id = uuid.uuid4().hex
+            location = f"https://{self.headers['Host']}{path}?uploadType=resumable&upload_id={upload_id}"
+            self._send_json(200, {}, headers={'Location': location})
+        elif platform == 'facebook':
+            self._read_body()
+            self.server.count('facebook_video')
+            self._send_json(200, {'id': uuid.uuid4().hex[:15]})
+        elif platform == 'instagram' and path.startswith('/ig-api-upload/'):
+            # Video bytes for a resumable Reels container, sent in one request
+            self._read_body()
+            self.server.count('instagram_upload')
+            self._send_json(200, {'success': True, 'message': 'Upload successful.'})
+        elif platform == 'instagram':
+            self._read_body()
+            self.server.count('instagram_publish' if path.endswith('/media_publish') else 'instagram_container')
+            self._send_json(200, {'id': uuid.uuid4().hex[:17]})
+        elif platform == 'linkedin':
+            self._read_body()
+            self.server.count('linkedin_post')
+            self._send_json(201, {'id': f"urn:li:share:{uuid.uuid4().int % 10 ** 19}"})
+        else:
+            super().do_POST()
+
+    def do_PUT(self):
+        # Resumable upload chunks; YouTube sessions follow the same protocol as Drive
+        if not self._inject():
+            return
+        super().do_PUT()
+
+class StubPlatformServer(StubDriveServer):
+    def __init__(self, ssl_context, latencies, failure_rates):
+        super().__init__(ssl_context, handler=StubPlatformHandler)
+        self.latencies = latencies
+        self.failure_rates = failure_rates
+
+def per_platform(values, option):
+    """
+    Parse repeated "SECONDS" / "PLATFORM=SECONDS" options into a platform -> value dict.
+    """
+    result = dict.fromkeys(PLATFORMS, 0.0)
+    for value in values or []:
+        platform, _, number = value.rpartition('=')
+        if platform and platform not in PLATFORMS:
+            raise SystemExit(f"{option}: unknown platform {platform!r}")
+        for name in ([platform] if platform else PLATFORMS):
+            result[name] = float(number)
+    return result
+
+def configure(server, workdir, retry_delay):
+    """
+    Point storage and social_media at the stub server and keep their state in workdir.
+
+    Rate limits are lifted, since they would measure the limiter rather than
+    the pipeline, and retry backoff is scaled down to retry_delay.
+    """
+    CONFIG.update({
+        'GOOGLE_DRIVE_FOLDER_ID': '',
+        'DRIVE_SHARE_MODE': 'file',
+        'DRIVE_UPLOAD_CACHE_PATH': os.path.join(workdir, 'drive_upload_cache.json'),
+        'UPLOAD_JOURNAL_PATH': os.path.join(workdir, 'upload_journal.json'),
+        'IDEMPOTENCY_LEDGER_PATH': os.path.join(workdir, 'post_ledger.json'),
+        'RESULTS_STORE_PATH': os.path.join(workdir, 'post_results.jsonl'),
+        'YOUTUBE_DISCOVERY_CACHE': os.path.join(workdir, 'youtube_v3_discovery.json'),
+        'FACEBOOK_ACCESS_TOKEN': 'bench',
+        'FACEBOOK_PAGE_ID': FACEBOOK_PAGE_ID,
+        'INSTAGRAM_ACCESS_TOKEN': 'bench',
+        'INSTAGRAM_USER_ID': INSTAGRAM_USER_ID,
+        'LINKEDIN_ACCESS_TOKEN': 'bench'
+    })
+
+    # Drive
+    credentials_info = fake_service_account_info(f"{server.url}/token")
+    storage._drive_pool = storage.DriveClientPool(
+        credentials_factory=lambda: service_account.Credentials.from_service_account_info(
+            credentials_info, scopes=storage.DRIVE_SCOPES
+        ),
+        client_options={'api_endpoint': f"{server.url}/drive/v3/"},
+        http_factory=stub_http
+    )
+    storage._upload_cache = None
+
+    # YouTube, with a token that stays valid for the whole run
+    credentials = google.oauth2.credentials.Credentials(
+        token='bench',
+        expiry=datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(days=1)
+    )
+    youtube = social_media.get_youtube_client()
+    youtube._credentials = credentials
+    youtube._youtube = build_from_document(
+        social_media._load_youtube_discovery_document(),
+        http=google_auth_httplib2.AuthorizedHttp(credentials, http=stub_http()),
+        client_options={'api_endpoint': f"{server.url}/"}
+    )
+
+    # Graph API and LinkedIn go through the shared requests session for the stub host
+    social_media.GRAPH_API_URL = f"{server.url}/v18.0"
+    social_media.INSTAGRAM_UPLOAD_URL = f"{server.url}/ig-api-upload/v18.0"
+    social_media.LINKEDIN_API_URL = f"{server.url}/v2"
+    session = get_session(server.url)
+    session.verify = False
+    # Otherwise REQUESTS_CA_BUNDLE from the environment overrides verify=False
+    session.trust_env = False
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    unlimited = {platform: (1e9, 1e9) for platform in PLATFORMS}
+    rate_limit._rate_limiter = rate_limit.RateLimiter(
+        rate_limit.QuotaLedger(os.path.join(workdir, 'quota_ledger.json')),
+        rates=unlimited,
+        quotas={platform: 10 ** 12 for platform in PLATFORMS}
+    )
+
+    retry.RETRY_POLICIES = {
+        error_class: policy._replace(
+            base_delay=min(policy.base_delay, retry_delay),
+            max_delay=min(policy.max_delay, retry_delay * 8)
+        )
+        for error_class, policy in retry.RETRY_POLICIES.items()
+    }
+    resumable.RETRY_BASE_DELAY = retry_delay
+
+def publish_video(video_path, index, posters, timings):
+    """
+    Upload one video to Drive and post it everywhere, recording each stage in timings.
+
+    Returns:
+        int: Bytes sent for this video
+    """
+    caption = f"Benchmark video {index} #bench"
+    start = time.perf_counter()
+    try:
+        _, link = storage.upload_to_drive(video_path)
+    except Exception:
+        timings['drive'].append((time.perf_counter() - start, False))
+        timings['video'].append((time.perf_counter() - start, False))
+        return 0
+    timings['drive'].append((time.perf_counter() - start, True))
+    bytes_sent = os.path.getsize(video_path)
+
+    post = {
+        'youtube': lambda: social_media.post_to_youtube(
+            video_path, f"Benchmark {index}", caption, progress_callback=None
+        ),
+        'facebook': lambda: social_media.post_to_facebook(link, caption),
+        # Without video_url the Reel is uploaded from the file, as the pipeline does
+        'instagram': lambda: social_media.post_to_instagram(video_path, caption),
+        'linkedin': lambda: social_media.post_to_linkedin(link, caption)
+    }
+
+    def timed(platform):
+        post_start = time.perf_counter()
+        result = post[platform]()
+        return platform, time.perf_counter() - post_start, result
+
+    with ThreadPoolExecutor(max_workers=len(posters)) as executor:
+        outcomes = list(executor.map(timed, posters))
+
+    for platform, elapsed, result in outcomes:
+        timings[platform].append((elapsed, result.success))
+        bytes_sent += result.bytes_sent
+    timings['video'].append((time.perf_counter() - start, all(result for _, _, result in outcomes)))
+    return bytes_sent
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of a sorted list
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+def summarize(samples):
+    latencies = sorted(elapsed for elapsed, _ in samples)
+    return {
+        'count': len(samples),
+        'failures': sum(1 for _, success in samples if not success),
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'mean': sum(latencies) / len(latencies) if latencies else None,
+        'max': latencies[-1] if latencies else None
+    }
+
+def run(args):
+    latencies = per_platform(args.latency, '--latency')
+    failure_rates = per_platform(args.failure_rate, '--failure-rate')
+    posters = [platform for platform in PLATFORMS[1:] if platform in args.platforms]
+
+    workdir = tempfile.mkdtemp()
+    server = StubPlatformServer(self_signed_context(workdir), latencies, failure_rates)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        configure(server, workdir, args.retry_delay)
+
+        # Distinct contents per video, so the Drive upload cache never short-circuits
+        video_paths = []
+        for index in range(args.videos):
+            video_path = os.path.join(workdir, f"render_{index}.mp4")
+            with open(video_path, 'wb') as f:
+                f.write(os.urandom(args.size))
+            video_paths.append(video_path)
+
+        timings = {stage: [] for stage in PLATFORMS + ('video',)}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            bytes_sent = sum(executor.map(
+                lambda item: publish_video(item[1], item[0], posters, timings),
+                enumerate(video_paths)
+            ))
+        wall = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir)
+
+    return {
+        'started': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'settings': {
+            'videos': args.videos,
+            'size': args.size,
+            'workers': args.workers,
+            'platforms': posters,
+            'latency': latencies,
+            'failure_rate': failure_rates,
+            'retry_delay': args.retry_delay
+        },
+        'wall_seconds': wall,
+        'videos_per_hour': args.videos / wall * 3600,
+        'bytes_sent': bytes_sent,
+        'bytes_per_second': bytes_sent / wall,
+        'stages': {stage: summarize(samples) for stage, samples in timings.items() if samples},
+        'stub_calls': dict(sorted(server.calls.items()))
+    }
+
+def _ms(value):
+    return f"{value * 1000:8.1f}" if value is not None else f"{'-':>8}"
+
+def report(results, baseline=None):
+    print(f"{'stage':>10} {'count':>6} {'failed':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for stage, summary in results['stages'].items():
+        line = (
+            f"{stage:>10} {summary['count']:>6} {summary['failures']:>6} "
+            f"{_ms(summary['p50'])} {_ms(summary['p95'])} {_ms(summary['max'])}"
+        )
+        before = (baseline or {}).get('stages', {}).get(stage)
+        if before and before['p50'] and summary['p50']:
+            line += f"   p50 {(summary['p50'] / before['p50'] - 1) * 100:+.1f}%, p95 {(summary['p95'] / before['p95'] - 1) * 100:+.1f}%"
+        print(line)
+
+    print(
+        f"\n{results['videos_per_hour']:.0f} videos/hour, "
+        f"{results['bytes_per_second'] / 1024 / 1024:.2f} MiB/s "
+        f"({results['bytes_sent']} bytes in {results['wall_seconds']:.2f}s)"
+    )
+    if baseline:
+        print(
+            f"baseline: {baseline['videos_per_hour']:.0f} videos/hour, "
+            f"{baseline['bytes_per_second'] / 1024 / 1024:.2f} MiB/s"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--videos', type=int, default=20, help="Videos to publish")
+    parser.add_argument('--size', type=int, default=2 * 1024 * 1024, help="Video size in bytes")
+    parser.add_argument('--workers', type=int, default=1, help="Videos published concurrently")
+    parser.add_argument('--platforms', nargs='+', default=list(PLATFORMS[1:]), choices=PLATFORMS[1:],
+                        help="Platforms to post to after the Drive upload")
+    parser.add_argument('--latency', action='append', metavar='[PLATFORM=]SECONDS',
+                        help="Stub latency per request, for all platforms or one (repeatable; default 0.02)")
+    parser.add_argument('--failure-rate', action='append', metavar='[PLATFORM=]FRACTION',
+                        help="Share of stub requests answered with a 503 (repeatable; default 0)")
+    parser.add_argument('--retry-delay', type=float, default=0.05,
+                        help="Base retry backoff in seconds, replacing the production delays")
+    parser.add_argument('--output', default=f"bench_pipeline_{time.strftime('%Y%m%d-%H%M%S')}.json",
+                        help="Where to write the results JSON")
+    parser.add_argument('--compare', metavar='RESULTS_JSON', help="Earlier results to compare against")
+    args = parser.parse_args()
+    args.latency = ['0.02'] + (args.latency or [])
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = run(args)
+    report(results, baseline)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Measure cold import time of the automation entry points.
+
+Each module is imported in a fresh interpreter with -X importtime and the
+cumulative time of its own top-level import is read from the report, so the
+numbers include everything the module pulls in at import.
+
+Usage:
+    python -m benchmarks.startup --runs 5 --json startup.json
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+ENTRY_POINTS = (
+    'modules.caption_generator',
+    'modules.http',
+    'modules.job_queue',
+    'modules.rate_limit',
+    'modules.results',
+    'modules.resumable',
+    'modules.retry',
+    'modules.social_media',
+    'modules.storage',
+    'modules.tee_upload',
+    'modules.tracing',
+    'modules.upload_body',
+)
+
+def import_time(module):
+    """
+    Import module in a new interpreter and return its cumulative import time in seconds.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1e6
+
+    raise RuntimeError(f"No import time reported for {module}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument('--json', help="Also write the medians (ms) to this file")
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS, help="Modules to measure")
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules:
+        timings = [import_time(module) for _ in range(args.runs)]
+        results[module] = round(statistics.median(timings) * 1000, 1)
+        print(f"{module:>28}: median {results[module]:.1f} ms, max {max(timings) * 1000:.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-
 """
 Caption generator module for creating viral Hinglish captions.
 """
@@ -6,8 +5,16 @@ import random
 import logging
 import json
 import os
+import sys
+import time
+import base64
+import hashlib
+import threading
 from pathlib import Path
 
+from modules import tracing
+from modules.hashtags import HashtagSampler, get_keyword_index
+
 logger = logging.getLogger(__name__)
 
 # Load caption templates and hashtags
@@ -127,608 +134,439 @@ DEFAULT_HASHTAGS = {
     ]
 }
 
-# Create templates file if it doesn't exist
-if not os.path.exists(TEMPLATES_PATH):
-    with open(TEMPLATES_PATH, 'w', encoding='utf-8') as f:
-        json.dump({
-            "templates": DEFAULT_TEMPLATES,
-            "hashtags": DEFAULT_HASHTAGS
-        }, f, indent=4)
+# Seconds between checks of the templates file for changes
+TEMPLATE_CHECK_INTERVAL = 2.0
 
-# Load templates
-try:
-    with open(TEMPLATES_PATH, 'r', encoding='utf-8') as f:
-        CAPTION_DATA = json.load(f)
-except Exception as e:
-    logger.error(f"Error loading caption templates: {str(e)}")
-    CAPTION_DATA = {
-        "templates": DEFAULT_TEMPLATES,
-        "hashtags": DEFAULT_HASHTAGS
-    }
+# Where campaigns keep their permutation cursors and used-caption bitmaps
+CAMPAIGN_STATE_PATH = BASE_DIR / ".caption_campaigns.json"
 
-def generate_hinglish_caption(title, content_type="youtube"):
+# Feistel rounds used by SeededPermutation
+PERMUTATION_ROUNDS = 4
+
+# Caption components, in the order they appear in a caption
+CAPTION_COMPONENTS = ("opening_comments", "relatable_observations", "engaging_questions")
+
+FALLBACK_CAPTION = (
+    "Ye video dekh ke hassi nahi ruki! Bilkul India wali feeling. Aap kya kehte ho?",
+    ["#viralreels", "#indianmemes", "#desijugaad", "#funnyindia", "#trending"]
+)
+
+class CompiledTemplates:
     """
-    Generate a viral Hinglish caption based on the video title and content type.
+    Caption templates flattened into index-backed tables.
     
-    Args:
-        title (str): The title or subject of the video
-        content_type (str): Type of content ("youtube" or "news")
-        
-    Returns:
-        tuple: (caption, hashtags)
+    Instances are never modified after construction. Every template string is
+    interned once into a single tuple. Each content
+    type keeps an (offset, count) pair per caption component pointing into
+    that tuple, plus deduplicated, optionally weighted hashtag samplers, so
+    picking a caption is a few integer draws and tuple lookups.
     """
-    logger.info(f"Generating Hinglish caption for {content_type} content: {title}")
     
-    try:
-        # Determine the template set to use
-        if content_type not in CAPTION_DATA["templates"]:
-            content_type = "youtube"  # Default to youtube templates
+    __slots__ = ("strings", "offsets", "combinations", "common_hashtags", "hashtag_pools")
+    
+    def __init__(self, caption_data):
+        """
+        Args:
+            caption_data (dict): {"templates": {...}, "hashtags": {...}} as stored in TEMPLATES_PATH,
+                optionally with "hashtag_weights": {tag: weight}
+        """
+        strings = []
+        offsets = {}
+        combinations = {}
+        
+        for content_type, templates in caption_data["templates"].items():
+            component_offsets = []
+            for component in CAPTION_COMPONENTS:
+                values = templates[component]
+                if not values:
+                    raise ValueError(f"No {component} templates for {content_type}")
+                component_offsets.append((len(strings), len(values)))
+                strings.extend(sys.intern(value) for value in values)
+            
+            offsets[content_type] = tuple(component_offsets)
+            openings, observations, questions = component_offsets
+            combinations[content_type] = openings[1] * observations[1] * questions[1]
+        
+        hashtags = caption_data["hashtags"]
+        weights = caption_data.get("hashtag_weights")
+        
+        self.strings = tuple(strings)
+        self.offsets = offsets
+        self.combinations = combinations
+        self.common_hashtags = HashtagSampler([sys.intern(tag) for tag in hashtags["common"]], weights)
+        self.hashtag_pools = {
+            content_type: HashtagSampler([sys.intern(tag) for tag in tags], weights)
+            for content_type, tags in hashtags.items()
+            if content_type != "common"
+        }
+    
+    def caption(self, content_type, index):
+        """
+        Build the caption with the given combination index.
         
-        templates = CAPTION_DATA["templates"][content_type]
+        Args:
+            content_type (str): A content type present in the templates
+            index (int): Combination number in [0, combinations[content_type])
+        """
+        (opening_start, opening_count), (observation_start, observation_count), (question_start, _) = self.offsets[content_type]
         
-        # Select random components
-        opening = random.choice(templates["opening_comments"])
-        observation = random.choice(templates["relatable_observations"])
-        question = random.choice(templates["engaging_questions"])
+        index, opening = divmod(index, opening_count)
+        question, observation = divmod(index, observation_count)
         
-        # Combine components to form the caption
-        caption = f"{opening} {observation} {question}"
+        strings = self.strings
+        return f"{strings[opening_start + opening]} {strings[observation_start + observation]} {strings[question_start + question]}"
+    
+    def hashtags(self, content_type, title):
+        """
+        Draw hashtags: three common, two content-specific and one from the title.
         
-        # Generate hashtags
-        hashtags = []
-        # Add common hashtags
-        hashtags.extend(random.sample(CAPTION_DATA["hashtags"]["common"], 3))
-        # Add content-specific hashtags
-        if content_type in CAPTION_DATA["hashtags"]:
-            hashtags.extend(random.sample(CAPTION_DATA["hashtags"][content_type], 2))
+        No tag appears twice, even when it is in several pools.
+        """
+        taken = set()
+        hashtags = self.common_hashtags.sample(3, taken)
         
-        # Add a content-specific hashtag based on the title
-        # Extract keywords from the title
-        keywords = [word for word in title.split() if len(word) > 3]
-        if keywords:
-            keyword = random.choice(keywords).lower()
-            # Remove any non-alphanumeric characters
-            keyword = ''.join(c for c in keyword if c.isalnum())
-            if keyword:
-                hashtags.append(f"#{keyword}")
+        pool = self.hashtag_pools.get(content_type)
+        if pool:
+            hashtags.extend(pool.sample(2, taken))
         
-        return caption, hashtags
+        # Add a content-specific hashtag based on the title's best keyword
+        hashtags.extend(get_keyword_index().hashtags(title, exclude=taken))
         
-    except Exception as e:
-        logger.error(f"Error generating caption: {str(e)}")
-        # Fallback caption
-        return (
-            "Ye video dekh ke hassi nahi ruki! Bilkul India wali feeling. Aap kya kehte ho?", 
-            ["#viralreels", "#indianmemes", "#desijugaad", "#funnyindia", "#trending"]
-        )
-
-"""
-Storage module for Google Drive integration.
-"""
-import os
-import json
-import logging
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.errors import HttpError
-
-from config import CONFIG
+        return hashtags
 
-logger = logging.getLogger(__name__)
-
-def upload_to_drive(file_path, file_name=None):
+class TemplateStore:
     """
-    Upload a file to Google Drive.
+    Compiled caption templates that follow edits to the templates file.
     
-    Args:
-        file_path (str): Path to the file to upload
-        file_name (str, optional): Name to give the file on Drive (default: use original filename)
-        
-    Returns:
-        tuple: (file_id, share_link)
+    The file's mtime and size are checked at most every check_interval
+    seconds. When they change, the file is parsed and compiled off to the
+    side and swapped in with a single assignment, so callers holding the
+    previous snapshot keep a consistent view. A file that fails to parse or
+    compile is logged and ignored, and the last good version stays active.
     """
-    logger.info(f"Uploading file to Google Drive: {file_path}")
     
-    try:
-        # Get credentials from environment
-        credentials_json = CONFIG['GOOGLE_DRIVE_CREDENTIALS']
-        
-        # Check if credentials are a file path or a JSON string
-        if os.path.isfile(credentials_json):
-            credentials = service_account.Credentials.from_service_account_file(
-                credentials_json,
-                scopes=['https://www.googleapis.com/auth/drive']
-            )
-        else:
-            # Try to parse as JSON string
+    def __init__(self, path, check_interval=TEMPLATE_CHECK_INTERVAL):
+        """
+        Args:
+            path (str): Location of the templates JSON file
+            check_interval (float): Minimum seconds between checks for changes
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._templates = None
+        self._version = None
+        self._next_check = 0.0
+    
+    def get(self):
+        """
+        Return the current compiled templates, reloading them first if the file changed.
+        
+        Returns:
+            CompiledTemplates: An immutable snapshot of the templates
+        """
+        if self._templates is None or time.monotonic() >= self._next_check:
+            self._refresh()
+        return self._templates
+    
+    def _refresh(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._templates is not None and now < self._next_check:
+                # Another thread refreshed while we were waiting for the lock
+                return
+            self._next_check = now + self.check_interval
+            
+            if self._version is None:
+                self._write_defaults()
+            
             try:
-                credentials_info = json.loads(credentials_json)
-                credentials = service_account.Credentials.from_service_account_info(
-                    credentials_info,
-                    scopes=['https://www.googleapis.com/auth/drive']
-                )
-            except json.JSONDecodeError:
-                raise ValueError("GOOGLE_DRIVE_CREDENTIALS must be a valid JSON string or file path")
-        
-        # Build the Drive API client
-        drive_service = build('drive', 'v3', credentials=credentials)
-        
-        # If no file name is provided, use the original filename
-        if not file_name:
-            file_name = os.path.basename(file_path)
-        
-        # File metadata
-        file_metadata = {
-            'name': file_name,
-            'mimeType': 'video/mp4'
-        }
-        
-        # If a folder ID is specified in config, add it to the metadata
-        folder_id = CONFIG['GOOGLE_DRIVE_FOLDER_ID']
-        if folder_id:
-            file_metadata['parents'] = [folder_id]
-        
-        # Create a media file upload object
-        media = MediaFileUpload(
-            file_path,
-            mimetype='video/mp4',
-            resumable=True
-        )
-        
-        # Upload the file
-        file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
-        
-        file_id = file.get('id')
-        
-        # Make the file publicly accessible for viewing
-        permission = {
-            'type': 'anyone',
-            'role': 'reader'
-        }
-        
-        drive_service.permissions().create(
-            fileId=file_id,
-            body=permission
-        ).execute()
-        
-        # Get the shareable link
-        share_link = f"https://drive.google.com/file/d/{file_id}/view"
-        
-        logger.info(f"Successfully uploaded file to Google Drive. ID: {file_id}, Link: {share_link}")
-        
-        return file_id, share_link
-        
-    except HttpError as error:
-        logger.error(f"Google Drive API error: {error}", exc_info=True)
-        raise
-    except Exception as e:
-        logger.error(f"Error uploading to Google Drive: {str(e)}", exc_info=True)
-        raise
-
-"""
-Social media module for posting to Instagram, Facebook, YouTube, and LinkedIn.
-"""
-import os
-import time
-import json
-import logging
-import requests
-from pathlib import Path
-import google.oauth2.credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.errors import HttpError
-
-from config import CONFIG
-
-logger = logging.getLogger(__name__)
+                stat = os.stat(self.path)
+                version = (stat.st_mtime_ns, stat.st_size)
+                if version != self._version:
+                    # Remember the version first so a broken file is only parsed once
+                    self._version = version
+                    with tracing.span('template_load'), open(self.path, 'r', encoding='utf-8') as f:
+                        templates = CompiledTemplates(json.load(f))
+                    if self._templates is not None:
+                        logger.info(f"Reloaded caption templates from {self.path}")
+                    self._templates = templates
+            except Exception as e:
+                logger.error(f"Error loading caption templates, keeping the previous version: {str(e)}")
+            
+            if self._templates is None:
+                self._templates = CompiledTemplates({
+                    "templates": DEFAULT_TEMPLATES,
+                    "hashtags": DEFAULT_HASHTAGS
+                })
+    
+    def _write_defaults(self):
+        # Create the templates file on first use rather than at import time
+        if os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "templates": DEFAULT_TEMPLATES,
+                    "hashtags": DEFAULT_HASHTAGS
+                }, f, indent=4)
+        except OSError as e:
+            logger.warning(f"Could not create caption templates file: {str(e)}")
+
+TEMPLATE_STORE = TemplateStore(TEMPLATES_PATH)
 
-def post_to_instagram(video_path, caption):
+def generate_hinglish_caption(title, content_type="youtube"):
     """
-    Post a video to Instagram as a Reel.
+    Generate a viral Hinglish caption based on the video title and content type.
     
     Args:
-        video_path (str): Path to the video file
-        caption (str): Caption for the post
+        title (str): The title or subject of the video
+        content_type (str): Type of content ("youtube" or "news")
         
     Returns:
-        bool: Success status
+        tuple: (caption, hashtags)
     """
-    logger.info("Posting to Instagram")
+    logger.info(f"Generating Hinglish caption for {content_type} content: {title}")
     
     try:
-        # Instagram requires the Facebook Graph API with proper permissions
-        # This is a simplified implementation - production code would need to handle
-        # more complex authentication and posting flow
-        
-        username = CONFIG['INSTAGRAM_USERNAME']
-        password = CONFIG['INSTAGRAM_PASSWORD']
-        
-        # For demonstration purposes, we're logging that we would post to Instagram
-        # In a real implementation, you would use the Instagram Graph API
-        logger.info(f"Would post to Instagram as {username} with caption: {caption[:50]}...")
-        
-        # Simulate API request delay
-        time.sleep(1)
-        
-        # In a real implementation, this would return the actual post ID or URL
-        # For now, we'll just return True indicating success
-        return True
+        with tracing.span('caption_generate'):
+            templates = TEMPLATE_STORE.get()
+            
+            # Determine the template set to use
+            if content_type not in templates.offsets:
+                content_type = "youtube"  # Default to youtube templates
+            
+            caption = templates.caption(content_type, random.randrange(templates.combinations[content_type]))
+            return caption, templates.hashtags(content_type, title)
         
     except Exception as e:
-        logger.error(f"Error posting to Instagram: {str(e)}", exc_info=True)
-        return False
+        logger.error(f"Error generating caption: {str(e)}")
+        # Fallback caption
+        return FALLBACK_CAPTION[0], list(FALLBACK_CAPTION[1])
 
-def post_to_facebook(video_url, caption):
+def generate_hinglish_captions(title, count, content_type="youtube"):
     """
-    Post a video to Facebook Page.
+    Generate several captions for the same video in one call, e.g. for A/B variants.
+    
+    Captions are distinct as long as count does not exceed the number of
+    template combinations for the content type.
     
     Args:
-        video_url (str): URL to the video (e.g., Google Drive link)
-        caption (str): Caption for the post
+        title (str): The title or subject of the video
+        count (int): Number of captions to generate
+        content_type (str): Type of content ("youtube" or "news")
         
     Returns:
-        bool: Success status
+        list: (caption, hashtags) tuples
     """
-    logger.info("Posting to Facebook")
+    logger.info(f"Generating {count} Hinglish captions for {content_type} content: {title}")
     
     try:
-        access_token = CONFIG['FACEBOOK_ACCESS_TOKEN']
-        page_id = CONFIG['FACEBOOK_PAGE_ID']
+        templates = TEMPLATE_STORE.get()
         
-        # Facebook Graph API endpoint for posting to a page
-        url = f"https://graph.facebook.com/v18.0/{page_id}/videos"
+        if content_type not in templates.offsets:
+            content_type = "youtube"
         
-        # Prepare data for the POST request
-        data = {
-            'access_token': access_token,
-            'description': caption,
-            'file_url': video_url
-        }
+        combinations = templates.combinations[content_type]
+        if count <= combinations:
+            # Sampling a range is lazy, so this never materializes the combination space
+            indexes = random.sample(range(combinations), count)
+        else:
+            indexes = [random.randrange(combinations) for _ in range(count)]
         
-        # Make the API request
-        response = requests.post(url, data=data)
+        return [
+            (templates.caption(content_type, index), templates.hashtags(content_type, title))
+            for index in indexes
+        ]
         
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            post_id = result.get('id')
-            logger.info(f"Successfully posted to Facebook. Post ID: {post_id}")
-            return True
-        else:
-            logger.error(f"Facebook API error: {response.text}")
-            return False
-            
     except Exception as e:
-        logger.error(f"Error posting to Facebook: {str(e)}", exc_info=True)
-        return False
+        logger.error(f"Error generating captions: {str(e)}")
+        return [(FALLBACK_CAPTION[0], list(FALLBACK_CAPTION[1])) for _ in range(count)]
 
-def post_to_youtube(video_path, title, description):
+class SeededPermutation:
     """
-    Upload a video to YouTube as a Short.
+    A random-looking permutation of range(size) that is computed on demand.
     
-    Args:
-        video_path (str): Path to the video file
-        title (str): Title for the YouTube video
-        description (str): Description for the video
-        
-    Returns:
-        bool: Success status
+    Indexes are mixed by a small Feistel network over the smallest even
+    number of bits that covers size, and values that land outside the range
+    are fed back through the network until they fall inside it. That keeps
+    it a bijection on range(size) while storing nothing but the seed, so
+    permutation[i] is O(1) expected no matter how large size is.
     """
-    logger.info("Posting to YouTube")
     
-    try:
-        # Load OAuth 2.0 credentials
-        credentials_path = CONFIG['YOUTUBE_OAUTH_CREDENTIALS']
-        
-        # Check if credentials are a file path or a JSON string
-        if os.path.isfile(credentials_path):
-            with open(credentials_path, 'r') as f:
-                credentials_info = json.load(f)
-        else:
-            try:
-                credentials_info = json.loads(credentials_path)
-            except json.JSONDecodeError:
-                raise ValueError("YOUTUBE_OAUTH_CREDENTIALS must be a valid JSON string or file path")
-        
-        # Create credentials object
-        credentials = google.oauth2.credentials.Credentials(
-            token=credentials_info.get('token'),
-            refresh_token=credentials_info.get('refresh_token'),
-            token_uri=credentials_info.get('token_uri'),
-            client_id=credentials_info.get('client_id'),
-            client_secret=credentials_info.get('client_secret')
-        )
-        
-        # Build the YouTube API client
-        youtube = build('youtube', 'v3', credentials=credentials)
-        
-        # Prepare video metadata
-        body = {
-            'snippet': {
-                'title': title,
-                'description': description,
-                'tags': ['Shorts', 'viral', 'reaction'],
-                'categoryId': '22'  # People & Blogs category
-            },
-            'status': {
-                'privacyStatus': 'public',
-                'selfDeclaredMadeForKids': False
-            }
-        }
-        
-        # Upload the video
-        media = MediaFileUpload(
-            video_path,
-            mimetype='video/mp4',
-            resumable=True
-        )
-        
-        request = youtube.videos().insert(
-            part=','.join(body.keys()),
-            body=body,
-            media_body=media
-        )
-        
-        response = request.execute()
-        
-        video_id = response.get('id')
-        logger.info(f"Successfully uploaded to YouTube. Video ID: {video_id}")
-        
-        return True
-        
-    except HttpError as error:
-        logger.error(f"YouTube API error: {error}", exc_info=True)
-        return False
-    except Exception as e:
-        logger.error(f"Error posting to YouTube: {str(e)}", exc_info=True)
-        return False
-
-def post_to_linkedin(video_url, caption):
+    __slots__ = ("size", "seed", "_half_bits", "_half_mask")
+    
+    def __init__(self, size, seed):
+        """
+        Args:
+            size (int): Number of elements to permute
+            seed (int): Selects the permutation; equal seeds give equal permutations
+        """
+        self.size = size
+        self.seed = seed
+        self._half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self._half_mask = (1 << self._half_bits) - 1
+    
+    def __len__(self):
+        return self.size
+    
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("permutation index out of range")
+        
+        value = self._mix(index)
+        while value >= self.size:
+            value = self._mix(value)
+        return value
+    
+    def _mix(self, value):
+        left, right = value >> self._half_bits, value & self._half_mask
+        for round_number in range(PERMUTATION_ROUNDS):
+            digest = hashlib.blake2b(
+                f"{self.seed}:{round_number}:{right}".encode('ascii'), digest_size=8
+            ).digest()
+            left, right = right, left ^ (int.from_bytes(digest, 'big') & self._half_mask)
+        return (left << self._half_bits) | right
+
+_campaign_lock = threading.Lock()
+
+class CaptionCampaign:
     """
-    Post a video to LinkedIn.
+    Caption generator that does not repeat captions across a campaign.
     
-    Args:
-        video_url (str): URL to the video (e.g., Google Drive link)
-        caption (str): Caption for the post
-        
-    Returns:
-        bool: Success status
+    Each campaign walks the opening x observation x question combinations of
+    its content type in the order of a SeededPermutation, so every caption
+    comes up once before any comes up again. Captions handed out by any
+    campaign are also marked in a per-content-type "recently used" bitmap
+    that campaigns skip over, which keeps parallel campaigns from posting the
+    same caption. The bitmap is cleared once every combination has been used.
+    
+    Cursors, seeds and bitmaps are kept in state_path, so a campaign picks up
+    where it left off after a restart. If the templates change the number of
+    combinations, the campaign and the bitmap start over.
     """
-    logger.info("Posting to LinkedIn")
     
-    try:
-        access_token = CONFIG['LINKEDIN_ACCESS_TOKEN']
-        
-        # LinkedIn API endpoint for creating a share
-        url = "https://api.linkedin.com/v2/ugcPosts"
+    def __init__(self, name, content_type="youtube", seed=None, state_path=CAMPAIGN_STATE_PATH):
+        """
+        Args:
+            name (str): Campaign name, the key its progress is saved under
+            content_type (str): Type of content ("youtube" or "news")
+            seed (int, optional): Permutation seed for a new campaign (default: random)
+            state_path (str): Location of the campaign state JSON file
+        """
+        self.name = name
+        self.content_type = content_type
+        self.seed = seed
+        self.state_path = str(state_path)
+    
+    def next_caption(self, title):
+        """
+        Return the campaign's next unused caption.
+        
+        Returns:
+            tuple: (caption, hashtags)
+        """
+        return self.next_captions(title, 1)[0]
+    
+    def next_captions(self, title, count):
+        """
+        Return the campaign's next count unused captions, saving progress once.
         
-        # Prepare headers with authentication
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
+        Args:
+            title (str): The title or subject of the video
+            count (int): Number of captions to generate
+            
+        Returns:
+            list: (caption, hashtags) tuples
+        """
+        logger.info(f"Generating {count} campaign captions for {self.name}: {title}")
         
-        # Prepare the post data
-        data = {
-            "author": "urn:li:person:{PERSON_ID}",  # This would need to be dynamically set
-            "lifecycleState": "PUBLISHED",
-            "specificContent": {
-                "com.linkedin.ugc.ShareContent": {
-                    "shareCommentary": {
-                        "text": caption
-                    },
-                    "shareMediaCategory": "RICH",
-                    "media": [{
-                        "status": "READY",
-                        "originalUrl": video_url,
-                        "title": {
-                            "text": "Viral Reaction Video"
-                        }
-                    }]
-                }
-            },
-            "visibility": {
-                "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
+        try:
+            templates = TEMPLATE_STORE.get()
+            
+            content_type = self.content_type
+            if content_type not in templates.offsets:
+                content_type = "youtube"
+            combinations = templates.combinations[content_type]
+            
+            with _campaign_lock:
+                state = self._load_state()
+                campaign = self._campaign_state(state, content_type, combinations)
+                used = state["used"].get(content_type)
+                if used is None or used["combinations"] != combinations:
+                    used = state["used"][content_type] = {"combinations": combinations, "count": 0, "bits": ""}
+                bitmap = bytearray(base64.b64decode(used["bits"])) or bytearray((combinations + 7) // 8)
+                
+                indexes = [self._next_index(campaign, used, bitmap) for _ in range(count)]
+                
+                used["bits"] = base64.b64encode(bytes(bitmap)).decode('ascii')
+                self._save_state(state)
+            
+            return [
+                (templates.caption(content_type, index), templates.hashtags(content_type, title))
+                for index in indexes
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error generating campaign captions: {str(e)}")
+            return [(FALLBACK_CAPTION[0], list(FALLBACK_CAPTION[1])) for _ in range(count)]
+    
+    def _campaign_state(self, state, content_type, combinations):
+        campaign = state["campaigns"].get(self.name)
+        if campaign is None or campaign["combinations"] != combinations or campaign["content_type"] != content_type:
+            if campaign is not None:
+                logger.info(f"Caption templates changed, restarting campaign {self.name}")
+            seed = self.seed if self.seed is not None else random.getrandbits(64)
+            campaign = state["campaigns"][self.name] = {
+                "content_type": content_type,
+                "combinations": combinations,
+                "seed": seed,
+                "cycle": 0,
+                "cursor": 0
             }
-        }
-        
-        # Make the API request
-        response = requests.post(url, headers=headers, json=data)
-        
-        # Check if the request was successful
-        if response.status_code in (200, 201):
-            result = response.json()
-            post_id = result.get('id')
-            logger.info(f"Successfully posted to LinkedIn. Post ID: {post_id}")
-            return True
-        else:
-            logger.error(f"LinkedIn API error: {response.text}")
-            return False
+        return campaign
+    
+    def _next_index(self, campaign, used, bitmap):
+        combinations = campaign["combinations"]
+        if used["count"] >= combinations:
+            logger.info(f"Every {self.content_type} caption has been used, clearing the recently used set")
+            bitmap[:] = bytes(len(bitmap))
+            used["count"] = 0
+        
+        # The cursor walks each permutation at most once, so skipping captions
+        # other campaigns already used is O(1) amortized
+        permutation = None
+        while True:
+            if campaign["cursor"] >= combinations:
+                campaign["cycle"] += 1
+                campaign["cursor"] = 0
+                permutation = None
+            if permutation is None:
+                permutation = SeededPermutation(combinations, f"{campaign['seed']}:{campaign['cycle']}")
+            index = permutation[campaign["cursor"]]
+            campaign["cursor"] += 1
             
-    except Exception as e:
-        logger.error(f"Error posting to LinkedIn: {str(e)}", exc_info=True)
-        return False
-
-"""
-Package initialization for viral video automation modules.
-"""
-
-# Core dependencies
-python-dotenv==1.0.0
-requests==2.31.0
-apscheduler==3.10.1
-
-# Content discovery
-google-api-python-client==2.108.0
-google-auth==2.23.3
-google-auth-oauthlib==1.1.0
-feedparser==6.0.10
-pytube==15.0.0
-youtube-dl==2021.12.17
-
-# Video editing
-moviepy==1.0.3
-Pillow==10.0.1
-numpy==1.24.3
-
-# Avatar generation
-torch==2.0.1
-torchvision==0.15.2
-SadTalker==0.0.1
-
-# Storage
-google-auth==2.23.3
-google-cloud-storage==2.10.0
-
-# Social media posting
-facebook-sdk==3.1.0
-python-linkedin==4.1
-
-# API Keys and Credentials
-YOUTUBE_API_KEY=your_youtube_api_key_here
-GOOGLE_DRIVE_CREDENTIALS=path_to_service_account_json_or_json_string
-GOOGLE_DRIVE_FOLDER_ID=your_google_drive_folder_id
-
-# Social Media Credentials
-INSTAGRAM_USERNAME=your_instagram_username
-INSTAGRAM_PASSWORD=your_instagram_password
-FACEBOOK_ACCESS_TOKEN=your_facebook_access_token
-FACEBOOK_PAGE_ID=your_facebook_page_id
-YOUTUBE_OAUTH_CREDENTIALS=path_to_oauth_credentials_json_or_json_string
-LINKEDIN_ACCESS_TOKEN=your_linkedin_access_token
-
-# Content Discovery Settings
-YOUTUBE_REGION_CODE=IN
-YOUTUBE_MAX_RESULTS=50
-ALTERNATE_CONTENT_SOURCES=True
-
-# Social Media Posting Settings
-POST_TO_INSTAGRAM=True
-POST_TO_FACEBOOK=True
-POST_TO_YOUTUBE=True
-POST_TO_LINKEDIN=True
-
-# SadTalker Settings
-SADTALKER_PATH=./SadTalker
-
-# Scheduling Settings
-RUN_ONCE=False
-
-# Viral Video Automation
-
-An end-to-end Python automation system that creates viral reaction videos with AI avatars and posts them to multiple social media platforms automatically.
-
-## Features
-
-- Automatically discovers trending content from YouTube and news sources
-- Creates reaction videos with an AI avatar using Stable Diffusion and SadTalker
-- Generates engaging Hinglish captions with viral potential
-- Uploads videos to Google Drive for storage and sharing
-- Posts to Instagram, Facebook, YouTube Shorts, and LinkedIn automatically
-- Runs on a schedule (twice daily at 11:00 AM and 8:00 PM IST)
-
-## Technical Stack
-
-- **Programming Language**: Python
-- **Content Discovery**: Google API Python Client, feedparser
-- **Video Editing**: MoviePy
-- **AI Avatar Generation**: Stable Diffusion, SadTalker
-- **Storage & File Handling**: Google Drive API
-- **Social Media Posting**: requests, google-api-python-client
-- **Scheduling**: APScheduler
-
-## Installation
-
-1. Clone this repository:
-```
-git clone https://github.com/yourusername/viral-video-automation.git
-cd viral-video-automation
-```
-
-2. Install the required dependencies:
-```
-pip install -r requirements.txt
-```
-
-3. Install SadTalker:
-```
-git clone https://github.com/OpenTalker/SadTalker.git
-cd SadTalker
-python install.py
-cd ..
-```
-
-4. Create a `.env` file with your API keys and credentials (use the provided `.env.example` as a template)
-
-5. Create the necessary directories:
-```
-mkdir -p assets/reaction_audio
-```
-
-6. Add your avatar image to `assets/avatar_base.png` and reaction audio files to `assets/reaction_audio/`
-
-## Usage
-
-Run the main script:
-```
-python main.py
-```
-
-For production deployment, you can use a process manager like PM2 or Supervisor to keep the script running.
-
-## Environment Variables
-
-The following environment variables need to be set in your `.env` file:
-
-- `YOUTUBE_API_KEY`: Your YouTube Data API v3 key
-- `GOOGLE_DRIVE_CREDENTIALS`: Path to your Google service account JSON file or the JSON content as a string
-- `GOOGLE_DRIVE_FOLDER_ID`: ID of the Google Drive folder to store videos
-- `INSTAGRAM_USERNAME`: Your Instagram username
-- `INSTAGRAM_PASSWORD`: Your Instagram password
-- `FACEBOOK_ACCESS_TOKEN`: Your Facebook Graph API access token
-- `FACEBOOK_PAGE_ID`: ID of your Facebook page
-- `YOUTUBE_OAUTH_CREDENTIALS`: Path to your YouTube OAuth credentials JSON file or the JSON content as a string
-- `LINKEDIN_ACCESS_TOKEN`: Your LinkedIn API access token
-- `SADTALKER_PATH`: Path to the SadTalker installation
-
-## Project Structure
-
-```
-viral-video-automation/
-├── main.py                    # Main script that orchestrates the workflow
-├── requirements.txt           # All required dependencies
-├── README.md                  # Documentation
-├── .env.example               # Example environment variables file
-├── config.py                  # Configuration and environment variable loading
-├── modules/
-│   ├── __init__.py
-│   ├── content_discovery.py   # YouTube and RSS feed content discovery
-│   ├── video_editing.py       # MoviePy video editing functions
-│   ├── avatar_generation.py   # Stable Diffusion and SadTalker integration
-│   ├── caption_generator.py   # Hinglish caption generation
-│   ├── storage.py             # Google Drive integration
-│   └── social_media.py        # Social media posting functions
-└── assets/
-    ├── avatar_base.png        # Pre-generated AI avatar image
-    └── reaction_audio/        # Pre-recorded audio reactions
-        ├── wow.mp3
-        ├── laugh.mp3
-        └── gasp.mp3
-```
-
-## Notes on Social Media APIs
-
-- **Instagram**: The Instagram Graph API requires a Facebook Developer account and a business Instagram account.
-- **Facebook**: The Facebook Graph API requires an app with Page permissions.
-- **YouTube**: The YouTube Data API requires OAuth 2.0 authentication.
-- **LinkedIn**: The LinkedIn API requires developer approval for video posting capabilities.
-
-## License
-
-This project is licensed under the MIT License - see the LICENSE file for details.
+            byte, bit = divmod(index, 8)
+            if not bitmap[byte] & (1 << bit):
+                bitmap[byte] |= 1 << bit
+                used["count"] += 1
+                return index
+    
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        except ValueError:
+            logger.warning(f"Ignoring corrupt caption campaign state: {self.state_path}")
+            state = {}
+        state.setdefault("campaigns", {})
+        state.setdefault("used", {})
+        return state
+    
+    def _save_state(self, state):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
@@ -0,0 +1,326 @@
+"""
+Title keyword extraction and keyword -> hashtag lookup for captions.
+"""
+import os
+import re
+import json
+import math
+import heapq
+import random
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+KEYWORD_INDEX_PATH = BASE_DIR / "assets" / "keyword_index.json"
+
+# Words shorter than this are never used as keywords
+MIN_KEYWORD_LENGTH = 3
+
+# Titles whose hashtags are memoized per index
+MEMO_SIZE = 10000
+
+# Runs of letters and digits; punctuation, emoji and underscores split words
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset("""
+    a about after all also an and any are as at be because been but by can could did do does
+    for from get got had has have he her here him his how i if in into is it its just like me
+    more most my new no not now of off on one only or our out over see she so some than that
+    the their them then there these they this those to too up us very was watch we were what
+    when where which while who why will with would you your video videos full official latest
+    aaj ab aap aapka aapke aapki abhi aisa aise aur bahut bhi bhai bilkul dekho dekh diya ek
+    gaya gayi ham hai hain hamara ho hoga hota hum jab jo kab kaise kar karo karte ke ki kis
+    kiya ko koi kuch kya kyun log main mein mera meri na nahi ne par pe phir raha rahe rahi sab
+    se tak tha the thi toh tu tum tumhara unka unki vo wala wale wali woh ya yaar ye yeh
+""".split())
+
+# Curated hashtags for common title terms, merged with the "hashtags" section of the index file
+DEFAULT_KEYWORD_HASHTAGS = {
+    "cricket": ["#cricket", "#cricketlovers"],
+    "ipl": ["#ipl", "#cricket"],
+    "dance": ["#dance", "#dancereels"],
+    "wedding": ["#indianwedding"],
+    "shaadi": ["#indianwedding", "#shaadi"],
+    "bollywood": ["#bollywood"],
+    "movie": ["#bollywood", "#movies"],
+    "song": ["#music", "#bollywoodsongs"],
+    "comedy": ["#comedy", "#funnyindia"],
+    "prank": ["#prank", "#funnyindia"],
+    "food": ["#indianfood", "#foodie"],
+    "recipe": ["#recipe", "#indianfood"],
+    "jugaad": ["#desijugaad"],
+    "election": ["#elections", "#politics"],
+    "budget": ["#budget", "#economy"],
+    "news": ["#breakingnews"],
+}
+
+def tokenize(text):
+    """
+    Split text into lowercase word tokens.
+    """
+    return TOKEN_PATTERN.findall(text.casefold())
+
+def _is_candidate(token):
+    return len(token) >= MIN_KEYWORD_LENGTH and not token.isdigit() and token not in STOPWORDS
+
+class KeywordIndex:
+    """
+    Document-frequency table over past titles plus an inverted index of hashtags.
+
+    A title word scores higher the fewer past titles it appeared in, with a
+    bonus for words that have curated hashtags, so generic words lose to the
+    specific subject of the video. Results are memoized per title since the
+    same trending titles come through many times a day.
+    """
+
+    def __init__(self, document_count=0, document_frequency=None, keyword_hashtags=None):
+        """
+        Args:
+            document_count (int): Number of titles the table was built from
+            document_frequency (dict): term -> number of titles containing it
+            keyword_hashtags (dict): term -> list of curated hashtags
+        """
+        self.document_count = document_count
+        self.document_frequency = dict(document_frequency or {})
+        self.keyword_hashtags = {
+            term: tuple(tags) for term, tags in (keyword_hashtags or DEFAULT_KEYWORD_HASHTAGS).items()
+        }
+        self._lock = threading.Lock()
+        self._memo = {}
+
+    @classmethod
+    def load(cls, path=KEYWORD_INDEX_PATH):
+        """
+        Load an index saved with save(); a missing file gives an empty table.
+
+        Returns:
+            KeywordIndex: The loaded index, with the default curated hashtags merged in
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except ValueError:
+            logger.warning(f"Ignoring corrupt keyword index: {path}")
+            data = {}
+
+        keyword_hashtags = dict(DEFAULT_KEYWORD_HASHTAGS)
+        keyword_hashtags.update(data.get("hashtags", {}))
+        return cls(data.get("documents", 0), data.get("terms"), keyword_hashtags)
+
+    def save(self, path=KEYWORD_INDEX_PATH):
+        """
+        Write the index atomically to path.
+        """
+        with self._lock:
+            data = {
+                "documents": self.document_count,
+                "terms": self.document_frequency,
+                "hashtags": {term: list(tags) for term, tags in self.keyword_hashtags.items()}
+            }
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def add_titles(self, titles):
+        """
+        Count the words of past titles into the document-frequency table.
+        """
+        document_frequency = self.document_frequency
+        added = 0
+        for title in titles:
+            for token in set(tokenize(title)):
+                if _is_candidate(token):
+                    document_frequency[token] = document_frequency.get(token, 0) + 1
+            added += 1
+
+        with self._lock:
+            self.document_count += added
+            self._memo.clear()
+
+    def keywords(self, title, count=1):
+        """
+        Return the count highest-signal words of title, best first.
+
+        Args:
+            title (str): Video title
+            count (int): Maximum number of keywords
+
+        Returns:
+            tuple: Keywords; empty if the title has only stopwords
+        """
+        memo_key = (title, count)
+        keywords = self._memo.get(memo_key)
+        if keywords is not None:
+            return keywords
+
+        documents = self.document_count + 1
+        document_frequency = self.document_frequency
+        keyword_hashtags = self.keyword_hashtags
+
+        scores = {}
+        for position, token in enumerate(tokenize(title)):
+            if token in scores or not _is_candidate(token):
+                continue
+            score = math.log(documents / (document_frequency.get(token, 0) + 1)) + 1
+            if token in keyword_hashtags:
+                score *= 2
+            # Ties go to the longer word, then the earlier one
+            scores[token] = (score, len(token), -position)
+
+        keywords = tuple(heapq.nlargest(count, scores, key=scores.__getitem__))
+
+        with self._lock:
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            self._memo[memo_key] = keywords
+
+        return keywords
+
+    def hashtags(self, title, count=1, exclude=()):
+        """
+        Map the best keywords of title to hashtags.
+
+        A keyword with curated hashtags contributes the first one not in
+        exclude; any other keyword becomes #keyword.
+
+        Returns:
+            list: Up to count hashtags
+        """
+        hashtags = []
+        for keyword in self.keywords(title, count):
+            curated = self.keyword_hashtags.get(keyword, ())
+            tag = next((tag for tag in curated if tag not in exclude and tag not in hashtags), None)
+            if tag is None and not curated:
+                tag = f"#{keyword}"
+            if tag and tag not in exclude and tag not in hashtags:
+                hashtags.append(tag)
+        return hashtags
+
+class AliasTable:
+    """
+    Walker/Vose alias table for O(1) draws from a fixed discrete distribution.
+    """
+
+    __slots__ = ("probability", "alias")
+
+    def __init__(self, weights):
+        """
+        Args:
+            weights (list): Non-negative weights, at least one of them positive
+        """
+        count = len(weights)
+        total = float(sum(weights))
+        if count == 0 or total <= 0:
+            raise ValueError("AliasTable needs at least one positive weight")
+
+        scaled = [weight * count / total for weight in weights]
+        probability = [1.0] * count
+        alias = list(range(count))
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            probability[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        # Whatever is left is 1.0 up to rounding error
+        self.probability = tuple(probability)
+        self.alias = tuple(alias)
+
+    def draw(self, rng=random):
+        """
+        Return an index with probability proportional to its weight.
+        """
+        column = rng.randrange(len(self.probability))
+        return column if rng.random() < self.probability[column] else self.alias[column]
+
+class HashtagSampler:
+    """
+    Weighted sampling without replacement from a deduplicated pool of hashtags.
+
+    The pool is deduplicated and its alias table built once. Draws reject
+    tags that were already taken, which is O(1) expected per tag while the
+    pool is much larger than the number of tags drawn; if rejections pile up,
+    the remaining tags are drawn by a direct weighted choice instead.
+    """
+
+    __slots__ = ("tags", "weights", "_table")
+
+    def __init__(self, tags, weights=None):
+        """
+        Args:
+            tags (list): Hashtags, possibly with duplicates
+            weights (dict, optional): tag -> weight, e.g. from engagement data (default 1.0)
+        """
+        weights = weights or {}
+        self.tags = tuple(dict.fromkeys(tags))
+        self.weights = tuple(max(0.0, float(weights.get(tag, 1.0))) for tag in self.tags)
+        self._table = AliasTable(self.weights) if any(self.weights) else None
+
+    def __len__(self):
+        return len(self.tags)
+
+    def sample(self, count, taken, rng=random):
+        """
+        Draw up to count tags not already in taken, adding them to it.
+
+        Args:
+            count (int): Number of tags wanted
+            taken (set): Tags already used by the caption; updated in place
+
+        Returns:
+            list: The drawn tags, in draw order
+        """
+        drawn = []
+        if self._table is None:
+            return drawn
+
+        tags = self.tags
+        attempts = 4 * count + 8
+        while len(drawn) < count and attempts:
+            attempts -= 1
+            tag = tags[self._table.draw(rng)]
+            if tag not in taken:
+                taken.add(tag)
+                drawn.append(tag)
+
+        if len(drawn) < count:
+            remaining = [(tag, weight) for tag, weight in zip(tags, self.weights) if tag not in taken and weight > 0]
+            while len(drawn) < count and remaining:
+                point = rng.random() * sum(weight for _, weight in remaining)
+                for position, (tag, weight) in enumerate(remaining):
+                    point -= weight
+                    if point < 0:
+                        break
+                del remaining[position]
+                taken.add(tag)
+                drawn.append(tag)
+
+        return drawn
+
+_keyword_index = None
+_keyword_index_lock = threading.Lock()
+
+def get_keyword_index():
+    """
+    Return the process-wide keyword index, loading KEYWORD_INDEX_PATH on first use.
+
+    Returns:
+        KeywordIndex: The shared index
+    """
+    global _keyword_index
+
+    with _keyword_index_lock:
+        if _keyword_index is None:
+            _keyword_index = KeywordIndex.load()
+        return _keyword_index
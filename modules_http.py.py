@@ -0,0 +1,140 @@
+"""
+Shared HTTP session layer for talking to social media APIs.
+"""
+import logging
+import weakref
+import threading
+import functools
+from urllib.parse import urlparse
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds applied when a caller doesn't pass one
+DEFAULT_TIMEOUT = (5, 60)
+
+# Connections kept alive per host
+POOL_MAXSIZE = 10
+
+# Connections the async session opens in total; further requests queue for one
+ASYNC_CONNECTION_LIMIT = 100
+
+def _retry_policy():
+    from urllib3.util.retry import Retry
+
+    # Connection failures happen before anything reaches the server, so they are
+    # safe to retry for any method. Status retries are limited to idempotent
+    # methods so a POST is never sent twice.
+    return Retry(
+        total=3,
+        connect=3,
+        read=0,
+        status=2,
+        backoff_factor=0.5,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+
+def _timeouts():
+    return (
+        float(CONFIG.get('HTTP_CONNECT_TIMEOUT') or DEFAULT_TIMEOUT[0]),
+        float(CONFIG.get('HTTP_READ_TIMEOUT') or DEFAULT_TIMEOUT[1])
+    )
+
+def _new_session():
+    # requests is imported on first use to keep module import cheap
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    timeout = _timeouts()
+    session = requests.Session()
+    # Explicit timeout= arguments still override this default
+    session.request = functools.partial(session.request, timeout=timeout)
+
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=_retry_policy()
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(url):
+    """
+    Return the keep-alive session for the host of url, creating it on first use.
+
+    Each host gets its own session and connection pool, so a slow platform
+    cannot exhaust connections needed by another.
+
+    Args:
+        url (str): Any URL on the target host
+
+    Returns:
+        requests.Session: Session with pooling, retries and default timeouts
+    """
+    host = urlparse(url).netloc
+
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            logger.debug(f"Creating HTTP session for {host}")
+            session = _sessions[host] = _new_session()
+        return session
+
+def close_sessions():
+    """
+    Close every pooled session, e.g. before the process exits.
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+# One aiohttp session per event loop; sessions can't be shared between loops
+_async_sessions = weakref.WeakKeyDictionary()
+
+def get_async_session():
+    """
+    Return the aiohttp session of the running event loop, creating it on first use.
+
+    Every coroutine on the loop shares the session and its connection pool,
+    which holds at most ASYNC_CONNECTION_LIMIT connections. Reads have the same
+    connect and read timeouts as the requests sessions, but no overall limit,
+    so long uploads are not cut off. Await close_async_session() before the
+    loop is closed.
+
+    Returns:
+        aiohttp.ClientSession: The loop's shared session
+    """
+    import asyncio
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        connect_timeout, read_timeout = _timeouts()
+        session = _async_sessions[loop] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=int(CONFIG.get('ASYNC_CONNECTION_LIMIT') or ASYNC_CONNECTION_LIMIT),
+                limit_per_host=0
+            ),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        )
+    return session
+
+async def close_async_session():
+    """
+    Close the running event loop's aiohttp session, if it has one.
+    """
+    import asyncio
+
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
@@ -0,0 +1,519 @@
+"""
+Durable job queue and worker pool for the upload -> caption -> post pipeline.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from collections import namedtuple
+from contextlib import contextmanager
+
+from config import CONFIG
+from modules.rate_limit import POST_OPERATIONS, QuotaExceeded, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# A claimed job whose lease runs out is handed to another worker
+DEFAULT_LEASE_SECONDS = 300
+
+# Failed jobs are retried after RETRY_BASE_DELAY * 2**(attempts - 1) seconds
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 5
+
+# Post jobs whose poster hit a limit the rate limiter can't date are deferred this long
+QUOTA_DEFER_SECONDS = 15 * 60
+
+# How long an idle worker sleeps before looking for work again
+POLL_INTERVAL = 0.5
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+Job = namedtuple('Job', ['id', 'stage', 'payload', 'attempts', 'max_attempts', 'parent_id'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stage TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    parent_id INTEGER,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, available_at);
+"""
+
+class JobQueue:
+    """
+    SQLite-backed queue of pipeline jobs with leases and retries.
+
+    The database runs in WAL mode so workers can claim and finish jobs while
+    others read. A claim takes a lease; a worker that crashes simply stops
+    renewing it, and the job becomes claimable again once the lease expires.
+    A job that raises is requeued with exponential backoff until it has used
+    max_attempts, then marked failed. Completing a job and enqueueing the
+    jobs it leads to happen in one transaction, so a crash never loses or
+    duplicates the next stage.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Location of the SQLite database
+        """
+        self.path = str(path)
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so two workers can't claim the same job
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _insert(self, db, stage, payload, max_attempts, delay, parent_id):
+        now = time.time()
+        cursor = db.execute(
+            "INSERT INTO jobs (stage, payload, state, max_attempts, available_at, parent_id, created, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (stage, json.dumps(payload), QUEUED, max_attempts, now + delay, parent_id, now, now)
+        )
+        return cursor.lastrowid
+
+    def enqueue(self, stage, payload, max_attempts=DEFAULT_MAX_ATTEMPTS, delay=0, parent_id=None):
+        """
+        Add a job.
+
+        Args:
+            stage (str): Stage name, the key of its handler
+            payload (dict): JSON-serializable job input
+            max_attempts (int): Attempts before the job is marked failed
+            delay (float): Seconds before the job may be claimed
+            parent_id (int, optional): Job that created this one
+
+        Returns:
+            int: The new job ID
+        """
+        with self._transaction() as db:
+            return self._insert(db, stage, payload, max_attempts, delay, parent_id)
+
+    def claim(self, worker_id, stages=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Lease the oldest ready job, or a running job whose lease has expired.
+
+        Args:
+            worker_id (str): Identifies the lease holder
+            stages (list, optional): Only claim jobs of these stages
+            lease_seconds (float): How long the job is reserved for worker_id
+
+        Returns:
+            Job: The claimed job, or None if nothing is ready
+        """
+        now = time.time()
+        query = (
+            "SELECT id, stage, payload, attempts, max_attempts, parent_id FROM jobs "
+            "WHERE ((state = ? AND available_at <= ?) OR (state = ? AND lease_expires <= ?))"
+        )
+        params = [QUEUED, now, RUNNING, now]
+        if stages:
+            query += f" AND stage IN ({', '.join('?' * len(stages))})"
+            params.extend(stages)
+        query += " ORDER BY available_at, id LIMIT 1"
+
+        with self._transaction() as db:
+            row = db.execute(query, params).fetchone()
+            if row is None:
+                return None
+
+            job_id, stage, payload, attempts, max_attempts, parent_id = row
+            db.execute(
+                "UPDATE jobs SET state = ?, attempts = ?, lease_owner = ?, lease_expires = ?, updated = ? WHERE id = ?",
+                (RUNNING, attempts + 1, worker_id, now + lease_seconds, now, job_id)
+            )
+
+        return Job(job_id, stage, json.loads(payload), attempts + 1, max_attempts, parent_id)
+
+    def renew(self, job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Extend the lease on a job still held by worker_id.
+
+        Returns:
+            bool: False if the lease was lost to another worker
+        """
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, RUNNING, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, result=None, next_jobs=()):
+        """
+        Mark a job done and enqueue the jobs that follow it, atomically.
+
+        Args:
+            result (dict, optional): JSON-serializable job output
+            next_jobs (list): (stage, payload) pairs to enqueue as children of the job
+
+        Returns:
+            bool: False if the lease was lost, in which case nothing is changed
+        """
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET state = ?, result = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND state = ? AND lease_owner = ?",
+                (DONE, json.dumps(result), now, job_id, RUNNING, worker_id)
+            )
+            if cursor.rowcount != 1:
+                return False
+
+            for stage, payload in next_jobs:
+                self._insert(db, stage, payload, DEFAULT_MAX_ATTEMPTS, 0, job_id)
+            return True
+
+    def fail(self, job_id, worker_id, error):
+        """
+        Record a failed attempt; requeue the job with backoff or mark it failed.
+
+        Returns:
+            str: The job's new state, or None if the lease was lost
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND state = ? AND lease_owner = ?",
+                (job_id, RUNNING, worker_id)
+            ).fetchone()
+            if row is None:
+                return None
+
+            attempts, max_attempts = row
+            if attempts < max_attempts:
+                state = QUEUED
+                available_at = now + RETRY_BASE_DELAY * 2 ** (attempts - 1) * (1 + random.random())
+            else:
+                state = FAILED
+                available_at = now
+
+            db.execute(
+                "UPDATE jobs SET state = ?, error = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, "
+                "updated = ? WHERE id = ?",
+                (state, str(error), available_at, now, job_id)
+            )
+            return state
+
+    def defer(self, job_id, worker_id, until, reason):
+        """
+        Put a job back in the queue until the given time without counting an attempt.
+
+        Used when a job could not run yet, e.g. because a platform quota is used up.
+
+        Returns:
+            bool: False if the lease was lost
+        """
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts - 1, error = ?, available_at = ?, "
+                "lease_owner = NULL, lease_expires = NULL, updated = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                (QUEUED, str(reason), until, now, job_id, RUNNING, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def counts(self):
+        """
+        Return the number of jobs per state.
+
+        Returns:
+            dict: state -> count
+        """
+        rows = self._connection().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    def pending(self):
+        """
+        Return the number of jobs that are queued or running.
+        """
+        counts = self.counts()
+        return counts.get(QUEUED, 0) + counts.get(RUNNING, 0)
+
+    def close(self):
+        """
+        Close this thread's connection.
+        """
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """
+    Return the process-wide job queue (JOB_QUEUE_PATH).
+
+    Returns:
+        JobQueue: The shared queue
+    """
+    global _job_queue
+
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(CONFIG.get('JOB_QUEUE_PATH') or BASE_DIR / ".jobs.sqlite3")
+        return _job_queue
+
+class WorkerPool:
+    """
+    Threads that claim jobs from a JobQueue and run the handler for their stage.
+
+    Handlers take the job payload and return (result, next_jobs), where
+    next_jobs is a list of (stage, payload) pairs. Every worker takes jobs
+    of any stage, so one video's post stage runs while the next video is
+    still uploading. Leases of running jobs are renewed in the background,
+    so a handler may run longer than the lease.
+    """
+
+    def __init__(self, queue, handlers, workers=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            queue (JobQueue): Queue to work on
+            handlers (dict): stage -> callable(payload) returning (result, next_jobs)
+            workers (int, optional): Number of worker threads (default: JOB_WORKERS, or 4)
+            lease_seconds (float): Lease taken on each claimed job
+            poll_interval (float): Idle sleep between claim attempts
+        """
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers or int(CONFIG.get('JOB_WORKERS') or 4)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+        self._active = {}
+        self._active_lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the worker and lease renewal threads.
+        """
+        self._stop.clear()
+        prefix = uuid.uuid4().hex[:8]
+        self._threads = [
+            threading.Thread(target=self._work, args=(f"{prefix}-{i}",), name=f'job-worker-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        self._threads.append(threading.Thread(target=self._renew_leases, name='job-leases', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Ask the workers to stop after their current job and wait for them.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_until_idle(self, timeout=None):
+        """
+        Work until no job is queued or running, then stop.
+
+        Jobs waiting out a retry delay count as queued, so this also waits for retries.
+
+        Returns:
+            dict: Final job counts per state
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        self.start()
+        try:
+            while self.queue.pending():
+                if deadline and time.monotonic() >= deadline:
+                    break
+                time.sleep(self.poll_interval)
+        finally:
+            self.stop()
+        return self.queue.counts()
+
+    def _work(self, worker_id):
+        stages = list(self.handlers)
+        try:
+            while not self._stop.is_set():
+                job = self.queue.claim(worker_id, stages, self.lease_seconds)
+                if job is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                self._run(worker_id, job)
+        finally:
+            self.queue.close()
+
+    def _run(self, worker_id, job):
+        with self._active_lock:
+            self._active[job.id] = worker_id
+
+        try:
+            logger.info(f"Running {job.stage} job {job.id} (attempt {job.attempts}/{job.max_attempts})")
+            result, next_jobs = self.handlers[job.stage](job.payload)
+        except QuotaExceeded as e:
+            # Deferring reorders the queue: jobs for other platforms run in the meantime
+            logger.info(f"Deferring {job.stage} job {job.id}: {str(e)}")
+            self.queue.defer(job.id, worker_id, e.retry_at, e)
+        except Exception as e:
+            state = self.queue.fail(job.id, worker_id, e)
+            log = logger.error if state == FAILED else logger.warning
+            log(f"{job.stage} job {job.id} failed ({state or 'lease lost'}): {str(e)}")
+        else:
+            if not self.queue.complete(job.id, worker_id, result, next_jobs):
+                logger.warning(f"Lost the lease on {job.stage} job {job.id}; its result was discarded")
+        finally:
+            with self._active_lock:
+                del self._active[job.id]
+
+    def _renew_leases(self):
+        try:
+            while not self._stop.wait(self.lease_seconds / 3):
+                with self._active_lock:
+                    active = list(self._active.items())
+                for job_id, worker_id in active:
+                    self.queue.renew(job_id, worker_id, self.lease_seconds)
+        finally:
+            self.queue.close()
+
+def publish_handlers(upload, caption, posters, rate_limiter=None):
+    """
+    Build the upload -> caption -> post pipeline handlers around platform adapters.
+
+    Args:
+        upload (callable): (video_path) -> (file_id, share_link), e.g. storage.upload_to_drive
+        caption (callable): (title) -> (caption, hashtags), e.g. generate_hinglish_caption
+        posters (dict): platform -> callable(payload) returning a truthy value (e.g. a PostResult) on success
+        rate_limiter (RateLimiter, optional): Post jobs that don't fit its limits are
+            deferred until they do instead of being attempted
+
+    Returns:
+        dict: stage -> handler, for WorkerPool
+    """
+    def upload_stage(payload):
+        file_id, share_link = upload(payload['video_path'])
+        result = {'file_id': file_id, 'video_url': share_link}
+        return result, [('caption', dict(payload, **result))]
+
+    def caption_stage(payload):
+        text, hashtags = caption(payload['title'])
+        full_caption = f"{text}\n\n{' '.join(hashtags)}"
+        return {'caption': full_caption}, [
+            ('post', dict(payload, caption=full_caption, platform=platform))
+            for platform in payload['platforms']
+        ]
+
+    def post_stage(payload):
+        platform = payload['platform']
+        if rate_limiter:
+            retry_at = rate_limiter.check(platform, POST_OPERATIONS.get(platform, 'post'))
+            if retry_at and retry_at - time.time() > rate_limiter.max_wait:
+                raise QuotaExceeded(platform, retry_at, "is over its rate limit or quota")
+        result = posters[platform](payload)
+        if not result:
+            if getattr(result, 'error_class', None) == 'quota':
+                # Out of quota after all: defer the job rather than use up an attempt
+                retry_at = rate_limiter.check(platform, POST_OPERATIONS.get(platform, 'post')) if rate_limiter else None
+                raise QuotaExceeded(platform, retry_at or time.time() + QUOTA_DEFER_SECONDS, "is over its rate limit or quota")
+            raise RuntimeError(f"Posting to {platform} failed")
+        # Live posters return a PostResult; keep what was created with the job
+        return {
+            'platform': platform,
+            'remote_id': getattr(result, 'remote_id', None),
+            'url': getattr(result, 'url', None)
+        }, []
+
+    return {'upload': upload_stage, 'caption': caption_stage, 'post': post_stage}
+
+def live_handlers():
+    """
+    Pipeline handlers backed by Google Drive, the caption generator and the social media APIs.
+    """
+    from modules import social_media
+    from modules.storage import upload_to_drive
+    from modules.caption_generator import generate_hinglish_caption
+
+    posters = {
+        # Uploaded directly: the Drive link is an HTML page, not a downloadable video
+        'instagram': lambda p: social_media.post_to_instagram(p['video_path'], p['caption']),
+        'facebook': lambda p: social_media.post_to_facebook(p['video_url'], p['caption']),
+        'youtube': lambda p: social_media.post_to_youtube(p['video_path'], p['title'], p['description']),
+        'linkedin': lambda p: social_media.post_to_linkedin(p['video_url'], p['caption'])
+    }
+    return publish_handlers(upload_to_drive, generate_hinglish_caption, posters, get_rate_limiter())
+
+def stub_handlers(latency=0.0, failure_rate=0.0, rate_limiter=None):
+    """
+    Offline pipeline handlers that only sleep, for local runs and tests of the pipeline.
+
+    Args:
+        latency (float): Seconds each stub call takes
+        failure_rate (float): Probability that a stub call raises
+        rate_limiter (RateLimiter, optional): Limits to schedule post jobs against
+    """
+    def stub(name, value):
+        def call(*args):
+            time.sleep(latency)
+            if random.random() < failure_rate:
+                raise RuntimeError(f"Injected {name} failure")
+            return value(*args)
+        return call
+
+    upload = stub('upload', lambda path: (uuid.uuid4().hex[:28], f"https://drive.example/{os.path.basename(path)}"))
+    caption = stub('caption', lambda title: (f"Stub caption for {title}", ['#stub']))
+    posters = {
+        platform: stub(platform, lambda payload: True)
+        for platform in ('instagram', 'facebook', 'youtube', 'linkedin')
+    }
+    return publish_handlers(upload, caption, posters, rate_limiter)
+
+def enqueue_video(queue, video_path, title, description, platforms):
+    """
+    Queue a rendered video for upload, captioning and posting.
+
+    Returns:
+        int: ID of the upload job that starts the pipeline
+    """
+    return queue.enqueue('upload', {
+        'video_path': video_path,
+        'title': title,
+        'description': description,
+        'platforms': list(platforms)
+    })
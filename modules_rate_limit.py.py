@@ -0,0 +1,439 @@
+"""
+Per-platform rate limiting and daily quota accounting for social media APIs.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import datetime
+import threading
+import email.utils
+from pathlib import Path
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Sustained requests per second and burst size, per platform and credential
+PLATFORM_RATES = {
+    'instagram': (1 / 60, 5),
+    'facebook': (1 / 10, 10),
+    'youtube': (1 / 60, 3),
+    'linkedin': (1 / 30, 5)
+}
+
+# Daily budget in quota units; platforms not listed have no daily cap
+PLATFORM_DAILY_QUOTAS = {
+    'youtube': 10000,
+    # Content publishing API limit per Instagram account
+    'instagram': 25,
+    'linkedin': 150
+}
+
+# Quota units charged per operation; anything not listed costs 1
+OPERATION_COSTS = {
+    ('youtube', 'videos.insert'): 1600
+}
+
+# Operation each platform's post_to_* call is charged as
+POST_OPERATIONS = {
+    'youtube': 'videos.insert'
+}
+
+# Daily quotas reset at midnight in this timezone (UTC if not listed)
+QUOTA_RESET_TIMEZONES = {
+    'youtube': 'America/Los_Angeles'
+}
+
+# Credential settings hashed into the key that limits and quotas are tracked under
+CREDENTIAL_SETTINGS = {
+    'instagram': 'INSTAGRAM_ACCESS_TOKEN',
+    'facebook': 'FACEBOOK_ACCESS_TOKEN',
+    'youtube': 'YOUTUBE_OAUTH_CREDENTIALS',
+    'linkedin': 'LINKEDIN_ACCESS_TOKEN'
+}
+
+# Waits longer than this raise QuotaExceeded instead of blocking the caller
+DEFAULT_MAX_WAIT = 60
+
+# Back off once Facebook reports this share of any usage limit as used
+USAGE_BACKOFF_PERCENT = 90
+USAGE_BACKOFF_SECONDS = 300
+
+# Response error reasons that mean the daily quota is gone
+QUOTA_ERROR_REASONS = ('quotaExceeded', 'dailyLimitExceeded')
+
+class QuotaExceeded(Exception):
+    """
+    Raised instead of making a call that the platform would reject.
+
+    Attributes:
+        platform (str): Platform whose limit was hit
+        retry_at (float): Epoch time at which the call should fit again
+    """
+
+    def __init__(self, platform, retry_at, reason):
+        super().__init__(
+            f"{platform} {reason}; retry after {datetime.datetime.fromtimestamp(retry_at):%Y-%m-%d %H:%M:%S}"
+        )
+        self.platform = platform
+        self.retry_at = retry_at
+
+def credential_key(platform):
+    """
+    Return a short, non-reversible key for the platform's configured credential.
+    """
+    credential = str(CONFIG.get(CREDENTIAL_SETTINGS.get(platform, '')) or '')
+    if not credential:
+        return 'default'
+    return hashlib.sha256(credential.encode('utf-8')).hexdigest()[:12]
+
+def _quota_day(platform, now):
+    # Returns (day label, epoch time of the next reset)
+    try:
+        from zoneinfo import ZoneInfo
+        timezone = ZoneInfo(QUOTA_RESET_TIMEZONES.get(platform, 'UTC'))
+    except Exception:
+        timezone = datetime.timezone.utc
+
+    local = datetime.datetime.fromtimestamp(now, timezone)
+    midnight = datetime.datetime.combine(local.date() + datetime.timedelta(days=1), datetime.time(), timezone)
+    return local.date().isoformat(), midnight.timestamp()
+
+def _retry_after(value, now):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return now + float(value)
+    except ValueError:
+        pass
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """
+    Request-rate token bucket that hands out reservations.
+
+    reserve() always takes a token and returns how long the caller must wait
+    before using it, so concurrent callers queue up in order instead of
+    racing for the next refill.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum tokens held, i.e. the allowed burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, tokens=1):
+        """
+        Return the seconds until tokens would be available, without taking them.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens and return the seconds to wait before using them.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+class QuotaLedger:
+    """
+    Persistent record of quota units used today and server-imposed backoffs.
+
+    Entries are keyed by "platform:credential". Units are charged before the
+    call is made, since platforms like YouTube bill failed inserts too.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Location of the JSON ledger file
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _entry(self, platform, credential, now):
+        day, _ = _quota_day(platform, now)
+        entry = self._load().setdefault(f"{platform}:{credential}", {'day': day, 'used': 0, 'blocked_until': 0})
+        if entry['day'] != day:
+            entry['day'] = day
+            entry['used'] = 0
+        return entry
+
+    def used(self, platform, credential):
+        """
+        Return the quota units used today.
+        """
+        with self._lock:
+            return self._entry(platform, credential, time.time())['used']
+
+    def blocked_until(self, platform, credential):
+        """
+        Return the epoch time before which no calls should be made (0 if none).
+        """
+        with self._lock:
+            return self._entry(platform, credential, time.time())['blocked_until']
+
+    def charge(self, platform, credential, units, quota=None):
+        """
+        Add units to today's usage unless that would go over quota.
+
+        Returns:
+            bool: False if the units did not fit and nothing was charged
+        """
+        with self._lock:
+            entry = self._entry(platform, credential, time.time())
+            if quota is not None and entry['used'] + units > quota:
+                return False
+            entry['used'] += units
+            self._save()
+            return True
+
+    def exhaust(self, platform, credential, quota):
+        """
+        Record that the platform reported the daily quota as used up.
+        """
+        with self._lock:
+            entry = self._entry(platform, credential, time.time())
+            entry['used'] = max(entry['used'], quota or 0)
+            self._save()
+
+    def block(self, platform, credential, until):
+        """
+        Hold off calls until the given epoch time.
+        """
+        with self._lock:
+            entry = self._entry(platform, credential, time.time())
+            entry['blocked_until'] = max(entry['blocked_until'], until)
+            self._save()
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except ValueError:
+                logger.warning(f"Ignoring corrupt quota ledger: {self.path}")
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+class RateLimiter:
+    """
+    Gatekeeper for social media API calls.
+
+    Every call first passes a token bucket per platform and credential, then
+    the daily quota in the ledger, then any backoff the platform asked for
+    through Retry-After or usage headers. Short waits are slept off; a call
+    that could not go ahead within max_wait raises QuotaExceeded with the time
+    it will fit, so schedulers can requeue it rather than waste a request
+    that would be rejected.
+    """
+
+    def __init__(self, ledger, rates=None, quotas=None, costs=None, max_wait=DEFAULT_MAX_WAIT):
+        """
+        Args:
+            ledger (QuotaLedger): Where daily usage and backoffs are persisted
+            rates (dict, optional): platform -> (requests per second, burst), default PLATFORM_RATES
+            quotas (dict, optional): platform -> daily units, default PLATFORM_DAILY_QUOTAS
+            costs (dict, optional): (platform, operation) -> units, default OPERATION_COSTS
+            max_wait (float): Longest acquire() will block before raising QuotaExceeded
+        """
+        self.ledger = ledger
+        self.rates = rates or PLATFORM_RATES
+        self.quotas = quotas or PLATFORM_DAILY_QUOTAS
+        self.costs = costs or OPERATION_COSTS
+        self.max_wait = max_wait
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, platform, credential):
+        with self._lock:
+            bucket = self._buckets.get((platform, credential))
+            if bucket is None and platform in self.rates:
+                bucket = self._buckets[(platform, credential)] = TokenBucket(*self.rates[platform])
+            return bucket
+
+    def check(self, platform, operation='post', credential=None):
+        """
+        Return when a call could be made, without making or charging it.
+
+        Returns:
+            float: Epoch time the call would fit, or None if it fits now
+        """
+        credential = credential or credential_key(platform)
+        now = time.time()
+        retry_at = []
+
+        quota = self.quotas.get(platform)
+        cost = self.costs.get((platform, operation), 1)
+        if quota is not None and self.ledger.used(platform, credential) + cost > quota:
+            retry_at.append(_quota_day(platform, now)[1])
+
+        blocked_until = self.ledger.blocked_until(platform, credential)
+        if blocked_until > now:
+            retry_at.append(blocked_until)
+
+        bucket = self._bucket(platform, credential)
+        delay = bucket.delay() if bucket else 0
+        if delay:
+            retry_at.append(now + delay)
+
+        return max(retry_at) if retry_at else None
+
+    def acquire(self, platform, operation='post', credential=None, max_wait=None):
+        """
+        Wait until a call is allowed, then charge its quota units.
+
+        Args:
+            platform (str): Platform being called
+            operation (str): Operation name, used to look up its quota cost
+            credential (str, optional): Credential key (default: credential_key(platform))
+            max_wait (float, optional): Overrides the limiter's max_wait
+
+        Raises:
+            QuotaExceeded: If the call would not be allowed within max_wait
+        """
+        credential = credential or credential_key(platform)
+        max_wait = self.max_wait if max_wait is None else max_wait
+        now = time.time()
+
+        quota = self.quotas.get(platform)
+        cost = self.costs.get((platform, operation), 1)
+        used = self.ledger.used(platform, credential)
+        if quota is not None and used + cost > quota:
+            raise QuotaExceeded(
+                platform, _quota_day(platform, now)[1],
+                f"daily quota used ({used}/{quota} units, {operation} needs {cost})"
+            )
+
+        wait = max(0.0, self.ledger.blocked_until(platform, credential) - now)
+        if wait > max_wait:
+            raise QuotaExceeded(platform, now + wait, "asked us to back off")
+
+        bucket = self._bucket(platform, credential)
+        if bucket:
+            if bucket.delay() > max_wait:
+                raise QuotaExceeded(platform, now + bucket.delay(), "rate limit reached")
+            wait = max(wait, bucket.reserve())
+
+        if wait:
+            logger.info(f"Waiting {wait:.1f}s for the {platform} rate limit")
+            time.sleep(wait)
+
+        # Concurrent callers may have used the remaining quota while we waited
+        if not self.ledger.charge(platform, credential, cost, quota):
+            raise QuotaExceeded(platform, _quota_day(platform, time.time())[1], f"daily quota used by {operation}")
+
+    def observe(self, platform, status, headers, body='', credential=None):
+        """
+        Adapt to a platform response: honour Retry-After, usage headers and quota errors.
+
+        Args:
+            platform (str): Platform that answered
+            status (int): HTTP status code
+            headers (dict): Response headers
+            body (str): Response body, checked for quota error reasons
+            credential (str, optional): Credential key (default: credential_key(platform))
+        """
+        credential = credential or credential_key(platform)
+        now = time.time()
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+
+        if status in (403, 429) and any(reason in (body or '') for reason in QUOTA_ERROR_REASONS):
+            logger.warning(f"{platform} reports the daily quota as used up")
+            self.ledger.exhaust(platform, credential, self.quotas.get(platform))
+            self.ledger.block(platform, credential, _quota_day(platform, now)[1])
+            return
+
+        retry_at = _retry_after(headers.get('retry-after'), now)
+        if retry_at is None and status == 429:
+            retry_at = now + USAGE_BACKOFF_SECONDS
+        if retry_at:
+            logger.warning(f"{platform} asked us to back off for {retry_at - now:.0f}s")
+            self.ledger.block(platform, credential, retry_at)
+            return
+
+        # Facebook reports how close the app or page is to its limits as percentages
+        for name in ('x-app-usage', 'x-business-use-case-usage'):
+            usage = self._usage_percent(headers.get(name))
+            if usage is not None and usage >= USAGE_BACKOFF_PERCENT:
+                logger.warning(f"{platform} usage at {usage:.0f}% of its limit, backing off")
+                self.ledger.block(platform, credential, now + USAGE_BACKOFF_SECONDS)
+                return
+
+    @staticmethod
+    def _usage_percent(value):
+        if not value:
+            return None
+        try:
+            usage = json.loads(value)
+        except ValueError:
+            return None
+
+        # X-Business-Use-Case-Usage nests a list of usage dicts per business ID
+        if isinstance(usage, dict) and all(isinstance(entry, list) for entry in usage.values()):
+            usage = [entry for entries in usage.values() for entry in entries]
+        else:
+            usage = [usage]
+
+        percents = [
+            value for entry in usage if isinstance(entry, dict)
+            for key, value in entry.items()
+            if key in ('call_count', 'total_cputime', 'total_time') and isinstance(value, (int, float))
+        ]
+        return max(percents) if percents else None
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """
+    Return the process-wide rate limiter (ledger at RATE_LIMIT_LEDGER_PATH).
+
+    Returns:
+        RateLimiter: The limiter shared by every social media call
+    """
+    global _rate_limiter
+
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            quotas = dict(PLATFORM_DAILY_QUOTAS)
+            if CONFIG.get('YOUTUBE_DAILY_QUOTA'):
+                quotas['youtube'] = int(CONFIG['YOUTUBE_DAILY_QUOTA'])
+            _rate_limiter = RateLimiter(
+                QuotaLedger(CONFIG.get('RATE_LIMIT_LEDGER_PATH') or BASE_DIR / ".quota_ledger.json"),
+                quotas=quotas,
+                max_wait=float(CONFIG.get('RATE_LIMIT_MAX_WAIT') or DEFAULT_MAX_WAIT)
+            )
+        return _rate_limiter
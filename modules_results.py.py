@@ -0,0 +1,157 @@
+"""
+Structured results of social media posts and a local store to query them.
+"""
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+class PostResult:
+    """
+    Outcome of posting one video to one platform.
+
+    Truthy when the post was made, so code written against the old boolean
+    return values keeps working.
+
+    Attributes:
+        platform (str): Platform posted to
+        remote_id (str): ID the platform assigned to the post, or None
+        url (str): Public URL of the post, when it can be derived without an API call
+        latency (float): Seconds spent on the request(s) of the successful attempt
+        bytes_sent (int): Request payload bytes of the successful attempt
+        attempts (int): Requests made; 0 when the post was skipped or already made earlier
+        error_class (str): Failure class (see retry.classify_error), None on success
+        error (str): Failure message, None on success
+        posted_at (float): Epoch time the result was produced
+    """
+
+    __slots__ = ('platform', 'remote_id', 'url', 'latency', 'bytes_sent', 'attempts', 'error_class', 'error', 'posted_at')
+
+    def __init__(self, platform, remote_id=None, url=None, latency=0.0, bytes_sent=0, attempts=0,
+                 error_class=None, error=None, posted_at=None):
+        self.platform = platform
+        self.remote_id = remote_id
+        self.url = url
+        self.latency = latency
+        self.bytes_sent = bytes_sent
+        self.attempts = attempts
+        self.error_class = error_class
+        self.error = error
+        self.posted_at = time.time() if posted_at is None else posted_at
+
+    @property
+    def success(self):
+        return self.error_class is None
+
+    def __bool__(self):
+        return self.success
+
+    def __repr__(self):
+        if self.success:
+            return f"PostResult({self.platform!r}, remote_id={self.remote_id!r}, attempts={self.attempts})"
+        return f"PostResult({self.platform!r}, error_class={self.error_class!r}, error={self.error!r})"
+
+    def to_record(self):
+        """
+        Return the result as a list in __slots__ order, the compact on-disk form.
+        """
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(*record)
+
+    @classmethod
+    def failed(cls, platform, error, error_class, attempts=0, latency=0.0):
+        """
+        Build the result of a post that was not made.
+        """
+        return cls(platform, latency=latency, attempts=attempts, error_class=error_class, error=str(error))
+
+class ResultsStore:
+    """
+    Append-only JSON Lines file of PostResult records.
+
+    Each line is a bare list of field values, so the file stays small, and
+    appends are a single write so concurrent posters don't interleave lines.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Location of the results file
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+
+    def append(self, result):
+        """
+        Record a PostResult.
+        """
+        line = json.dumps(result.to_record(), separators=(',', ':')) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def query(self, platform=None, since=None, successful=None):
+        """
+        Yield stored results, oldest first.
+
+        Args:
+            platform (str, optional): Only results for this platform
+            since (float, optional): Only results posted at or after this epoch time
+            successful (bool, optional): Only successful (True) or failed (False) posts
+        """
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+
+        with f:
+            for line in f:
+                try:
+                    result = PostResult.from_record(json.loads(line))
+                except (ValueError, TypeError):
+                    # A torn last line from a crash mid-append
+                    logger.warning(f"Skipping unreadable line in {self.path}")
+                    continue
+                if platform is not None and result.platform != platform:
+                    continue
+                if since is not None and result.posted_at < since:
+                    continue
+                if successful is not None and result.success != successful:
+                    continue
+                yield result
+
+    def latest(self, platform):
+        """
+        Return the most recent successful result for a platform, or None.
+        """
+        latest = None
+        for latest in self.query(platform, successful=True):
+            pass
+        return latest
+
+_results_store = None
+_results_store_lock = threading.Lock()
+
+def get_results_store():
+    """
+    Return the process-wide results store (RESULTS_STORE_PATH).
+
+    Returns:
+        ResultsStore: The store every post_to_* call appends to
+    """
+    global _results_store
+
+    with _results_store_lock:
+        if _results_store is None:
+            _results_store = ResultsStore(CONFIG.get('RESULTS_STORE_PATH') or BASE_DIR / ".post_results.jsonl")
+        return _results_store
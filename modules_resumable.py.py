@@ -0,0 +1,395 @@
+"""
+Resumable upload helpers shared by the storage and social media modules.
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+from pathlib import Path
+from collections import namedtuple
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Resumable upload chunks must be a multiple of this size
+CHUNK_ALIGNMENT = 256 * 1024
+
+# Upload sessions expire on Google's side after a week; don't try to resume older ones
+SESSION_MAX_AGE = 6 * 24 * 60 * 60
+
+# Chunk retries after a 5xx or dropped connection, with exponential backoff from this many seconds
+MAX_CHUNK_RETRIES = 5
+RETRY_BASE_DELAY = 1
+
+RETRIABLE_STATUS_CODES = (500, 502, 503, 504)
+
+UploadProgress = namedtuple('UploadProgress', ['bytes_sent', 'total_bytes', 'bytes_per_second', 'eta_seconds'])
+
+def normalize_chunk_size(chunk_size):
+    """
+    Round a chunk size down to the nearest multiple of 256 KiB (minimum 256 KiB).
+
+    Args:
+        chunk_size (int): Requested chunk size in bytes
+
+    Returns:
+        int: A chunk size accepted by Google resumable upload endpoints
+    """
+    return max(CHUNK_ALIGNMENT, int(chunk_size) // CHUNK_ALIGNMENT * CHUNK_ALIGNMENT)
+
+def journal_key(destination, file_path):
+    """
+    Build a journal key that changes whenever the file on disk changes.
+
+    Args:
+        destination (str): Where the file is going, e.g. "drive" or "youtube"
+        file_path (str): Path to the file being uploaded
+
+    Returns:
+        str: Key identifying this upload of this exact file
+    """
+    stat = os.stat(file_path)
+    return f"{destination}:{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+class UploadJournal:
+    """
+    Small on-disk record of in-progress resumable upload sessions.
+
+    Each entry maps a journal key to the session URI and the last byte offset
+    the server acknowledged. The file is rewritten atomically after every
+    committed chunk, so a crashed worker leaves a usable journal behind.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Location of the JSON journal file
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the journaled session for key, or None if there is no live session.
+
+        Returns:
+            dict: {'session_uri': str, 'offset': int, 'updated': float} or None
+        """
+        with self._lock:
+            entry = self._load().get(key)
+
+        if entry and time.time() - entry['updated'] < SESSION_MAX_AGE:
+            return entry
+        return None
+
+    def record(self, key, session_uri, offset):
+        """
+        Persist the session URI and acknowledged offset for key.
+        """
+        with self._lock:
+            entries = self._load()
+            entries[key] = {
+                'session_uri': session_uri,
+                'offset': offset,
+                'updated': time.time()
+            }
+            self._save(entries)
+
+    def discard(self, key):
+        """
+        Forget the session for key once the upload has finished or become unusable.
+        """
+        with self._lock:
+            entries = self._load()
+            if entries.pop(key, None) is not None:
+                self._save(entries)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning(f"Ignoring corrupt upload journal: {self.path}")
+            return {}
+
+    def _save(self, entries):
+        # Drop expired sessions while we are rewriting the file anyway
+        cutoff = time.time() - SESSION_MAX_AGE
+        entries = {key: entry for key, entry in entries.items() if entry['updated'] >= cutoff}
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_upload_journal():
+    """
+    Return the process-wide upload journal (UPLOAD_JOURNAL_PATH).
+
+    Returns:
+        UploadJournal: The journal shared by every resumable upload
+    """
+    global _journal
+
+    with _journal_lock:
+        if _journal is None:
+            _journal = UploadJournal(
+                CONFIG.get('UPLOAD_JOURNAL_PATH') or BASE_DIR / ".upload_journal.json"
+            )
+        return _journal
+
+def _is_retriable(error):
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRIABLE_STATUS_CODES
+    # Connection resets, timeouts and other transport failures
+    return isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+def _interrupted(error):
+    # A transport failure leaves the upload resumable from its journaled session,
+    # so resending it can't publish the file twice; errors with a status keep
+    # their own classification
+    from modules.retry import NotPublished
+
+    if getattr(error, 'status', None) is not None or hasattr(error, 'resp'):
+        return error
+    interrupted = NotPublished(f"Upload interrupted, resumable from the journal: {error}")
+    interrupted.__cause__ = error
+    return interrupted
+
+def run_resumable_upload(new_request, journal, key, progress_callback=None, before_chunk=None,
+                         max_retries=MAX_CHUNK_RETRIES):
+    """
+    Drive a googleapiclient resumable request chunk by chunk, resuming from the journal.
+
+    If the journal holds a session for key, the upload first asks the server
+    how many bytes it has committed and continues from there. After every
+    acknowledged chunk the session URI and offset are written to the journal.
+    A chunk that fails with a 5xx or a transport error is retried with
+    jittered exponential backoff, again from the server's committed offset.
+
+    Args:
+        new_request (callable): Returns a fresh resumable googleapiclient HttpRequest
+        journal (UploadJournal): Journal to resume from and record progress in
+        key (str): Journal key for this upload (see journal_key)
+        progress_callback (callable, optional): Called with an UploadProgress after every chunk
+        before_chunk (callable, optional): Called with the size of the next chunk before it is sent
+        max_retries (int): Consecutive failed attempts allowed per chunk
+
+    Returns:
+        dict: The API response body for the completed upload
+    """
+    from googleapiclient.errors import HttpError
+
+    request = new_request()
+
+    entry = journal.get(key)
+    if entry:
+        logger.info(f"Resuming upload from byte {entry['offset']}: {key}")
+        request.resumable_uri = entry['session_uri']
+        request.resumable_progress = entry['offset']
+        # Makes next_chunk() query the committed offset before sending anything
+        request._in_error_state = True
+
+    media = request.resumable
+    total_bytes = media.size()
+    start_offset = request.resumable_progress
+    start_time = time.monotonic()
+    failures = 0
+
+    response = None
+    while response is None:
+        if before_chunk:
+            before_chunk(min(media.chunksize(), total_bytes - request.resumable_progress))
+
+        try:
+            _, response = request.next_chunk()
+        except Exception as error:
+            # The journaled session has expired or been cancelled; start over once
+            if entry and isinstance(error, HttpError) and error.resp.status in (404, 410):
+                logger.warning(f"Upload session expired, restarting from byte 0: {key}")
+                journal.discard(key)
+                request = new_request()
+                entry = None
+                start_offset = 0
+                continue
+
+            failures += 1
+            if not _is_retriable(error):
+                raise
+            if request.resumable_uri is not None:
+                # The final chunk may have gone through; a later call must ask this
+                # session rather than start another upload
+                journal.record(key, request.resumable_uri, request.resumable_progress)
+            if failures > max_retries:
+                raise _interrupted(error)
+
+            delay = RETRY_BASE_DELAY * 2 ** (failures - 1) * (1 + random.random())
+            logger.warning(f"Upload chunk failed ({error}), retrying in {delay:.1f}s: {key}")
+            time.sleep(delay)
+            # Ask the server where it got to before resending anything
+            request._in_error_state = request.resumable_uri is not None
+            continue
+
+        failures = 0
+        if response is None:
+            journal.record(key, request.resumable_uri, request.resumable_progress)
+
+        if progress_callback:
+            bytes_sent = total_bytes if response is not None else request.resumable_progress
+            elapsed = time.monotonic() - start_time
+            bytes_per_second = (bytes_sent - start_offset) / elapsed if elapsed > 0 else 0.0
+            eta_seconds = (total_bytes - bytes_sent) / bytes_per_second if bytes_per_second else None
+            progress_callback(UploadProgress(bytes_sent, total_bytes, bytes_per_second, eta_seconds))
+
+    journal.discard(key)
+    return response
+
+async def _put_range(session, session_uri, headers, destination, body, offset=None, length=0):
+    """
+    Send bytes offset..offset+length-1 of a resumable upload, or ask for its status when offset is None.
+
+    Returns:
+        tuple: (response body when the upload is complete else None, bytes committed by the server)
+    """
+    from modules.retry import PlatformError
+
+    total_bytes = body.size
+    if offset is None or not length:
+        content_range = f"bytes */{total_bytes}"
+        data = None
+        length = 0
+    else:
+        content_range = f"bytes {offset}-{offset + length - 1}/{total_bytes}"
+        data = body.stream(offset, length)
+
+    request_headers = dict(headers, **{'Content-Length': str(length), 'Content-Range': content_range})
+    # 308 means "resume incomplete" here, not a redirect
+    async with session.put(session_uri, data=data, headers=request_headers, allow_redirects=False) as response:
+        body = await response.read()
+        if response.status in (200, 201):
+            return json.loads(body) if body else {}, total_bytes
+        if response.status == 308:
+            # "Range: bytes=0-N" is what the server has; no header means nothing yet
+            byte_range = response.headers.get('Range')
+            return None, int(byte_range.rsplit('-', 1)[1]) + 1 if byte_range else 0
+        raise PlatformError(destination, response.status, body.decode('utf-8', 'replace'), response.headers)
+
+def _is_retriable_async(error):
+    import asyncio
+    import aiohttp
+
+    status = getattr(error, 'status', None)
+    if status is not None:
+        return status in RETRIABLE_STATUS_CODES
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+
+async def run_resumable_upload_async(session, start_session, body, journal, key, chunk_size, headers=None,
+                                     progress_callback=None, before_chunk=None, max_retries=MAX_CHUNK_RETRIES):
+    """
+    Upload a file with the Google resumable upload protocol over aiohttp, resuming from the journal.
+
+    The asyncio counterpart of run_resumable_upload, with the same journal
+    entries and retry behaviour. Chunks are streamed from the memory-mapped
+    body rather than read into memory, so many uploads can run at once on one
+    event loop.
+
+    Args:
+        session (aiohttp.ClientSession): Session to upload with, see http.get_async_session
+        start_session (callable): Coroutine function that opens an upload session
+            and returns its URI
+        body (UploadBody): The file to upload, or a TeeSink sharing one read of it
+        journal (UploadJournal): Journal to resume from and record progress in
+        key (str): Journal key for this upload (see journal_key)
+        chunk_size (int): Bytes per chunk, a multiple of CHUNK_ALIGNMENT
+        headers (dict, optional): Sent with every chunk, e.g. Authorization
+        progress_callback (callable, optional): Called with an UploadProgress after every chunk
+        before_chunk (callable, optional): Coroutine function called with the size of the
+            next chunk before it is sent
+        max_retries (int): Consecutive failed attempts allowed per chunk
+
+    Returns:
+        dict: The API response body for the completed upload
+    """
+    import asyncio
+
+    destination = key.split(':', 1)[0]
+    headers = headers or {}
+    total_bytes = body.size
+
+    entry = journal.get(key)
+    if entry:
+        logger.info(f"Resuming upload from byte {entry['offset']}: {key}")
+        session_uri = entry['session_uri']
+        # Ask the server how far it got before sending anything
+        offset = None
+    else:
+        session_uri = await start_session()
+        # Journaled straight away so a lost response to the final chunk is
+        # resolved by asking this session, not by starting another upload
+        journal.record(key, session_uri, 0)
+        offset = 0
+
+    start_offset = entry['offset'] if entry else 0
+    start_time = time.monotonic()
+    failures = 0
+
+    response = None
+    while response is None:
+        try:
+            if offset is None:
+                response, offset = await _put_range(session, session_uri, headers, destination, body)
+                if response is not None:
+                    break
+
+            length = min(chunk_size, total_bytes - offset)
+            if before_chunk:
+                await before_chunk(length)
+            response, offset = await _put_range(session, session_uri, headers, destination, body, offset, length)
+        except Exception as error:
+            # The journaled session has expired or been cancelled; start over once
+            if entry and getattr(error, 'status', None) in (404, 410):
+                logger.warning(f"Upload session expired, restarting from byte 0: {key}")
+                journal.discard(key)
+                session_uri = await start_session()
+                journal.record(key, session_uri, 0)
+                entry = None
+                offset = start_offset = 0
+                continue
+
+            failures += 1
+            if not _is_retriable_async(error):
+                raise
+            if failures > max_retries:
+                raise _interrupted(error)
+
+            delay = RETRY_BASE_DELAY * 2 ** (failures - 1) * (1 + random.random())
+            logger.warning(f"Upload chunk failed ({error}), retrying in {delay:.1f}s: {key}")
+            await asyncio.sleep(delay)
+            offset = None
+            continue
+
+        failures = 0
+        if response is None:
+            journal.record(key, session_uri, offset)
+
+        if progress_callback:
+            elapsed = time.monotonic() - start_time
+            bytes_per_second = (offset - start_offset) / elapsed if elapsed > 0 else 0.0
+            eta_seconds = (total_bytes - offset) / bytes_per_second if bytes_per_second else None
+            progress_callback(UploadProgress(offset, total_bytes, bytes_per_second, eta_seconds))
+
+    journal.discard(key)
+    return response
@@ -0,0 +1,438 @@
+"""
+Retries, circuit breaking and idempotency for social media posting.
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import namedtuple
+
+from config import CONFIG
+from modules.rate_limit import QuotaExceeded
+from modules.upload_cache import memoized_digest
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+RetryPolicy = namedtuple('RetryPolicy', ['max_attempts', 'base_delay', 'max_delay'])
+
+# Attempts and backoff per error class (see classify_error)
+RETRY_POLICIES = {
+    # Failures to connect, NotPublished, and 5xx or 408 from calls that are safe
+    # to resend: the post did not take effect
+    'transient': RetryPolicy(4, 2, 30),
+    # 429 without a quota error; the rate limiter holds the next attempt back as well
+    'rate_limited': RetryPolicy(3, 30, 300),
+    # The request may or may not have taken effect, e.g. a timeout, or a 5xx from
+    # a gateway in front of a publishing call; never resent blindly
+    'ambiguous': RetryPolicy(1, 0, 0),
+    # Bad request, auth failure, quota used up
+    'permanent': RetryPolicy(1, 0, 0)
+}
+
+# Consecutive failures that open a platform's circuit, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 300
+
+# How long finished posts are remembered
+IDEMPOTENCY_TTL = 7 * 24 * 60 * 60
+
+class PlatformError(RuntimeError):
+    """
+    A platform API answered with an error status.
+    """
+
+    def __init__(self, platform, status, body='', headers=None):
+        super().__init__(f"{platform} API error ({status}): {body}")
+        self.platform = platform
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+class CircuitOpen(RuntimeError):
+    """
+    Raised without calling the platform while its circuit breaker is open.
+    """
+
+class AmbiguousPost(RuntimeError):
+    """
+    Raised instead of resending a post whose earlier attempt may have succeeded.
+    """
+
+class NotPublished(RuntimeError):
+    """
+    A post failed before the request that publishes it, so it is safe to resend.
+    """
+
+def raise_for_status(platform, response, ok=(200,)):
+    """
+    Raise PlatformError unless a requests response has one of the ok statuses.
+    """
+    if response.status_code not in ok:
+        raise PlatformError(platform, response.status_code, response.text, response.headers)
+
+def classify_error(error, idempotent=True):
+    """
+    Sort an exception into one of the RETRY_POLICIES classes.
+
+    Args:
+        error (Exception): What the call raised
+        idempotent (bool): Whether resending the call is harmless. A 5xx or 408
+            from a call that publishes something may come back after it went
+            through, so for those it is ambiguous rather than transient.
+
+    Returns:
+        str: 'transient', 'rate_limited', 'ambiguous' or 'permanent'
+    """
+    status = getattr(error, 'status', None)
+    if status is None and hasattr(error, 'resp'):
+        # googleapiclient.errors.HttpError
+        status = getattr(error.resp, 'status', None)
+
+    if isinstance(error, (QuotaExceeded, CircuitOpen, AmbiguousPost)):
+        return 'permanent'
+    if isinstance(error, NotPublished):
+        return 'transient'
+    if status is not None:
+        status = int(status)
+        if status == 429:
+            return 'rate_limited'
+        if status == 408 or status >= 500:
+            return 'transient' if idempotent else 'ambiguous'
+        return 'permanent'
+
+    # Errors of the async posters; aiohttp can only have raised one if it's loaded
+    aiohttp = sys.modules.get('aiohttp')
+    if aiohttp is not None:
+        # Refused, DNS or TLS failures and connect timeouts: nothing was sent
+        if isinstance(error, (aiohttp.ClientConnectorError, getattr(aiohttp, 'ConnectionTimeoutError', ()))):
+            return 'transient'
+        # Dropped or timed out after the request went out
+        if isinstance(error, (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError,
+                              aiohttp.ServerTimeoutError, aiohttp.ClientPayloadError)):
+            return 'ambiguous'
+
+    import requests
+
+    if isinstance(error, (requests.exceptions.ConnectTimeout, ConnectionRefusedError)):
+        return 'transient'
+    if isinstance(error, requests.exceptions.ConnectionError) and not isinstance(error, requests.exceptions.ReadTimeout):
+        # Failing to establish the connection is safe; a reset mid-request is not
+        reason = str(error).lower()
+        if 'connection refused' in reason or 'name or service not known' in reason or 'failed to establish' in reason:
+            return 'transient'
+        return 'ambiguous'
+    if isinstance(error, (requests.exceptions.Timeout, TimeoutError, OSError)):
+        return 'ambiguous'
+    return 'permanent'
+
+def retry_delay(policy, attempt):
+    """
+    Full-jitter exponential backoff delay before retry number attempt (1-based).
+    """
+    return random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1)))
+
+class CircuitBreaker:
+    """
+    Stops calling a platform that keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast with CircuitOpen. Once reset_timeout has passed, a single trial
+    call is let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, platform, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.platform = platform
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raise CircuitOpen if the platform should not be called right now.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpen(f"{self.platform} circuit is open after {self._failures} consecutive failures")
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"{self.platform} circuit closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or (self._opened_at is None and self._failures >= self.failure_threshold):
+                logger.warning(f"{self.platform} circuit opened for {self.reset_timeout}s")
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def record_skip(self):
+        # The call was not made (e.g. quota); release a trial slot without judging the platform
+        with self._lock:
+            self._trial_running = False
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(platform):
+    """
+    Return the process-wide circuit breaker for a platform.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(platform)
+        if breaker is None:
+            breaker = _breakers[platform] = CircuitBreaker(platform)
+        return breaker
+
+def _video_digest(video):
+    # Local files are identified by content; anything else (e.g. a URL) by its text
+    try:
+        return memoized_digest(video)
+    except (OSError, TypeError, ValueError):
+        return hashlib.sha256(str(video).encode('utf-8')).hexdigest()
+
+def idempotency_key(platform, video, caption):
+    """
+    Key identifying one post of one video with one caption on one platform.
+
+    Args:
+        platform (str): Target platform
+        video (str): Path to the video file, or its URL for URL-based posts
+        caption (str): Caption (or title and description) of the post
+    """
+    payload = '\0'.join((platform, _video_digest(video), caption or ''))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class IdempotencyLedger:
+    """
+    Persistent record of posts that were attempted, keyed by idempotency_key.
+
+    A key is marked pending before the request is sent and done with the
+    platform's result afterwards. A definite failure clears it again. A key
+    left pending, by an ambiguous timeout or a crash, blocks further attempts
+    until someone checks the platform and calls resolve().
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Location of the JSON ledger file
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def get(self, key):
+        """
+        Returns:
+            dict: {'state': 'pending' or 'done', 'result', 'updated'} or None
+        """
+        with self._lock:
+            entry = self._load().get(key)
+            return dict(entry) if entry else None
+
+    def mark(self, key, state, result=None):
+        with self._lock:
+            self._load()[key] = {'state': state, 'result': result, 'updated': time.time()}
+            self._save()
+
+    def discard(self, key):
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                self._save()
+
+    def resolve(self, key, posted, result=None):
+        """
+        Settle a pending key by hand: mark it done, or forget it so the post may be retried.
+        """
+        if posted:
+            self.mark(key, 'done', result)
+        else:
+            self.discard(key)
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except ValueError:
+                logger.warning(f"Ignoring corrupt idempotency ledger: {self.path}")
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        cutoff = time.time() - IDEMPOTENCY_TTL
+        self._entries = {key: entry for key, entry in self._entries.items() if entry['updated'] >= cutoff}
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_idempotency_ledger():
+    """
+    Return the process-wide idempotency ledger (IDEMPOTENCY_LEDGER_PATH).
+    """
+    global _ledger
+
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = IdempotencyLedger(CONFIG.get('IDEMPOTENCY_LEDGER_PATH') or BASE_DIR / ".post_ledger.json")
+        return _ledger
+
+class _RetryRun:
+    """
+    Bookkeeping of one run_with_retry call, shared by the sync and async loops.
+    """
+
+    def __init__(self, platform, key, policies, ledger, breaker, stats, idempotent):
+        self.platform = platform
+        self.key = key
+        self.idempotent = idempotent
+        self.policies = policies or RETRY_POLICIES
+        self.breaker = breaker or get_circuit_breaker(platform)
+        self.stats = {} if stats is None else stats
+        self.stats['attempts'] = 0
+        self.stats['error_class'] = None
+        self.failures = {}
+        self.finished = False
+        self.result = None
+        self.ledger = None
+        if key:
+            self.ledger = ledger or get_idempotency_ledger()
+            entry = self.ledger.get(key)
+            if entry and entry['state'] == 'done':
+                logger.info(f"Already posted to {platform}, not posting again")
+                self.finished = True
+                self.result = entry['result']
+            elif entry:
+                self.stats['error_class'] = 'ambiguous'
+                raise AmbiguousPost(f"An earlier {platform} post with this video and caption may have gone through")
+
+    def before_attempt(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpen:
+            self.stats['error_class'] = 'circuit_open'
+            raise
+        if self.key:
+            self.ledger.mark(self.key, 'pending')
+        self.stats['attempts'] += 1
+
+    def failed(self, error):
+        """
+        Record a failed attempt and return the delay before the next one, or raise error.
+        """
+        error_class = self.stats['error_class'] = classify_error(error, self.idempotent)
+        if error_class == 'ambiguous':
+            # Leave the key pending so the post is never sent twice
+            self.breaker.record_failure()
+            raise error
+        if self.key:
+            self.ledger.discard(self.key)
+        if isinstance(error, QuotaExceeded):
+            self.stats['error_class'] = 'quota'
+            self.stats['attempts'] -= 1
+            self.breaker.record_skip()
+            raise error
+        if error_class == 'permanent':
+            # Bad input says nothing about the platform's health
+            self.breaker.record_success()
+            raise error
+
+        self.breaker.record_failure()
+        self.failures[error_class] = self.failures.get(error_class, 0) + 1
+        policy = self.policies[error_class]
+        if self.failures[error_class] >= policy.max_attempts:
+            raise error
+
+        delay = retry_delay(policy, self.failures[error_class])
+        logger.warning(f"{self.platform} call failed ({error_class}: {error}), retrying in {delay:.1f}s")
+        return delay
+
+    def succeeded(self, result):
+        self.stats['error_class'] = None
+        self.breaker.record_success()
+        if self.key:
+            self.ledger.mark(self.key, 'done', result)
+        return result
+
+def run_with_retry(platform, attempt, key=None, policies=None, ledger=None, breaker=None, stats=None,
+                   idempotent=True):
+    """
+    Call attempt() until it succeeds, following the retry policy of each error.
+
+    Args:
+        platform (str): Platform being called, for the circuit breaker and logs
+        attempt (callable): Makes one request and returns its result (JSON-serializable),
+            raising on failure
+        key (str, optional): idempotency_key of the post; skips posts already made
+            and refuses to resend ones that may have been made
+        policies (dict, optional): Error class -> RetryPolicy (default RETRY_POLICIES)
+        ledger (IdempotencyLedger, optional): Default get_idempotency_ledger()
+        breaker (CircuitBreaker, optional): Default get_circuit_breaker(platform)
+        stats (dict, optional): Filled in with 'attempts' made and, on failure, the 'error_class'
+        idempotent (bool): False if attempt() ends with a request that publishes
+            something, so a 5xx from it is not resent (see classify_error)
+
+    Returns:
+        The result of the successful attempt, or of the earlier post with the same key
+
+    Raises:
+        AmbiguousPost: An earlier attempt with this key may have gone through
+        CircuitOpen: The platform's circuit breaker is open
+    """
+    run = _RetryRun(platform, key, policies, ledger, breaker, stats, idempotent)
+    if run.finished:
+        return run.result
+
+    while True:
+        run.before_attempt()
+        try:
+            result = attempt()
+        except Exception as error:
+            time.sleep(run.failed(error))
+            continue
+        return run.succeeded(result)
+
+async def run_with_retry_async(platform, attempt, key=None, policies=None, ledger=None, breaker=None, stats=None,
+                               idempotent=True):
+    """
+    run_with_retry() for a coroutine function attempt; backoff sleeps don't block the loop.
+    """
+    import asyncio
+
+    run = _RetryRun(platform, key, policies, ledger, breaker, stats, idempotent)
+    if run.finished:
+        return run.result
+
+    while True:
+        run.before_attempt()
+        try:
+            result = await attempt()
+        except Exception as error:
+            await asyncio.sleep(run.failed(error))
+            continue
+        return run.succeeded(result)
@@ -1,4 +1,3 @@
-
 """
 Social media module for posting to Instagram, Facebook, YouTube, and LinkedIn.
 """
@@ -6,52 +5,331 @@ import os
 import time
 import json
 import logging
-import requests
+import datetime
+import threading
 from pathlib import Path
-import google.oauth2.credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.errors import HttpError
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 from config import CONFIG
+from modules import tracing
+from modules.http import get_async_session, get_session
+from modules.rate_limit import POST_OPERATIONS, QuotaExceeded, get_rate_limiter
+from modules.retry import (
+    AmbiguousPost,
+    CircuitOpen,
+    NotPublished,
+    PlatformError,
+    idempotency_key,
+    raise_for_status,
+    run_with_retry,
+    run_with_retry_async,
+)
+from modules.results import PostResult, get_results_store
+from modules.upload_body import UploadBody
+from modules.resumable import (
+    get_upload_journal,
+    journal_key,
+    normalize_chunk_size,
+    run_resumable_upload,
+    run_resumable_upload_async,
+)
 
 logger = logging.getLogger(__name__)
 
-def post_to_instagram(video_path, caption):
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Refresh access tokens this long before they actually expire
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+# Default size of each YouTube upload chunk (rounded to a multiple of 256 KiB)
+YOUTUBE_CHUNK_SIZE = 8 * 1024 * 1024
+
+YOUTUBE_DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest"
+YOUTUBE_UPLOAD_URL = "https://www.googleapis.com/upload/youtube/v3"
+
+# Seconds each platform gets to finish posting when publishing to all of them at once
+PLATFORM_DEADLINES = {
+    'instagram': 300,
+    'facebook': 120,
+    'youtube': 900,
+    'linkedin': 120
+}
+
+GRAPH_API_URL = "https://graph.facebook.com/v18.0"
+INSTAGRAM_UPLOAD_URL = "https://rupload.facebook.com/ig-api-upload/v18.0"
+LINKEDIN_API_URL = "https://api.linkedin.com/v2"
+
+# Reels container status polling (seconds)
+INSTAGRAM_POLL_INITIAL_DELAY = 2
+INSTAGRAM_POLL_MAX_DELAY = 30
+INSTAGRAM_PROCESSING_TIMEOUT = 280
+
+def _graph_json(response):
+    """
+    Return the JSON body of a Graph API response, raising on API errors.
+    """
+    result = response.json() if response.content else {}
+    if response.status_code != 200 or 'error' in result:
+        raise PlatformError('instagram', response.status_code, response.text, response.headers)
+    return result
+
+async def _graph_request(method, url, **kwargs):
+    import asyncio
+
+    # requests is blocking, so the call runs on the loop's default executor and
+    # only occupies a thread while bytes are actually moving
+    session = get_session(url)
+    response = await asyncio.to_thread(session.request, method, url, **kwargs)
+    get_rate_limiter().observe('instagram', response.status_code, response.headers, response.text)
+    return _graph_json(response)
+
+async def _upload_reel_video(upload_uri, video_path, access_token):
+    """
+    Send the video bytes for a resumable Reels container to rupload.facebook.com.
+    """
+    headers = {
+        'Authorization': f'OAuth {access_token}',
+        'offset': '0',
+        'file_size': str(os.path.getsize(video_path))
+    }
+    
+    # Instagram reports no checksum to compare with
+    with UploadBody(video_path, checksums=()) as video:
+        await _graph_request('POST', upload_uri, headers=headers, data=video)
+
+async def _wait_for_container(container_id, access_token):
+    """
+    Poll a Reels container until Instagram has finished processing it.
+    
+    Polling backs off exponentially from INSTAGRAM_POLL_INITIAL_DELAY up to
+    INSTAGRAM_POLL_MAX_DELAY, sleeping with asyncio so no thread is held while waiting.
+    """
+    import asyncio
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + INSTAGRAM_PROCESSING_TIMEOUT
+    delay = INSTAGRAM_POLL_INITIAL_DELAY
+    
+    while True:
+        container = await _graph_request(
+            'GET',
+            f"{GRAPH_API_URL}/{container_id}",
+            params={'fields': 'status_code,status', 'access_token': access_token}
+        )
+        
+        status_code = container.get('status_code')
+        if status_code in ('FINISHED', 'PUBLISHED'):
+            return
+        if status_code in ('ERROR', 'EXPIRED'):
+            raise RuntimeError(f"Instagram could not process container {container_id}: {container.get('status')}")
+        
+        if loop.time() + delay > deadline:
+            # Nothing has been published yet, so the post can safely be tried again
+            raise NotPublished(f"Instagram container {container_id} still {status_code} after {INSTAGRAM_PROCESSING_TIMEOUT}s")
+        
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, INSTAGRAM_POLL_MAX_DELAY)
+
+async def publish_instagram_reel(video_path, caption, video_url=None):
+    """
+    Publish a Reel with the Instagram Graph API: create a container, wait for it, publish it.
+    
+    Many Reels can be published from one event loop, e.g. with asyncio.gather(),
+    since waiting on container processing never blocks a thread.
+    
+    Args:
+        video_path (str): Path to the video file, uploaded directly if video_url is not given
+        caption (str): Caption for the post
+        video_url (str, optional): Publicly downloadable URL of the video
+        
+    Returns:
+        str: ID of the published Instagram media
+    """
+    import asyncio
+    
+    access_token = CONFIG['INSTAGRAM_ACCESS_TOKEN']
+    ig_user_id = CONFIG['INSTAGRAM_USER_ID']
+    
+    # Counts against the account's daily publishing limit; may wait for the rate limit
+    await asyncio.to_thread(get_rate_limiter().acquire, 'instagram')
+    
+    # Create the Reels container
+    container_params = {
+        'media_type': 'REELS',
+        'caption': caption,
+        'access_token': access_token
+    }
+    if video_url:
+        container_params['video_url'] = video_url
+    else:
+        container_params['upload_type'] = 'resumable'
+    
+    try:
+        container = await _graph_request('POST', f"{GRAPH_API_URL}/{ig_user_id}/media", data=container_params)
+        container_id = container['id']
+        
+        # Without a public URL, push the file bytes to the container's upload URI
+        if not video_url:
+            upload_uri = container.get('uri') or f"{INSTAGRAM_UPLOAD_URL}/{container_id}"
+            await _upload_reel_video(upload_uri, video_path, access_token)
+        
+        await _wait_for_container(container_id, access_token)
+    except PlatformError as e:
+        # Server errors and connection failures (requests' included) before
+        # media_publish leave at most an unpublished container behind
+        if e.status == 408 or e.status >= 500:
+            raise NotPublished(f"Instagram Reel not published: {str(e)}") from e
+        raise
+    except OSError as e:
+        raise NotPublished(f"Instagram Reel not published: {str(e)}") from e
+    
+    published = await _graph_request(
+        'POST',
+        f"{GRAPH_API_URL}/{ig_user_id}/media_publish",
+        data={'creation_id': container_id, 'access_token': access_token}
+    )
+    return published['id']
+
+def _run_post(platform, name, send, key, idempotent=False):
+    """
+    Post through run_with_retry and record the outcome as a PostResult.
+    
+    send() makes one attempt and returns {'id', 'url', 'latency', 'bytes'}; that
+    dict is what the idempotency ledger keeps for posts already made. Its last
+    request publishes the post, so a 5xx from it is ambiguous unless idempotent
+    says resending is safe.
+    """
+    stats = {}
+    start = time.monotonic()
+    try:
+        with tracing.span('post', platform=platform):
+            sent = run_with_retry(platform, send, key, stats=stats, idempotent=idempotent)
+    except Exception as e:
+        return _post_outcome(platform, name, stats, start, error=e)
+    return _post_outcome(platform, name, stats, start, sent)
+
+async def _run_post_async(platform, name, send, key, idempotent=False):
+    """
+    _run_post() for a coroutine function send.
+    """
+    stats = {}
+    start = time.monotonic()
+    try:
+        with tracing.span('post', platform=platform):
+            sent = await run_with_retry_async(platform, send, key, stats=stats, idempotent=idempotent)
+    except Exception as e:
+        return _post_outcome(platform, name, stats, start, error=e)
+    return _post_outcome(platform, name, stats, start, sent)
+
+def _post_outcome(platform, name, stats, start, sent=None, error=None):
+    # Build, log and store the PostResult of a _run_post call
+    if isinstance(error, (QuotaExceeded, CircuitOpen, AmbiguousPost)):
+        logger.warning(f"Not posting to {name}: {str(error)}")
+        result = PostResult.failed(platform, error, stats.get('error_class') or 'permanent', stats.get('attempts', 0))
+    elif error is not None:
+        logger.error(f"Error posting to {name}: {str(error)}", exc_info=error)
+        result = PostResult.failed(
+            platform, error, stats.get('error_class') or 'permanent', stats.get('attempts', 0), time.monotonic() - start
+        )
+    else:
+        result = PostResult(
+            platform, sent.get('id'), sent.get('url'), sent.get('latency', 0.0), sent.get('bytes', 0), stats['attempts']
+        )
+        tracing.count('upload_bytes', result.bytes_sent, destination=platform)
+        logger.info(f"Successfully posted to {name}. Post ID: {result.remote_id}")
+    
+    get_results_store().append(result)
+    return result
+
+async def _request_async(platform, method, url, ok=(200,), **kwargs):
+    """
+    Make one API call on the event loop's shared aiohttp session.
+    
+    The response is reported to the rate limiter, and a status outside ok
+    raises PlatformError.
+    
+    Returns:
+        tuple: (parsed JSON body, aiohttp.ClientResponse)
+    """
+    async with get_async_session().request(method, url, **kwargs) as response:
+        body = await response.text()
+    get_rate_limiter().observe(platform, response.status, response.headers, body)
+    if response.status not in ok:
+        raise PlatformError(platform, response.status, body, response.headers)
+    return (json.loads(body) if body else {}), response
+
+def _failed_post(platform, name, error):
+    # For failures before any request could be attempted, e.g. missing settings
+    logger.error(f"Error posting to {name}: {str(error)}", exc_info=True)
+    result = PostResult.failed(platform, error, 'permanent')
+    get_results_store().append(result)
+    return result
+
+def post_to_instagram(video_path, caption, video_url=None):
     """
     Post a video to Instagram as a Reel.
     
     Args:
         video_path (str): Path to the video file
         caption (str): Caption for the post
+        video_url (str, optional): Publicly downloadable URL of the video; when
+            omitted the file is uploaded directly
         
     Returns:
-        bool: Success status
+        PostResult: Outcome of the post; truthy on success
     """
+    import asyncio
+    
     logger.info("Posting to Instagram")
     
     try:
-        # Instagram requires the Facebook Graph API with proper permissions
-        # This is a simplified implementation - production code would need to handle
-        # more complex authentication and posting flow
-        
-        username = CONFIG['INSTAGRAM_USERNAME']
-        password = CONFIG['INSTAGRAM_PASSWORD']
+        def send():
+            start = time.monotonic()
+            with tracing.span('post_request', platform='instagram'):
+                media_id = asyncio.run(publish_instagram_reel(video_path, caption, video_url))
+            # The permalink would cost another API call, so it is left empty
+            return {
+                'id': media_id,
+                'url': None,
+                'latency': time.monotonic() - start,
+                'bytes': 0 if video_url else os.path.getsize(video_path)
+            }
         
-        # For demonstration purposes, we're logging that we would post to Instagram
-        # In a real implementation, you would use the Instagram Graph API
-        logger.info(f"Would post to Instagram as {username} with caption: {caption[:50]}...")
+        return _run_post('instagram', 'Instagram', send, idempotency_key('instagram', video_path, caption))
         
-        # Simulate API request delay
-        time.sleep(1)
+    except Exception as e:
+        return _failed_post('instagram', 'Instagram', e)
+
+async def post_to_instagram_async(video_path, caption, video_url=None):
+    """
+    Post a video to Instagram as a Reel from a coroutine; see post_to_instagram.
+    
+    Returns:
+        PostResult: Outcome of the post; truthy on success
+    """
+    import asyncio
+    
+    logger.info("Posting to Instagram")
+    
+    try:
+        async def send():
+            start = time.monotonic()
+            with tracing.span('post_request', platform='instagram'):
+                media_id = await publish_instagram_reel(video_path, caption, video_url)
+            return {
+                'id': media_id,
+                'url': None,
+                'latency': time.monotonic() - start,
+                'bytes': 0 if video_url else os.path.getsize(video_path)
+            }
         
-        # In a real implementation, this would return the actual post ID or URL
-        # For now, we'll just return True indicating success
-        return True
+        # Hashing the video for the key reads the whole file
+        key = await asyncio.to_thread(idempotency_key, 'instagram', video_path, caption)
+        return await _run_post_async('instagram', 'Instagram', send, key)
         
     except Exception as e:
-        logger.error(f"Error posting to Instagram: {str(e)}", exc_info=True)
-        return False
+        return _failed_post('instagram', 'Instagram', e)
 
 def post_to_facebook(video_url, caption):
     """
@@ -62,7 +340,7 @@ def post_to_facebook(video_url, caption):
         caption (str): Caption for the post
         
     Returns:
-        bool: Success status
+        PostResult: Outcome of the post; truthy on success
     """
     logger.info("Posting to Facebook")
     
@@ -71,7 +349,7 @@ def post_to_facebook(video_url, caption):
         page_id = CONFIG['FACEBOOK_PAGE_ID']
         
         # Facebook Graph API endpoint for posting to a page
-        url = f"https://graph.facebook.com/v18.0/{page_id}/videos"
+        url = f"{GRAPH_API_URL}/{page_id}/videos"
         
         # Prepare data for the POST request
         data = {
@@ -80,103 +358,456 @@ def post_to_facebook(video_url, caption):
             'file_url': video_url
         }
         
-        # Make the API request
-        response = requests.post(url, data=data)
+        def send():
+            rate_limiter = get_rate_limiter()
+            rate_limiter.acquire('facebook')
+            with tracing.span('post_request', platform='facebook'):
+                response = get_session(url).post(url, data=data)
+            rate_limiter.observe('facebook', response.status_code, response.headers, response.text)
+            raise_for_status('facebook', response)
+            post_id = response.json().get('id')
+            return {
+                'id': post_id,
+                'url': f"https://www.facebook.com/{post_id}",
+                'latency': response.elapsed.total_seconds(),
+                'bytes': len(response.request.body or b'')
+            }
         
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            post_id = result.get('id')
-            logger.info(f"Successfully posted to Facebook. Post ID: {post_id}")
-            return True
-        else:
-            logger.error(f"Facebook API error: {response.text}")
-            return False
+        # Make the API request, retrying transient failures
+        return _run_post('facebook', 'Facebook', send, idempotency_key('facebook', video_url, caption))
             
     except Exception as e:
-        logger.error(f"Error posting to Facebook: {str(e)}", exc_info=True)
-        return False
+        return _failed_post('facebook', 'Facebook', e)
 
-def post_to_youtube(video_path, title, description):
+async def post_to_facebook_async(video_url, caption):
     """
-    Upload a video to YouTube as a Short.
+    Post a video to Facebook Page from a coroutine; see post_to_facebook.
     
-    Args:
-        video_path (str): Path to the video file
-        title (str): Title for the YouTube video
-        description (str): Description for the video
-        
     Returns:
-        bool: Success status
+        PostResult: Outcome of the post; truthy on success
     """
-    logger.info("Posting to YouTube")
+    import asyncio
+    from urllib.parse import urlencode
+    
+    logger.info("Posting to Facebook")
     
     try:
-        # Load OAuth 2.0 credentials
-        credentials_path = CONFIG['YOUTUBE_OAUTH_CREDENTIALS']
+        url = f"{GRAPH_API_URL}/{CONFIG['FACEBOOK_PAGE_ID']}/videos"
+        data = {
+            'access_token': CONFIG['FACEBOOK_ACCESS_TOKEN'],
+            'description': caption,
+            'file_url': video_url
+        }
+        
+        async def send():
+            await asyncio.to_thread(get_rate_limiter().acquire, 'facebook')
+            start = time.monotonic()
+            with tracing.span('post_request', platform='facebook'):
+                result, _ = await _request_async('facebook', 'POST', url, data=data)
+            post_id = result.get('id')
+            return {
+                'id': post_id,
+                'url': f"https://www.facebook.com/{post_id}",
+                'latency': time.monotonic() - start,
+                'bytes': len(urlencode(data))
+            }
+        
+        return await _run_post_async('facebook', 'Facebook', send, idempotency_key('facebook', video_url, caption))
+        
+    except Exception as e:
+        return _failed_post('facebook', 'Facebook', e)
+
+def _write_json_atomic(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+def _load_youtube_discovery_document():
+    """
+    Return the YouTube v3 discovery document, fetching and caching it only once.
+    
+    The document is kept at YOUTUBE_DISCOVERY_CACHE so later runs start offline
+    and are unaffected by changes to the copy bundled with googleapiclient.
+    """
+    from googleapiclient.discovery_cache import get_static_doc
+    
+    cache_path = str(CONFIG.get('YOUTUBE_DISCOVERY_CACHE') or BASE_DIR / "assets" / "youtube_v3_discovery.json")
+    
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    
+    document = get_static_doc('youtube', 'v3')
+    if document is None:
+        response = get_session(YOUTUBE_DISCOVERY_URL).get(YOUTUBE_DISCOVERY_URL)
+        response.raise_for_status()
+        document = response.text
+    
+    _write_json_atomic(cache_path, json.loads(document))
+    return document
+
+def _parse_expiry(expiry):
+    # google-auth compares expiry with a naive UTC now(); stored tokens may carry
+    # "Z" or an explicit offset
+    parsed = datetime.datetime.fromisoformat(expiry.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+class YouTubeClient:
+    """
+    Long-lived, thread-safe holder for the YouTube Data API client.
+    
+    The client is built once from the cached discovery document. Its access
+    token is refreshed ahead of expiry and the refreshed token is written back
+    atomically, so the next process can reuse it instead of refreshing again.
+    Uses of the client are serialized because its httplib2 transport is not
+    thread-safe; credentials() doesn't wait for them, so the async path can
+    upload while a sync upload holds the client.
+    """
+    
+    def __init__(self):
+        # Guards the credentials and building the client
+        self._lock = threading.RLock()
+        # Held while the client is in use
+        self._client_lock = threading.Lock()
+        self._credentials = None
+        self._token_path = None
+        self._credentials_info = None
+        self._youtube = None
+    
+    @contextmanager
+    def client(self):
+        """
+        Hold the YouTube client for the duration of a with-block.
+        
+        Yields:
+            googleapiclient.discovery.Resource: An authorized YouTube v3 client
+        """
+        with self._client_lock:
+            with self._lock:
+                credentials = self._fresh_credentials()
+                
+                if self._youtube is None:
+                    import google_auth_httplib2
+                    from googleapiclient.discovery import build_from_document
+                    from googleapiclient.http import build_http
+                    
+                    with tracing.span('client_build', service='youtube'):
+                        http = google_auth_httplib2.AuthorizedHttp(credentials, http=build_http())
+                        self._youtube = build_from_document(_load_youtube_discovery_document(), http=http)
+                
+                youtube = self._youtube
+            
+            yield youtube
+    
+    def credentials(self):
+        """
+        Return the credentials with a fresh access token, for requests made without the client.
+        
+        Returns:
+            google.oauth2.credentials.Credentials: Credentials with a valid token
+        """
+        with self._lock:
+            return self._fresh_credentials()
+    
+    def reset(self):
+        """
+        Drop the cached client and credentials, e.g. after re-authorizing the account.
+        """
+        with self._lock:
+            self._credentials = None
+            self._youtube = None
+    
+    def _load_credentials(self):
+        import google.oauth2.credentials
+        
+        credentials_config = CONFIG['YOUTUBE_OAUTH_CREDENTIALS']
         
         # Check if credentials are a file path or a JSON string
-        if os.path.isfile(credentials_path):
-            with open(credentials_path, 'r') as f:
+        if os.path.isfile(credentials_config):
+            self._token_path = credentials_config
+            with open(credentials_config, 'r') as f:
                 credentials_info = json.load(f)
         else:
             try:
-                credentials_info = json.loads(credentials_path)
+                credentials_info = json.loads(credentials_config)
             except json.JSONDecodeError:
                 raise ValueError("YOUTUBE_OAUTH_CREDENTIALS must be a valid JSON string or file path")
+            
+            # Credentials from the environment can't be updated in place; keep
+            # refreshed tokens in a side file instead
+            self._token_path = str(CONFIG.get('YOUTUBE_TOKEN_CACHE') or BASE_DIR / ".youtube_token.json")
+            if os.path.isfile(self._token_path):
+                with open(self._token_path, 'r') as f:
+                    credentials_info.update(json.load(f))
         
-        # Create credentials object
-        credentials = google.oauth2.credentials.Credentials(
+        expiry = credentials_info.get('expiry')
+        self._credentials_info = credentials_info
+        self._credentials = google.oauth2.credentials.Credentials(
             token=credentials_info.get('token'),
             refresh_token=credentials_info.get('refresh_token'),
             token_uri=credentials_info.get('token_uri'),
             client_id=credentials_info.get('client_id'),
-            client_secret=credentials_info.get('client_secret')
+            client_secret=credentials_info.get('client_secret'),
+            expiry=_parse_expiry(expiry) if expiry else None
         )
+    
+    def _fresh_credentials(self):
+        if self._credentials is None:
+            self._load_credentials()
         
-        # Build the YouTube API client
-        youtube = build('youtube', 'v3', credentials=credentials)
-        
-        # Prepare video metadata
-        body = {
-            'snippet': {
-                'title': title,
-                'description': description,
-                'tags': ['Shorts', 'viral', 'reaction'],
-                'categoryId': '22'  # People & Blogs category
-            },
-            'status': {
-                'privacyStatus': 'public',
-                'selfDeclaredMadeForKids': False
-            }
+        credentials = self._credentials
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        if credentials.token and credentials.expiry and credentials.expiry - now > TOKEN_REFRESH_MARGIN:
+            return credentials
+        
+        import google.auth.transport.requests
+        
+        logger.debug("Refreshing YouTube access token")
+        with tracing.span('auth', service='youtube'):
+            credentials.refresh(google.auth.transport.requests.Request(get_session(credentials.token_uri)))
+        self._save_token(credentials)
+        return credentials
+    
+    def _save_token(self, credentials):
+        token = {
+            'token': credentials.token,
+            'expiry': credentials.expiry.isoformat() + 'Z' if credentials.expiry else None
         }
         
-        # Upload the video
-        media = MediaFileUpload(
-            video_path,
-            mimetype='video/mp4',
-            resumable=True
-        )
+        if self._token_path == CONFIG['YOUTUBE_OAUTH_CREDENTIALS']:
+            # Update the credentials file itself, keeping every other field
+            self._credentials_info.update(token)
+            _write_json_atomic(self._token_path, self._credentials_info)
+        else:
+            _write_json_atomic(self._token_path, token)
+
+_youtube_client = YouTubeClient()
+
+def get_youtube_client():
+    """
+    Return the process-wide YouTube client holder.
+    
+    Returns:
+        YouTubeClient: The holder shared by every YouTube upload
+    """
+    return _youtube_client
+
+def _log_youtube_progress(progress):
+    eta = f"{progress.eta_seconds:.0f}s" if progress.eta_seconds is not None else "unknown"
+    logger.info(
+        f"YouTube upload {progress.bytes_sent * 100 // max(progress.total_bytes, 1)}% "
+        f"({progress.bytes_per_second / 1024 / 1024:.2f} MiB/s, ETA {eta})"
+    )
+
+def _youtube_video_body(title, description):
+    # Prepare video metadata
+    return {
+        'snippet': {
+            'title': title,
+            'description': description,
+            'tags': ['Shorts', 'viral', 'reaction'],
+            'categoryId': '22'  # People & Blogs category
+        },
+        'status': {
+            'privacyStatus': 'public',
+            'selfDeclaredMadeForKids': False
+        }
+    }
+
+def post_to_youtube(video_path, title, description, chunk_size=None, progress_callback=_log_youtube_progress):
+    """
+    Upload a video to YouTube as a Short.
+    
+    The upload is sent in chunks. A chunk that fails with a 5xx or a dropped
+    connection is retried from the last acknowledged byte, and an upload
+    interrupted by a crash resumes from its journaled session on the next call.
+    
+    Args:
+        video_path (str): Path to the video file
+        title (str): Title for the YouTube video
+        description (str): Description for the video
+        chunk_size (int, optional): Bytes per upload chunk (default: YOUTUBE_UPLOAD_CHUNK_SIZE)
+        progress_callback (callable, optional): Called with a resumable.UploadProgress
+            (bytes sent, total, bytes/s, ETA) after every chunk; logs progress by default
+        
+    Returns:
+        PostResult: Outcome of the post; truthy on success
+    """
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import MediaIoBaseUpload
+    
+    logger.info("Posting to YouTube")
+    
+    try:
+        body = _youtube_video_body(title, description)
+        
+        chunk_size = normalize_chunk_size(chunk_size or CONFIG.get('YOUTUBE_UPLOAD_CHUNK_SIZE') or YOUTUBE_CHUNK_SIZE)
+        
+        upload_key = journal_key('youtube', video_path)
+        
+        def send():
+            # An insert costs 1600 of the default 10000 daily quota units. A
+            # retry resumes the journaled session of the same insert, so only
+            # opening a new session is charged
+            if get_upload_journal().get(upload_key) is None:
+                get_rate_limiter().acquire('youtube', POST_OPERATIONS['youtube'])
+            
+            start = time.monotonic()
+            try:
+                # YouTube reports no checksum to compare with
+                with get_youtube_client().client() as youtube, UploadBody(video_path, checksums=()) as video:
+                    def new_request():
+                        media = MediaIoBaseUpload(
+                            video,
+                            mimetype='video/mp4',
+                            chunksize=chunk_size,
+                            resumable=True
+                        )
+                        return youtube.videos().insert(
+                            part=','.join(body.keys()),
+                            body=body,
+                            media_body=media
+                        )
+                    
+                    # Upload the video; a retry resumes from the journaled session
+                    with tracing.span('post_request', platform='youtube'):
+                        response = run_resumable_upload(
+                            new_request,
+                            get_upload_journal(),
+                            upload_key,
+                            progress_callback=progress_callback
+                        )
+            except HttpError as error:
+                get_rate_limiter().observe(
+                    'youtube', error.resp.status, error.resp, error.content.decode('utf-8', 'replace')
+                )
+                raise
+            
+            video_id = response.get('id')
+            return {
+                'id': video_id,
+                'url': f"https://youtube.com/shorts/{video_id}",
+                'latency': time.monotonic() - start,
+                'bytes': os.path.getsize(video_path)
+            }
         
-        request = youtube.videos().insert(
-            part=','.join(body.keys()),
-            body=body,
-            media_body=media
+        # A resend resumes the journaled upload session, which can't create a second video
+        return _run_post(
+            'youtube', 'YouTube', send, idempotency_key('youtube', video_path, f"{title}\n{description}"), idempotent=True
         )
         
-        response = request.execute()
+    except Exception as e:
+        return _failed_post('youtube', 'YouTube', e)
+
+async def post_to_youtube_async(video_path, title, description, chunk_size=None, progress_callback=_log_youtube_progress,
+                                body=None):
+    """
+    Upload a video to YouTube as a Short from a coroutine; see post_to_youtube.
+    
+    The video is sent with the resumable upload protocol over the event loop's
+    aiohttp session, streamed from disk chunk by chunk, and shares the upload
+    journal with post_to_youtube. Pass body (a TeeSink) to send bytes read
+    once for several destinations instead; see tee_upload.
+    
+    Returns:
+        PostResult: Outcome of the post; truthy on success
+    """
+    import asyncio
+    
+    logger.info("Posting to YouTube")
+    
+    try:
+        metadata = _youtube_video_body(title, description)
+        chunk_size = normalize_chunk_size(chunk_size or CONFIG.get('YOUTUBE_UPLOAD_CHUNK_SIZE') or YOUTUBE_CHUNK_SIZE)
+        
+        upload_key = journal_key('youtube', video_path)
         
-        video_id = response.get('id')
-        logger.info(f"Successfully uploaded to YouTube. Video ID: {video_id}")
+        async def send():
+            # Charged for new insert sessions only, as in post_to_youtube
+            if get_upload_journal().get(upload_key) is None:
+                await asyncio.to_thread(get_rate_limiter().acquire, 'youtube', POST_OPERATIONS['youtube'])
+            
+            start = time.monotonic()
+            credentials = await asyncio.to_thread(get_youtube_client().credentials)
+            headers = {'Authorization': f"Bearer {credentials.token}"}
+            session = get_async_session()
+            
+            async def start_session():
+                upload_headers = dict(headers, **{
+                    'X-Upload-Content-Type': 'video/mp4',
+                    'X-Upload-Content-Length': str(os.path.getsize(video_path))
+                })
+                async with session.post(
+                    f"{YOUTUBE_UPLOAD_URL}/videos?uploadType=resumable&part={','.join(metadata.keys())}",
+                    json=metadata,
+                    headers=upload_headers
+                ) as response:
+                    text = await response.text()
+                    if response.status != 200:
+                        raise PlatformError('youtube', response.status, text, response.headers)
+                    return response.headers['Location']
+            
+            try:
+                # A retry resumes from the journaled session
+                with tracing.span('post_request', platform='youtube'), \
+                        UploadBody(video_path, checksums=()) if body is None else body as video:
+                    response = await run_resumable_upload_async(
+                        session,
+                        start_session,
+                        video,
+                        get_upload_journal(),
+                        upload_key,
+                        chunk_size,
+                        headers,
+                        progress_callback=progress_callback
+                    )
+            except PlatformError as error:
+                get_rate_limiter().observe('youtube', error.status, error.headers, error.body)
+                raise
+            
+            video_id = response.get('id')
+            return {
+                'id': video_id,
+                'url': f"https://youtube.com/shorts/{video_id}",
+                'latency': time.monotonic() - start,
+                'bytes': os.path.getsize(video_path)
+            }
         
-        return True
+        key = await asyncio.to_thread(idempotency_key, 'youtube', video_path, f"{title}\n{description}")
+        return await _run_post_async('youtube', 'YouTube', send, key, idempotent=True)
         
-    except HttpError as error:
-        logger.error(f"YouTube API error: {error}", exc_info=True)
-        return False
     except Exception as e:
-        logger.error(f"Error posting to YouTube: {str(e)}", exc_info=True)
-        return False
+        return _failed_post('youtube', 'YouTube', e)
+
+def _linkedin_share(video_url, caption):
+    return {
+        "author": "urn:li:person:{PERSON_ID}",  # This would need to be dynamically set
+        "lifecycleState": "PUBLISHED",
+        "specificContent": {
+            "com.linkedin.ugc.ShareContent": {
+                "shareCommentary": {
+                    "text": caption
+                },
+                "shareMediaCategory": "RICH",
+                "media": [{
+                    "status": "READY",
+                    "originalUrl": video_url,
+                    "title": {
+                        "text": "Viral Reaction Video"
+                    }
+                }]
+            }
+        },
+        "visibility": {
+            "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
+        }
+    }
 
 def post_to_linkedin(video_url, caption):
     """
@@ -187,7 +818,7 @@ def post_to_linkedin(video_url, caption):
         caption (str): Caption for the post
         
     Returns:
-        bool: Success status
+        PostResult: Outcome of the post; truthy on success
     """
     logger.info("Posting to LinkedIn")
     
@@ -195,7 +826,7 @@ def post_to_linkedin(video_url, caption):
         access_token = CONFIG['LINKEDIN_ACCESS_TOKEN']
         
         # LinkedIn API endpoint for creating a share
-        url = "https://api.linkedin.com/v2/ugcPosts"
+        url = f"{LINKEDIN_API_URL}/ugcPosts"
         
         # Prepare headers with authentication
         headers = {
@@ -204,42 +835,152 @@ def post_to_linkedin(video_url, caption):
         }
         
         # Prepare the post data
-        data = {
-            "author": "urn:li:person:{PERSON_ID}",  # This would need to be dynamically set
-            "lifecycleState": "PUBLISHED",
-            "specificContent": {
-                "com.linkedin.ugc.ShareContent": {
-                    "shareCommentary": {
-                        "text": caption
-                    },
-                    "shareMediaCategory": "RICH",
-                    "media": [{
-                        "status": "READY",
-                        "originalUrl": video_url,
-                        "title": {
-                            "text": "Viral Reaction Video"
-                        }
-                    }]
-                }
-            },
-            "visibility": {
-                "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
+        data = _linkedin_share(video_url, caption)
+        
+        def send():
+            rate_limiter = get_rate_limiter()
+            rate_limiter.acquire('linkedin')
+            with tracing.span('post_request', platform='linkedin'):
+                response = get_session(url).post(url, headers=headers, json=data)
+            rate_limiter.observe('linkedin', response.status_code, response.headers, response.text)
+            raise_for_status('linkedin', response, ok=(200, 201))
+            post_id = response.json().get('id')
+            return {
+                'id': post_id,
+                'url': f"https://www.linkedin.com/feed/update/{post_id}",
+                'latency': response.elapsed.total_seconds(),
+                'bytes': len(response.request.body or b'')
             }
-        }
         
-        # Make the API request
-        response = requests.post(url, headers=headers, json=data)
+        # Make the API request, retrying transient failures
+        return _run_post('linkedin', 'LinkedIn', send, idempotency_key('linkedin', video_url, caption))
+            
+    except Exception as e:
+        return _failed_post('linkedin', 'LinkedIn', e)
+
+async def post_to_linkedin_async(video_url, caption):
+    """
+    Post a video to LinkedIn from a coroutine; see post_to_linkedin.
+    
+    Returns:
+        PostResult: Outcome of the post; truthy on success
+    """
+    import asyncio
+    
+    logger.info("Posting to LinkedIn")
+    
+    try:
+        url = f"{LINKEDIN_API_URL}/ugcPosts"
+        headers = {'Authorization': f"Bearer {CONFIG['LINKEDIN_ACCESS_TOKEN']}"}
+        data = _linkedin_share(video_url, caption)
         
-        # Check if the request was successful
-        if response.status_code in (200, 201):
-            result = response.json()
+        async def send():
+            await asyncio.to_thread(get_rate_limiter().acquire, 'linkedin')
+            start = time.monotonic()
+            with tracing.span('post_request', platform='linkedin'):
+                result, _ = await _request_async('linkedin', 'POST', url, ok=(200, 201), headers=headers, json=data)
             post_id = result.get('id')
-            logger.info(f"Successfully posted to LinkedIn. Post ID: {post_id}")
-            return True
-        else:
-            logger.error(f"LinkedIn API error: {response.text}")
-            return False
-            
+            return {
+                'id': post_id,
+                'url': f"https://www.linkedin.com/feed/update/{post_id}",
+                'latency': time.monotonic() - start,
+                'bytes': len(json.dumps(data))
+            }
+        
+        return await _run_post_async('linkedin', 'LinkedIn', send, idempotency_key('linkedin', video_url, caption))
+        
+    except Exception as e:
+        return _failed_post('linkedin', 'LinkedIn', e)
+
+def _guarded_post(platform, post):
+    try:
+        return post()
     except Exception as e:
-        logger.error(f"Error posting to LinkedIn: {str(e)}", exc_info=True)
-        return False
+        return _failed_post(platform, platform, e)
+
+def publish_all(video_path, video_url, caption, title, description, platforms=None, deadlines=None):
+    """
+    Post a video to several platforms concurrently.
+    
+    Each platform runs on its own thread, so the total time is roughly that of
+    the slowest platform. A platform that misses its deadline is reported as
+    failed; its thread is left to finish in the background.
+    
+    Args:
+        video_path (str): Path to the video file (Instagram, YouTube)
+        video_url (str): Public URL of the video, e.g. a Google Drive link (Facebook, LinkedIn)
+        caption (str): Caption for the posts
+        title (str): Title for the YouTube video
+        description (str): Description for the YouTube video
+        platforms (list, optional): Platforms to post to (default: those enabled with POST_TO_*)
+        deadlines (dict, optional): Per-platform deadlines in seconds, overriding PLATFORM_DEADLINES
+        
+    Returns:
+        dict: platform -> PostResult
+    """
+    posters = {
+        'instagram': lambda: post_to_instagram(video_path, caption),
+        'facebook': lambda: post_to_facebook(video_url, caption),
+        'youtube': lambda: post_to_youtube(video_path, title, description),
+        'linkedin': lambda: post_to_linkedin(video_url, caption)
+    }
+    
+    if platforms is None:
+        platforms = [
+            platform for platform in posters
+            if str(CONFIG.get(f"POST_TO_{platform.upper()}", True)).lower() == 'true'
+        ]
+    
+    unknown = set(platforms) - set(posters)
+    if unknown:
+        raise ValueError(f"Unknown platforms: {', '.join(sorted(unknown))}")
+    
+    if not platforms:
+        return {}
+    
+    # Don't spend a request on platforms whose quota or backoff won't allow it
+    results = {}
+    rate_limiter = get_rate_limiter()
+    for platform in list(platforms):
+        retry_at = rate_limiter.check(platform, POST_OPERATIONS.get(platform, 'post'))
+        if retry_at and retry_at - time.time() > rate_limiter.max_wait:
+            error = QuotaExceeded(platform, retry_at, "is over its rate limit or quota")
+            logger.warning(f"Skipping {platform}: {str(error)}")
+            results[platform] = PostResult.failed(platform, error, 'quota')
+            get_results_store().append(results[platform])
+            platforms = [other for other in platforms if other != platform]
+    
+    if not platforms:
+        return results
+    
+    deadlines = dict(PLATFORM_DEADLINES, **(deadlines or {}))
+    logger.info(f"Publishing to {', '.join(platforms)}")
+    
+    executor = ThreadPoolExecutor(max_workers=len(platforms), thread_name_prefix='publish')
+    start = time.monotonic()
+    futures = {
+        platform: executor.submit(_guarded_post, platform, posters[platform])
+        for platform in platforms
+    }
+    
+    for platform, future in futures.items():
+        # Deadlines are measured from the common start, not from when we begin waiting
+        remaining = start + deadlines[platform] - time.monotonic()
+        try:
+            results[platform] = future.result(timeout=max(0, remaining))
+        except FutureTimeoutError:
+            logger.error(f"Posting to {platform} missed its {deadlines[platform]}s deadline")
+            # The post thread records its own result in the store when it finishes
+            results[platform] = PostResult.failed(
+                platform,
+                TimeoutError(f"{platform} did not finish within {deadlines[platform]}s"),
+                'timeout',
+                latency=time.monotonic() - start
+            )
+    
+    executor.shutdown(wait=False)
+    
+    succeeded = [platform for platform, result in results.items() if result.success]
+    logger.info(f"Published to {len(succeeded)}/{len(results)} platforms in {time.monotonic() - start:.1f}s")
+    
+    return results
@@ -1,108 +1,826 @@
-
 """
 Storage module for Google Drive integration.
 """
 import os
 import json
+import time
+import queue
+import random
 import logging
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.errors import HttpError
+import datetime
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# The Google client libraries are imported where they are used, so importing
+# this module stays cheap for runs that never touch Drive
 
 from config import CONFIG
+from modules import tracing
+from modules.http import get_async_session
+from modules.resumable import (
+    get_upload_journal,
+    journal_key,
+    normalize_chunk_size,
+    run_resumable_upload,
+    run_resumable_upload_async,
+)
+from modules.upload_body import UploadBody
+from modules.upload_cache import UploadCache
 
 logger = logging.getLogger(__name__)
 
-def upload_to_drive(file_path, file_name=None):
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive']
+
+# Refresh access tokens this long before they actually expire
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+# Default size of each resumable upload chunk (rounded to a multiple of 256 KiB)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# REST endpoints used by the async upload path
+DRIVE_API_URL = "https://www.googleapis.com/drive/v3"
+DRIVE_UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3"
+
+# Drive accepts at most this many calls in one batch HTTP request
+DRIVE_BATCH_LIMIT = 100
+
+# Retries of a permission grant after a 5xx or 429, with googleapiclient's exponential backoff
+GRANT_RETRIES = 3
+
+# Anyone with the link can view
+PUBLIC_PERMISSION = {
+    'type': 'anyone',
+    'role': 'reader'
+}
+
+DriveUploadResult = namedtuple('DriveUploadResult', ['file_path', 'file_id', 'share_link', 'error'])
+
+def load_drive_credentials():
     """
-    Upload a file to Google Drive.
+    Parse GOOGLE_DRIVE_CREDENTIALS into service account credentials.
     
-    Args:
-        file_path (str): Path to the file to upload
-        file_name (str, optional): Name to give the file on Drive (default: use original filename)
-        
     Returns:
-        tuple: (file_id, share_link)
+        google.oauth2.service_account.Credentials: Unrefreshed credentials
     """
-    logger.info(f"Uploading file to Google Drive: {file_path}")
+    from google.oauth2 import service_account
     
+    credentials_json = CONFIG['GOOGLE_DRIVE_CREDENTIALS']
+    
+    # Check if credentials are a file path or a JSON string
+    if os.path.isfile(credentials_json):
+        return service_account.Credentials.from_service_account_file(
+            credentials_json,
+            scopes=DRIVE_SCOPES
+        )
+    
+    # Try to parse as JSON string
     try:
-        # Get credentials from environment
-        credentials_json = CONFIG['GOOGLE_DRIVE_CREDENTIALS']
-        
-        # Check if credentials are a file path or a JSON string
-        if os.path.isfile(credentials_json):
-            credentials = service_account.Credentials.from_service_account_file(
-                credentials_json,
-                scopes=['https://www.googleapis.com/auth/drive']
-            )
-        else:
-            # Try to parse as JSON string
+        credentials_info = json.loads(credentials_json)
+    except json.JSONDecodeError:
+        raise ValueError("GOOGLE_DRIVE_CREDENTIALS must be a valid JSON string or file path")
+    
+    return service_account.Credentials.from_service_account_info(
+        credentials_info,
+        scopes=DRIVE_SCOPES
+    )
+
+class DriveClientPool:
+    """
+    Thread-safe pool of authorized Google Drive API clients.
+    
+    Credentials are loaded once and shared by every client. Each pooled client
+    owns its own authorized httplib2 transport, since httplib2 connections must
+    not be used from two threads at once. The shared access token is refreshed
+    ahead of expiry so uploads never stall on a token fetch mid-request.
+    """
+    
+    def __init__(self, credentials_factory=load_drive_credentials, size=4,
+                 client_options=None, http_factory=None):
+        """
+        Args:
+            credentials_factory (callable): Returns unrefreshed google-auth credentials
+            size (int): Maximum number of clients leased at the same time
+            client_options (dict, optional): Passed to googleapiclient's build(),
+                e.g. {'api_endpoint': 'https://127.0.0.1:8443/drive/v3/'} for a local stub
+            http_factory (callable, optional): Returns a new, unauthorized httplib2.Http
+                (default: googleapiclient.http.build_http)
+        """
+        self._credentials_factory = credentials_factory
+        self._client_options = client_options
+        self._http_factory = http_factory
+        self._credentials = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+    
+    def credentials(self):
+        """
+        Return the shared credentials, refreshing the token if it is close to expiry.
+        
+        Returns:
+            google.auth.credentials.Credentials: Credentials with a valid token
+        """
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = self._credentials_factory()
+            
+            credentials = self._credentials
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            if (not credentials.token or credentials.expiry is None
+                    or credentials.expiry - now <= TOKEN_REFRESH_MARGIN):
+                import google_auth_httplib2
+                
+                logger.debug("Refreshing Google Drive access token")
+                with tracing.span('auth', service='drive'):
+                    credentials.refresh(google_auth_httplib2.Request(self._new_http()))
+            
+            return credentials
+    
+    @contextmanager
+    def client(self):
+        """
+        Lease a Drive API client for the duration of a with-block.
+        
+        Yields:
+            googleapiclient.discovery.Resource: An authorized Drive v3 client
+        """
+        with self._slots:
+            credentials = self.credentials()
             try:
-                credentials_info = json.loads(credentials_json)
-                credentials = service_account.Credentials.from_service_account_info(
-                    credentials_info,
-                    scopes=['https://www.googleapis.com/auth/drive']
-                )
-            except json.JSONDecodeError:
-                raise ValueError("GOOGLE_DRIVE_CREDENTIALS must be a valid JSON string or file path")
-        
-        # Build the Drive API client
-        drive_service = build('drive', 'v3', credentials=credentials)
-        
-        # If no file name is provided, use the original filename
-        if not file_name:
-            file_name = os.path.basename(file_path)
-        
-        # File metadata
-        file_metadata = {
-            'name': file_name,
-            'mimeType': 'video/mp4'
-        }
+                drive_service = self._idle.get_nowait()
+            except queue.Empty:
+                drive_service = self._build_client(credentials)
+            
+            try:
+                yield drive_service
+            finally:
+                self._idle.put(drive_service)
+    
+    def reset(self):
+        """
+        Drop cached credentials and idle clients, e.g. after rotating the service account.
+        """
+        with self._lock:
+            self._credentials = None
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
+    
+    def new_batch(self, drive_service, callback):
+        """
+        Create a batch HTTP request for a leased client.
         
-        # If a folder ID is specified in config, add it to the metadata
-        folder_id = CONFIG['GOOGLE_DRIVE_FOLDER_ID']
-        if folder_id:
-            file_metadata['parents'] = [folder_id]
+        googleapiclient always points batches at the public batch endpoint, so
+        an api_endpoint override has to be applied here as well.
+        """
+        api_endpoint = (self._client_options or {}).get('api_endpoint')
+        if api_endpoint:
+            from googleapiclient.http import BatchHttpRequest
+            
+            endpoint = urlparse(api_endpoint)
+            return BatchHttpRequest(
+                callback=callback,
+                batch_uri=f"{endpoint.scheme}://{endpoint.netloc}/batch/drive/v3"
+            )
+        return drive_service.new_batch_http_request(callback=callback)
+    
+    def api_urls(self):
+        """
+        Return the REST base URLs for the async upload path, honouring an api_endpoint override.
         
-        # Create a media file upload object
-        media = MediaFileUpload(
-            file_path,
-            mimetype='video/mp4',
-            resumable=True
-        )
+        Returns:
+            tuple: (API URL, upload URL), e.g. DRIVE_API_URL and DRIVE_UPLOAD_URL
+        """
+        api_endpoint = (self._client_options or {}).get('api_endpoint')
+        if api_endpoint:
+            endpoint = urlparse(api_endpoint)
+            return api_endpoint.rstrip('/'), f"{endpoint.scheme}://{endpoint.netloc}/upload/drive/v3"
+        return DRIVE_API_URL, DRIVE_UPLOAD_URL
+    
+    def _new_http(self):
+        if self._http_factory is None:
+            from googleapiclient.http import build_http
+            
+            return build_http()
+        return self._http_factory()
+    
+    def _build_client(self, credentials):
+        import google_auth_httplib2
+        from googleapiclient.discovery import build
         
-        # Upload the file
-        file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
+        with tracing.span('client_build', service='drive'):
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=self._new_http())
+            return build(
+                'drive', 'v3',
+                http=http,
+                cache_discovery=False,
+                client_options=self._client_options
+            )
+
+_drive_pool = None
+_drive_pool_lock = threading.Lock()
+
+def get_drive_pool():
+    """
+    Return the process-wide Drive client pool, creating it on first use.
+    
+    Returns:
+        DriveClientPool: The shared pool used by every upload
+    """
+    global _drive_pool
+    
+    with _drive_pool_lock:
+        if _drive_pool is None:
+            _drive_pool = DriveClientPool(
+                size=int(CONFIG.get('DRIVE_CLIENT_POOL_SIZE', 4))
+            )
+        return _drive_pool
+
+class BandwidthLimiter:
+    """
+    Token bucket that caps the combined throughput of concurrent uploads.
+    
+    Callers consume the size of each chunk before sending it. A chunk larger
+    than the bucket is allowed through and the debt is slept off, so the long
+    run average never exceeds the configured rate.
+    """
+    
+    def __init__(self, bytes_per_second=None):
+        """
+        Args:
+            bytes_per_second (int, optional): Upload budget; None or 0 disables the limit
+        """
+        self._rate = bytes_per_second
+        self._tokens = bytes_per_second or 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def consume(self, num_bytes):
+        """
+        Block until num_bytes may be sent without exceeding the budget.
+        """
+        delay = self._reserve(num_bytes)
+        if delay:
+            time.sleep(delay)
+    
+    async def consume_async(self, num_bytes):
+        """
+        Like consume(), but waits without blocking the event loop.
+        """
+        import asyncio
         
-        file_id = file.get('id')
+        delay = self._reserve(num_bytes)
+        if delay:
+            await asyncio.sleep(delay)
+    
+    def _reserve(self, num_bytes):
+        # Take num_bytes from the bucket and return how long to wait for the debt
+        if not self._rate:
+            return 0
         
-        # Make the file publicly accessible for viewing
-        permission = {
-            'type': 'anyone',
-            'role': 'reader'
-        }
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._rate, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= num_bytes
+            return -self._tokens / self._rate if self._tokens < 0 else 0
+
+_bandwidth_limiter = None
+
+def get_bandwidth_limiter():
+    """
+    Return the process-wide upload bandwidth budget (DRIVE_UPLOAD_BANDWIDTH bytes/s).
+    
+    Returns:
+        BandwidthLimiter: The limiter shared by every Drive upload
+    """
+    global _bandwidth_limiter
+    
+    with _drive_pool_lock:
+        if _bandwidth_limiter is None:
+            _bandwidth_limiter = BandwidthLimiter(
+                int(CONFIG.get('DRIVE_UPLOAD_BANDWIDTH') or 0)
+            )
+        return _bandwidth_limiter
+
+def _upload_media(drive_service, file_path, file_metadata, chunk_size, progress_callback):
+    """
+    Send a file to Drive chunk by chunk, resuming any journaled session for it.
+    
+    Every chunk is charged to the process-wide bandwidth budget before it is
+    sent, and the MD5 Drive reports for the stored file is checked against
+    the bytes that were sent.
+    
+    Returns:
+        dict: The created file resource (the 'id' and 'md5Checksum' fields)
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+    
+    bandwidth_limiter = get_bandwidth_limiter()
+    
+    def before_chunk(num_bytes):
+        bandwidth_limiter.consume(num_bytes)
+        tracing.count('upload_bytes', num_bytes, destination='drive')
+    
+    with UploadBody(file_path) as body:
+        def new_request():
+            media = MediaIoBaseUpload(
+                body,
+                mimetype='video/mp4',
+                chunksize=chunk_size,
+                resumable=True
+            )
+            return drive_service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id,md5Checksum'
+            )
         
-        drive_service.permissions().create(
-            fileId=file_id,
-            body=permission
-        ).execute()
+        with tracing.span('upload', destination='drive'):
+            file = run_resumable_upload(
+                new_request,
+                get_upload_journal(),
+                journal_key('drive', file_path),
+                progress_callback=progress_callback,
+                before_chunk=before_chunk
+            )
+        _check_md5(body, file)
+        return file
+
+def _check_md5(body, file):
+    """
+    Raise IOError if Drive stored different bytes from those that were sent.
+    
+    Resumed uploads only sent part of the file and can't be checked.
+    """
+    sent = body.hexdigest('md5')
+    stored = file.get('md5Checksum')
+    if sent and stored and sent != stored:
+        raise IOError(f"Google Drive stored {body.path} with MD5 {stored}, but {sent} was sent")
+
+def get_share_mode():
+    """
+    Return how uploaded files are made public (DRIVE_SHARE_MODE).
+    
+    Returns:
+        str: "file" grants a permission per upload, "batch" lets upload_many grant
+            permissions in batch requests, "folder" shares GOOGLE_DRIVE_FOLDER_ID once
+    """
+    share_mode = (CONFIG.get('DRIVE_SHARE_MODE') or 'file').lower()
+    if share_mode not in ('file', 'batch', 'folder'):
+        raise ValueError("DRIVE_SHARE_MODE must be one of: file, batch, folder")
+    return share_mode
+
+def _execute_batch(drive_pool, drive_service, requests):
+    """
+    Execute Drive API calls as batch HTTP requests of up to DRIVE_BATCH_LIMIT calls.
+    
+    Args:
+        drive_pool (DriveClientPool): Pool the client was leased from
+        drive_service: A leased Drive client
+        requests (list): (request_id, HttpRequest) pairs
         
-        # Get the shareable link
-        share_link = f"https://drive.google.com/file/d/{file_id}/view"
+    Returns:
+        dict: request_id -> (response, exception); exactly one of the two is None
+    """
+    results = {}
+    
+    def callback(request_id, response, exception):
+        results[request_id] = (response, exception)
+    
+    for start in range(0, len(requests), DRIVE_BATCH_LIMIT):
+        batch = drive_pool.new_batch(drive_service, callback)
+        for request_id, request in requests[start:start + DRIVE_BATCH_LIMIT]:
+            batch.add(request, request_id=request_id)
+        with tracing.span('batch', service='drive'):
+            batch.execute()
+    
+    return results
+
+def share_files(file_ids):
+    """
+    Make several Drive files publicly viewable using batched permission grants.
+    
+    Args:
+        file_ids (list): IDs of the files to share
         
-        logger.info(f"Successfully uploaded file to Google Drive. ID: {file_id}, Link: {share_link}")
+    Returns:
+        dict: file_id -> exception raised for that grant, or None on success
+    """
+    file_ids = list(file_ids)
+    if not file_ids:
+        return {}
+    
+    drive_pool = get_drive_pool()
+    with drive_pool.client() as drive_service:
+        results = _execute_batch(drive_pool, drive_service, [
+            (file_id, drive_service.permissions().create(
+                fileId=file_id,
+                body=PUBLIC_PERMISSION,
+                fields='id'
+            ))
+            for file_id in file_ids
+        ])
+    
+    return {file_id: error for file_id, (_, error) in results.items()}
+
+def get_files_metadata(file_ids, fields='id, name, size, trashed'):
+    """
+    Fetch metadata for several Drive files using batched requests.
+    
+    Args:
+        file_ids (list): IDs of the files to look up
+        fields (str): Drive fields selector for each file
+        
+    Returns:
+        dict: file_id -> (metadata, exception); exactly one of the two is None
+    """
+    file_ids = list(file_ids)
+    if not file_ids:
+        return {}
+    
+    drive_pool = get_drive_pool()
+    with drive_pool.client() as drive_service:
+        return _execute_batch(drive_pool, drive_service, [
+            (file_id, drive_service.files().get(fileId=file_id, fields=fields))
+            for file_id in file_ids
+        ])
+
+_shared_folders = set()
+_shared_folders_lock = threading.Lock()
+
+def _share_folder_once(drive_service, folder_id):
+    # Files inherit the folder's "anyone with the link" permission, so one grant covers them all
+    with _shared_folders_lock:
+        if folder_id in _shared_folders:
+            return
         
-        return file_id, share_link
+        with tracing.span('permission_grant', service='drive', scope='folder'):
+            drive_service.permissions().create(
+                fileId=folder_id,
+                body=PUBLIC_PERMISSION,
+                fields='id'
+            ).execute(num_retries=GRANT_RETRIES)
         
-    except HttpError as error:
-        logger.error(f"Google Drive API error: {error}", exc_info=True)
-        raise
-    except Exception as e:
-        logger.error(f"Error uploading to Google Drive: {str(e)}", exc_info=True)
-        raise
+        _shared_folders.add(folder_id)
+        logger.info(f"Shared Google Drive folder {folder_id} with anyone who has the link")
+
+_upload_cache = None
+
+def get_upload_cache():
+    """
+    Return the process-wide dedup index, or None when DRIVE_DEDUP is disabled.
+    
+    Returns:
+        UploadCache: Digest -> (file_id, share_link) index shared by every upload
+    """
+    global _upload_cache
+    
+    if str(CONFIG.get('DRIVE_DEDUP', True)).lower() != 'true':
+        return None
+    
+    with _drive_pool_lock:
+        if _upload_cache is None:
+            _upload_cache = UploadCache(
+                CONFIG.get('DRIVE_UPLOAD_CACHE_PATH') or BASE_DIR / ".drive_upload_cache.json",
+                max_entries=int(CONFIG.get('DRIVE_UPLOAD_CACHE_SIZE', 1000)),
+                ttl=float(CONFIG.get('DRIVE_UPLOAD_CACHE_TTL_DAYS', 30)) * 24 * 60 * 60
+            )
+        return _upload_cache
+
+def verify_upload_cache():
+    """
+    Drop dedup entries whose Drive file has been deleted or trashed.
+    
+    Returns:
+        int: Number of entries removed
+    """
+    from googleapiclient.errors import HttpError
+    
+    upload_cache = get_upload_cache()
+    if upload_cache is None:
+        return 0
+    
+    stale = []
+    for file_id, (metadata, error) in get_files_metadata(upload_cache.file_ids(), fields='id, trashed').items():
+        if error is not None:
+            if isinstance(error, HttpError) and error.resp.status == 404:
+                stale.append(file_id)
+            else:
+                logger.warning(f"Could not verify Google Drive file {file_id}: {error}")
+        elif metadata.get('trashed'):
+            stale.append(file_id)
+    
+    removed = upload_cache.discard_file_ids(stale)
+    logger.info(f"Verified Google Drive upload cache, removed {removed} stale entries")
+    return removed
+
+def _file_metadata(file_path, file_name=None):
+    # If no file name is provided, use the original filename
+    if not file_name:
+        file_name = os.path.basename(file_path)
+    
+    # File metadata
+    file_metadata = {
+        'name': file_name,
+        'mimeType': 'video/mp4'
+    }
+    
+    # If a folder ID is specified in config, add it to the metadata
+    folder_id = CONFIG['GOOGLE_DRIVE_FOLDER_ID']
+    if folder_id:
+        file_metadata['parents'] = [folder_id]
+    return file_metadata
+
+def upload_to_drive(file_path, file_name=None, chunk_size=None, progress_callback=None, share=True):
+    """
+    Upload a file to Google Drive.
+    
+    Interrupted uploads are journaled and resume from the last committed chunk
+    the next time the same file is uploaded. Unless DRIVE_DEDUP is disabled, a
+    file whose contents were uploaded before returns the existing Drive file
+    (keeping its original name) without uploading again.
+    
+    Args:
+        file_path (str): Path to the file to upload
+        file_name (str, optional): Name to give the file on Drive (default: use original filename)
+        chunk_size (int, optional): Bytes per upload chunk (default: DRIVE_UPLOAD_CHUNK_SIZE)
+        progress_callback (callable, optional): Called with a resumable.UploadProgress
+            (bytes sent, total, bytes/s, ETA) after every chunk
+        share (bool): Make the file publicly viewable. When False the caller is
+            responsible for sharing it, e.g. with share_files()
+        
+    Returns:
+        tuple: (file_id, share_link)
+    """
+    from googleapiclient.errors import HttpError
+    
+    logger.info(f"Uploading file to Google Drive: {file_path}")
+    
+    with tracing.span('upload_to_drive') as root_span:
+        try:
+            drive_pool = get_drive_pool()
+            
+            # Reuse an earlier upload of identical content
+            upload_cache = get_upload_cache()
+            digest = upload_cache.digest(file_path) if upload_cache else None
+            cached = upload_cache.get(digest) if upload_cache else None
+            if cached and (cached['shared'] or not share):
+                root_span.set(dedup=True)
+                logger.info(f"File already on Google Drive. ID: {cached['file_id']}, Link: {cached['share_link']}")
+                return cached['file_id'], cached['share_link']
+            
+            file_metadata = _file_metadata(file_path, file_name)
+            folder_id = CONFIG['GOOGLE_DRIVE_FOLDER_ID']
+            
+            with drive_pool.client() as drive_service:
+                if cached:
+                    # Uploaded earlier without sharing; only the permission grant is missing
+                    file = {'id': cached['file_id']}
+                else:
+                    # Upload the file
+                    file = _upload_media(
+                        drive_service,
+                        file_path,
+                        file_metadata,
+                        normalize_chunk_size(chunk_size or CONFIG.get('DRIVE_UPLOAD_CHUNK_SIZE') or UPLOAD_CHUNK_SIZE),
+                        progress_callback
+                    )
+                
+                file_id = file.get('id')
+                
+                # Get the shareable link
+                share_link = f"https://drive.google.com/file/d/{file_id}/view"
+                
+                if upload_cache and not cached:
+                    # Recorded before sharing, so a failed grant is all the next call redoes
+                    upload_cache.put(digest, file_id, share_link, shared=False)
+                
+                # Make the file publicly accessible for viewing
+                if share and folder_id and get_share_mode() == 'folder':
+                    _share_folder_once(drive_service, folder_id)
+                elif share:
+                    with tracing.span('permission_grant', service='drive', scope='file'):
+                        drive_service.permissions().create(
+                            fileId=file_id,
+                            body=PUBLIC_PERMISSION
+                        ).execute(num_retries=GRANT_RETRIES)
+            
+            if upload_cache and share:
+                upload_cache.put(digest, file_id, share_link, shared=True)
+            
+            logger.info(f"Successfully uploaded file to Google Drive. ID: {file_id}, Link: {share_link}")
+            
+            return file_id, share_link
+            
+        except HttpError as error:
+            logger.error(f"Google Drive API error: {error}", exc_info=True)
+            raise
+        except Exception as e:
+            logger.error(f"Error uploading to Google Drive: {str(e)}", exc_info=True)
+            raise
+
+async def _drive_request_async(session, method, url, headers, **kwargs):
+    from modules.retry import PlatformError
+    
+    async with session.request(method, url, headers=headers, **kwargs) as response:
+        body = await response.text()
+        if response.status != 200:
+            raise PlatformError('drive', response.status, body, response.headers)
+        return response.headers, json.loads(body) if body else {}
+
+async def _grant_async(session, url, headers):
+    # Retried like execute(num_retries=GRANT_RETRIES): 5xx and 429 with exponential backoff
+    import asyncio
+    
+    for attempt in range(GRANT_RETRIES + 1):
+        try:
+            return await _drive_request_async(session, 'POST', url, headers, json=PUBLIC_PERMISSION)
+        except Exception as error:
+            status = getattr(error, 'status', None) or 0
+            if attempt == GRANT_RETRIES or not (status == 429 or status >= 500):
+                raise
+            await asyncio.sleep(random.random() * 2 ** attempt)
+
+async def upload_to_drive_async(file_path, file_name=None, chunk_size=None, progress_callback=None, share=True,
+                                body=None):
+    """
+    Upload a file to Google Drive from a coroutine.
+    
+    The asyncio counterpart of upload_to_drive, with the same arguments and
+    result. It shares the upload journal, dedup cache and bandwidth budget
+    with the sync path, but talks to the Drive REST API over the event loop's
+    aiohttp session and streams the file from disk, so hundreds of uploads can
+    run on one loop without a thread or a whole chunk in memory each.
+    
+    Pass body (a TeeSink) to send bytes read once for several destinations
+    instead of reading the file separately; see tee_upload.
+    
+    Returns:
+        tuple: (file_id, share_link)
+    """
+    import asyncio
+    
+    logger.info(f"Uploading file to Google Drive: {file_path}")
+    
+    with tracing.span('upload_to_drive', mode='async') as root_span:
+        try:
+            drive_pool = get_drive_pool()
+            
+            # Reuse an earlier upload of identical content
+            upload_cache = get_upload_cache()
+            digest = await asyncio.to_thread(upload_cache.digest, file_path) if upload_cache else None
+            cached = upload_cache.get(digest) if upload_cache else None
+            if cached and (cached['shared'] or not share):
+                root_span.set(dedup=True)
+                logger.info(f"File already on Google Drive. ID: {cached['file_id']}, Link: {cached['share_link']}")
+                return cached['file_id'], cached['share_link']
+            
+            file_metadata = _file_metadata(file_path, file_name)
+            folder_id = CONFIG['GOOGLE_DRIVE_FOLDER_ID']
+            
+            # Token refreshes are rare and short, so they may borrow a thread
+            credentials = await asyncio.to_thread(drive_pool.credentials)
+            headers = {'Authorization': f"Bearer {credentials.token}"}
+            api_url, upload_url = drive_pool.api_urls()
+            session = get_async_session()
+            
+            if cached:
+                # Uploaded earlier without sharing; only the permission grant is missing
+                file_id = cached['file_id']
+            else:
+                async def start_session():
+                    response_headers, _ = await _drive_request_async(
+                        session, 'POST', f"{upload_url}/files?uploadType=resumable&fields=id,md5Checksum", headers,
+                        json=file_metadata
+                    )
+                    return response_headers['Location']
+                
+                bandwidth_limiter = get_bandwidth_limiter()
+                
+                async def before_chunk(num_bytes):
+                    await bandwidth_limiter.consume_async(num_bytes)
+                    tracing.count('upload_bytes', num_bytes, destination='drive')
+                
+                with tracing.span('upload', destination='drive'), \
+                        UploadBody(file_path) if body is None else body as body:
+                    file = await run_resumable_upload_async(
+                        session,
+                        start_session,
+                        body,
+                        get_upload_journal(),
+                        journal_key('drive', file_path),
+                        normalize_chunk_size(chunk_size or CONFIG.get('DRIVE_UPLOAD_CHUNK_SIZE') or UPLOAD_CHUNK_SIZE),
+                        headers,
+                        progress_callback=progress_callback,
+                        before_chunk=before_chunk
+                    )
+                    _check_md5(body, file)
+                file_id = file.get('id')
+            
+            # Get the shareable link
+            share_link = f"https://drive.google.com/file/d/{file_id}/view"
+            
+            if upload_cache and not cached:
+                # Recorded before sharing, so a failed grant is all the next call redoes
+                upload_cache.put(digest, file_id, share_link, shared=False)
+            
+            # Make the file publicly accessible for viewing
+            if share and folder_id and get_share_mode() == 'folder':
+                def share_folder():
+                    with drive_pool.client() as drive_service:
+                        _share_folder_once(drive_service, folder_id)
+                
+                # Done once per process, so the sync client is good enough
+                await asyncio.to_thread(share_folder)
+            elif share:
+                with tracing.span('permission_grant', service='drive', scope='file'):
+                    await _grant_async(session, f"{api_url}/files/{file_id}/permissions", headers)
+            
+            if upload_cache and share:
+                upload_cache.put(digest, file_id, share_link, shared=True)
+            
+            logger.info(f"Successfully uploaded file to Google Drive. ID: {file_id}, Link: {share_link}")
+            
+            return file_id, share_link
+            
+        except Exception as e:
+            logger.error(f"Error uploading to Google Drive: {str(e)}", exc_info=True)
+            raise
+
+def _share_uploaded(results):
+    """
+    Grant public access to a group of finished uploads in batch requests.
+    
+    Yields:
+        DriveUploadResult: The same results, with error set where the grant failed
+    """
+    errors = share_files(result.file_id for result in results)
+    
+    upload_cache = get_upload_cache()
+    if upload_cache:
+        upload_cache.mark_shared(file_id for file_id, error in errors.items() if error is None)
+    
+    for result in results:
+        error = errors.get(result.file_id)
+        if error is not None:
+            logger.error(f"Error sharing Google Drive file {result.file_id}: {error}")
+            result = result._replace(error=error)
+        yield result
+
+def upload_many(file_paths, max_workers=4):
+    """
+    Upload several files to Google Drive concurrently.
+    
+    Uploads share the process-wide Drive client pool and bandwidth budget, so
+    effective concurrency is also bounded by DRIVE_CLIENT_POOL_SIZE. With
+    DRIVE_SHARE_MODE=batch, permission grants are deferred and sent in batch
+    requests of up to DRIVE_BATCH_LIMIT files, and results are yielded once
+    their batch has been shared.
+    
+    Args:
+        file_paths (iterable): Paths of the files to upload
+        max_workers (int): Maximum number of uploads in flight
+        
+    Yields:
+        DriveUploadResult: One per file, in completion order. On success error is
+            None; on failure error holds the exception. file_id and share_link are
+            set whenever the upload itself succeeded.
+    """
+    batch_shares = get_share_mode() == 'batch'
+    unshared = []
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='drive-upload') as executor:
+        futures = {
+            executor.submit(upload_to_drive, file_path, share=not batch_shares): file_path
+            for file_path in file_paths
+        }
+        
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                file_id, share_link = future.result()
+            except Exception as e:
+                yield DriveUploadResult(file_path, None, None, e)
+                continue
+            
+            result = DriveUploadResult(file_path, file_id, share_link, None)
+            if not batch_shares:
+                yield result
+                continue
+            
+            unshared.append(result)
+            if len(unshared) >= DRIVE_BATCH_LIMIT:
+                yield from _share_uploaded(unshared)
+                unshared = []
+    
+    if unshared:
+        yield from _share_uploaded(unshared)
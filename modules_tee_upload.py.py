@@ -0,0 +1,301 @@
+"""
+Uploads of one file to several destinations that share a single read of it.
+"""
+import logging
+
+from config import CONFIG
+from modules import tracing
+from modules.upload_body import DEFAULT_CHECKSUMS, UploadBody
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from disk at a time and handed to every destination
+TEE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# How far (in bytes) a destination may fall behind the fastest one before it
+# stops holding the others back and reads what it is missing from disk itself
+TEE_BUFFER_SIZE = 64 * 1024 * 1024
+
+class TeeReader:
+    """
+    Reads a file once, in order, on behalf of several concurrent uploads.
+
+    Every upload gets a TeeSink, which it uses like an UploadBody. Chunks
+    read from disk are kept until every sink that is keeping up has taken
+    them, so the file is read (and checksummed) once however many
+    destinations it goes to.
+
+    Each sink is allowed to fall up to buffer_size bytes behind the reader.
+    When the buffer is full and another sink is waiting for bytes that have
+    not been read yet, the slowest sinks are cut loose rather than stalling
+    everyone: from then on they take chunks from the buffer while they are
+    still there and read the rest from disk. The same goes for bytes a sink
+    sends again after a retry once the buffer has moved past them. Either
+    way only the missing range is read again, never the whole file.
+
+    All methods except close() must be called from the same event loop.
+    """
+
+    def __init__(self, path, chunk_size=TEE_CHUNK_SIZE, buffer_size=None, checksums=DEFAULT_CHECKSUMS):
+        """
+        Args:
+            path (str): File to upload
+            chunk_size (int): Bytes read from disk at a time
+            buffer_size (int, optional): Bytes a sink may lag behind the reader
+                (default: TEE_BUFFER_SIZE)
+            checksums (tuple): hashlib algorithm names to compute during the read
+        """
+        import asyncio
+
+        self.path = str(path)
+        self.chunk_size = chunk_size
+        self.buffer_size = max(chunk_size, int(buffer_size or CONFIG.get('TEE_BUFFER_SIZE') or TEE_BUFFER_SIZE))
+        self._body = UploadBody(path, checksums)
+        self.size = self._body.size
+        self.bytes_read = 0
+        # Chunk offset -> bytes, for chunks some attached sink hasn't taken yet
+        self._chunks = {}
+        self._read_offset = 0
+        # Attached sink -> the next offset it will ask for
+        self._cursors = {}
+        self._changed = asyncio.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self._chunks.clear()
+        self._body.close()
+
+    def sink(self, name):
+        """
+        Create the body for one destination's upload; call before run().
+        """
+        sink = TeeSink(self, name)
+        self._cursors[sink] = 0
+        return sink
+
+    def hexdigest(self, name):
+        """
+        Return the hex digest of the whole file, or None until it has all been read.
+        """
+        return self._body.hexdigest(name)
+
+    async def run(self):
+        """
+        Read the file into the buffer as the sinks need it, until it has all been read or every sink is done.
+        """
+        import asyncio
+
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(self._can_read)
+                    if not self._cursors or self._read_offset >= self.size:
+                        return
+                    offset = self._read_offset
+
+                data = await asyncio.to_thread(self._read, offset, min(self.chunk_size, self.size - offset))
+                self.bytes_read += len(data)
+
+                async with self._changed:
+                    self._chunks[offset] = data
+                    self._read_offset += len(data)
+                    self._evict()
+                    self._changed.notify_all()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                logger.warning(f"Reading {self.path} failed, uploads will read it themselves: {str(e)}")
+            # Release sinks waiting on the reader; they fall back to reading from disk
+            async with self._changed:
+                self._cursors.clear()
+                self._changed.notify_all()
+            raise
+        finally:
+            tracing.count('read_bytes', self.bytes_read, reader='tee')
+
+    async def take(self, sink, offset, end):
+        """
+        Return the bytes of the file from offset up to at most end, reading them from disk only if they aren't buffered.
+        """
+        import asyncio
+
+        async with self._changed:
+            if sink in self._cursors:
+                self._cursors[sink] = offset
+                self._evict()
+                self._changed.notify_all()
+                await self._changed.wait_for(lambda: sink not in self._cursors or offset < self._read_offset)
+
+            chunk_offset = offset - offset % self.chunk_size
+            data = self._chunks.get(chunk_offset)
+            if data is not None:
+                stop = min(end, chunk_offset + len(data))
+                return memoryview(data)[offset - chunk_offset:stop - chunk_offset]
+
+        # Cut loose for lagging, or sending bytes again that the buffer no longer has
+        stop = min(end, chunk_offset + self.chunk_size)
+        sink.bytes_reread += stop - offset
+        return await asyncio.to_thread(self._read, offset, stop - offset)
+
+    async def detach(self, sink):
+        """
+        Stop buffering for sink, e.g. because its upload has finished.
+        """
+        async with self._changed:
+            if self._cursors.pop(sink, None) is not None:
+                self._evict()
+                self._changed.notify_all()
+
+    def _can_read(self):
+        if not self._cursors or self._read_offset >= self.size:
+            return True
+
+        slowest = min(self._cursors.values())
+        if self._read_offset - slowest < self.buffer_size:
+            return True
+
+        # The buffer is full. If some sink is waiting for the next chunk, the
+        # slowest ones are holding it up: let them fend for themselves
+        if max(self._cursors.values()) >= self._read_offset:
+            for sink, cursor in list(self._cursors.items()):
+                if cursor == slowest:
+                    logger.info(
+                        f"Upload to {sink.name} fell {self._read_offset - cursor} bytes behind, "
+                        f"reading the rest of {self.path} separately"
+                    )
+                    del self._cursors[sink]
+            self._evict()
+            return True
+
+        return False
+
+    def _evict(self):
+        # Drop chunks every attached sink has moved past
+        low = min(self._cursors.values()) if self._cursors else self._read_offset
+        for chunk_offset in [o for o, data in self._chunks.items() if o + len(data) <= low]:
+            del self._chunks[chunk_offset]
+
+    def _read(self, offset, length):
+        # Copy the range out of the mapping; runs in a worker thread so page faults don't block the loop
+        return b''.join(self._body.pieces(offset, length))
+
+class TeeSink:
+    """
+    One destination's view of a TeeReader.
+
+    It has the parts of the UploadBody interface that run_resumable_upload_async
+    uses (size, stream() and hexdigest()), so it can be passed wherever an
+    async upload takes a body.
+    """
+
+    def __init__(self, tee, name):
+        self.name = name
+        self.size = tee.size
+        self.bytes_reread = 0
+        self._tee = tee
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __len__(self):
+        return self.size
+
+    async def stream(self, offset=0, length=None):
+        """
+        Yield the bytes of the file from offset, length bytes in all (default: to the end).
+        """
+        end = self.size if length is None else min(self.size, offset + length)
+        while offset < end:
+            piece = await self._tee.take(self, offset, end)
+            yield piece
+            offset += len(piece)
+
+    def hexdigest(self, name):
+        return self._tee.hexdigest(name)
+
+    async def close(self):
+        await self._tee.detach(self)
+
+async def tee_upload(file_path, uploads, chunk_size=TEE_CHUNK_SIZE, buffer_size=None, checksums=DEFAULT_CHECKSUMS):
+    """
+    Run several uploads of one file at once, reading it from disk once.
+
+    Args:
+        file_path (str): File to upload
+        uploads (dict): Destination name -> coroutine function that takes the
+            body to send (a TeeSink) and uploads it
+        chunk_size (int): Bytes read from disk at a time
+        buffer_size (int, optional): Bytes an upload may lag behind the fastest
+            one before it reads on its own (default: TEE_BUFFER_SIZE)
+        checksums (tuple): hashlib algorithm names to compute during the read
+
+    Returns:
+        dict: Destination name -> what its upload returned, or the exception it raised
+    """
+    import asyncio
+
+    with tracing.span('tee_upload', destinations=','.join(uploads)) as tee_span, \
+            TeeReader(file_path, chunk_size, buffer_size, checksums) as tee:
+        sinks = {name: tee.sink(name) for name in uploads}
+
+        async def run(name, upload):
+            try:
+                return await upload(sinks[name])
+            finally:
+                await sinks[name].close()
+
+        reader = asyncio.create_task(tee.run())
+        try:
+            results = await asyncio.gather(
+                *(run(name, upload) for name, upload in uploads.items()),
+                return_exceptions=True
+            )
+        finally:
+            if not reader.done():
+                reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+        bytes_reread = sum(sink.bytes_reread for sink in sinks.values())
+        for sink in sinks.values():
+            tracing.count('reread_bytes', sink.bytes_reread, destination=sink.name)
+        tee_span.set(bytes_read=tee.bytes_read, bytes_reread=bytes_reread)
+        logger.info(
+            f"Uploaded {file_path} to {len(uploads)} destinations reading {tee.bytes_read + bytes_reread} bytes "
+            f"({bytes_reread} re-read by lagging uploads)"
+        )
+
+    return dict(zip(uploads, results))
+
+async def upload_to_drive_and_youtube_async(video_path, title, description, file_name=None, share=True):
+    """
+    Upload a video to Google Drive and post it to YouTube, reading it from disk once.
+
+    Both uploads run concurrently and are fed from one read of the file; see
+    storage.upload_to_drive_async and social_media.post_to_youtube_async for
+    how each behaves.
+
+    Returns:
+        dict: {'drive': (file_id, share_link) or the exception raised,
+               'youtube': PostResult}
+    """
+    import asyncio
+    from modules import social_media
+    from modules.storage import upload_to_drive_async
+    from modules.upload_cache import memoized_digest
+
+    # The dedup lookup and the idempotency key both need the content digest
+    # before anything is sent; compute it once here rather than in both at once
+    await asyncio.to_thread(memoized_digest, video_path)
+
+    return await tee_upload(video_path, {
+        'drive': lambda body: upload_to_drive_async(video_path, file_name, share=share, body=body),
+        'youtube': lambda body: social_media.post_to_youtube_async(video_path, title, description, body=body)
+    })
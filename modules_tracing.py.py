@@ -0,0 +1,291 @@
+"""
+Lightweight spans and metrics for the upload, caption and posting pipeline.
+"""
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from pathlib import Path
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Prefix of every exported Prometheus metric
+METRIC_PREFIX = 'automation'
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+class _NoopSpan:
+    """
+    Stand-in returned by span() while tracing is disabled; every method does nothing.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    """
+    A timed phase of the pipeline, e.g. one permission grant or one post request.
+
+    Spans nest: a span started inside another records it as its parent and
+    shares its trace ID. On exit the duration is added to the span metrics
+    and the span is written to the JSONL trace file, if one is configured.
+    """
+
+    __slots__ = ('name', 'attributes', 'trace_id', 'span_id', 'parent_id', 'start', 'duration', 'error', '_token', '_started')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.error = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = uuid.uuid4().hex[:16]
+        self._token = _current_span.set(self)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._started
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _tracer.finish(self)
+        return False
+
+    def set(self, **attributes):
+        """
+        Add attributes to the span, e.g. sizes or IDs known only part-way through.
+        """
+        self.attributes.update(attributes)
+
+class Tracer:
+    """
+    Aggregates finished spans and counters and exports them.
+
+    Span durations are kept as Prometheus summaries (count and sum) per span
+    name and label set; counters are plain totals. Both are rendered by
+    render_prometheus(), and finished spans are optionally appended to a
+    JSON Lines file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._span_metrics = {}
+        self._counters = {}
+        self._trace_file = None
+
+    def open_trace_file(self, path):
+        with self._lock:
+            if self._trace_file:
+                self._trace_file.close()
+            self._trace_file = open(path, 'a', encoding='utf-8', buffering=1) if path else None
+
+    def finish(self, span):
+        labels = _labels(span.attributes)
+        with self._lock:
+            metric = self._span_metrics.setdefault((span.name, labels), [0, 0.0, 0])
+            metric[0] += 1
+            metric[1] += span.duration
+            if span.error:
+                metric[2] += 1
+
+            if self._trace_file:
+                self._trace_file.write(json.dumps({
+                    'trace': span.trace_id,
+                    'span': span.span_id,
+                    'parent': span.parent_id,
+                    'name': span.name,
+                    'start': round(span.start, 6),
+                    'duration': round(span.duration, 6),
+                    'error': span.error,
+                    'attributes': span.attributes
+                }, default=str) + '\n')
+
+    def count(self, name, value, attributes):
+        key = (name, _labels(attributes))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def render_prometheus(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            span_metrics = sorted(self._span_metrics.items())
+            counters = sorted(self._counters.items())
+
+        lines = [
+            f"# HELP {METRIC_PREFIX}_span_seconds Time spent in each pipeline phase",
+            f"# TYPE {METRIC_PREFIX}_span_seconds summary"
+        ]
+        for (name, labels), (count, total, _) in span_metrics:
+            label_text = _label_text((('span', name),) + labels)
+            lines.append(f"{METRIC_PREFIX}_span_seconds_count{label_text} {count}")
+            lines.append(f"{METRIC_PREFIX}_span_seconds_sum{label_text} {total:.6f}")
+
+        lines.append(f"# TYPE {METRIC_PREFIX}_span_errors_total counter")
+        for (name, labels), (_, _, errors) in span_metrics:
+            lines.append(f"{METRIC_PREFIX}_span_errors_total{_label_text((('span', name),) + labels)} {errors}")
+
+        names = sorted({name for (name, _), _ in counters})
+        for name in names:
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+            for (counter_name, labels), value in counters:
+                if counter_name == name:
+                    lines.append(f"{METRIC_PREFIX}_{name}_total{_label_text(labels)} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._span_metrics.clear()
+            self._counters.clear()
+
+def _labels(attributes):
+    # Only short scalar attributes become metric labels; the rest stay in the trace file
+    return tuple(sorted(
+        (key, str(value)) for key, value in attributes.items()
+        if isinstance(value, (str, bool)) and len(str(value)) <= 64
+    ))
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+_tracer = Tracer()
+_enabled = False
+_metrics_server = None
+
+# With TRACING=true, tracing starts on the first span() or count() rather than
+# at import, so importing a module never opens the trace file or a port
+_autostart = str(CONFIG.get('TRACING', False)).lower() == 'true'
+_autostart_lock = threading.Lock()
+
+def _start_from_config():
+    global _autostart
+
+    with _autostart_lock:
+        if not _autostart:
+            return
+        # Cleared first so a failure isn't retried on every span
+        _autostart = False
+        try:
+            enable(
+                CONFIG.get('TRACE_PATH') or BASE_DIR / ".traces.jsonl",
+                CONFIG.get('METRICS_PORT') or None
+            )
+        except (OSError, ValueError) as e:
+            # A taken port or unwritable trace file must not fail the upload or post being traced
+            logger.error(f"Could not start tracing, continuing without it: {str(e)}")
+            disable()
+
+def span(name, **attributes):
+    """
+    Time a phase of the pipeline.
+
+    Use as a context manager. While tracing is disabled this returns a shared
+    no-op object, so the cost is one function call and a couple of global
+    lookups. With TRACING=true the first call starts tracing.
+
+    Args:
+        name (str): Phase name, e.g. "permission_grant"
+        **attributes: Labels such as platform="youtube"; strings become metric labels
+    """
+    if not _enabled:
+        if not _autostart:
+            return _NOOP_SPAN
+        _start_from_config()
+    return Span(name, attributes)
+
+def count(name, value, **attributes):
+    """
+    Add value to a counter, e.g. count("upload_bytes", n, destination="drive").
+    """
+    if _autostart and not _enabled:
+        _start_from_config()
+    if _enabled and value:
+        _tracer.count(name, value, attributes)
+
+def render_prometheus():
+    """
+    Return the current metrics in the Prometheus text format.
+    """
+    return _tracer.render_prometheus()
+
+def is_enabled():
+    return _enabled
+
+def enable(trace_path=None, metrics_port=None):
+    """
+    Start recording spans and counters.
+
+    Args:
+        trace_path (str, optional): Append finished spans to this JSON Lines file
+        metrics_port (int, optional): Serve /metrics in Prometheus format on 127.0.0.1:port
+    """
+    global _enabled, _metrics_server, _autostart
+
+    _autostart = False
+    _tracer.open_trace_file(trace_path)
+    if metrics_port and _metrics_server is None:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        _metrics_server = ThreadingHTTPServer(('127.0.0.1', int(metrics_port)), MetricsHandler)
+        _metrics_server.daemon_threads = True
+        threading.Thread(target=_metrics_server.serve_forever, name='metrics', daemon=True).start()
+        logger.info(f"Serving metrics on http://127.0.0.1:{metrics_port}/metrics")
+
+    _enabled = True
+
+def disable():
+    """
+    Stop recording, close the trace file and stop the metrics server.
+    """
+    global _enabled, _metrics_server, _autostart
+
+    _enabled = False
+    _autostart = False
+    _tracer.open_trace_file(None)
+    if _metrics_server is not None:
+        _metrics_server.shutdown()
+        _metrics_server.server_close()
+        _metrics_server = None
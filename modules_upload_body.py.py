@@ -0,0 +1,180 @@
+"""
+Streaming upload bodies: memory-mapped video files sent in fixed-size pieces.
+"""
+import os
+import mmap
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bytes handed to the HTTP layer at a time
+PIECE_SIZE = 256 * 1024
+
+# Checksums computed while uploading; Drive reports the MD5 of what it stored
+DEFAULT_CHECKSUMS = ('md5',)
+
+class UploadBody:
+    """
+    A file to upload, memory-mapped and read in pieces while checksums are computed.
+
+    The body can be used in two ways:
+
+    - As a seekable read-only file object, for googleapiclient's
+      MediaIoBaseUpload and requests, which read it a few KiB at a time.
+    - With pieces() or stream(), which yield memoryviews of the mapping for
+      byte ranges, e.g. the chunks of a resumable upload sent with aiohttp.
+
+    Either way the file is never read into memory as a whole: only the bytes
+    the HTTP layer is about to send are copied or viewed. Pages are read
+    ahead before they are needed and dropped from the mapping once sent, so
+    resident memory stays flat however large the file is and however many
+    bodies are open.
+
+    Checksums cover the file in order, so bytes that are sent again after a
+    retry are not counted twice. They are complete once every byte has been
+    sent at least once; see hexdigest().
+    """
+
+    def __init__(self, path, checksums=DEFAULT_CHECKSUMS, piece_size=PIECE_SIZE):
+        """
+        Args:
+            path (str): File to upload
+            checksums (tuple): hashlib algorithm names to compute while sending
+            piece_size (int): Bytes per piece yielded by pieces()
+        """
+        self.path = str(path)
+        self.piece_size = piece_size
+        self._file = open(self.path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # An empty file can't be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._advise('MADV_SEQUENTIAL', 0, self.size)
+        self._position = 0
+        self._released = 0
+        self._hashes = {name: hashlib.new(name) for name in checksums}
+        self._hashed = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A transport still holds a view of the last piece; the mapping
+                # is released once that view is gone
+                pass
+            self._map = None
+        self._file.close()
+
+    # File object interface
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def read(self, size=-1):
+        start = min(self._position, self.size)
+        end = self.size if size is None or size < 0 else min(self.size, start + size)
+        if start == end:
+            return b''
+        data = self._map[start:end]
+        self._position = end
+        self._account(start, data)
+        self._release_before(start)
+        return data
+
+    # Piece interface
+
+    def pieces(self, offset=0, length=None):
+        """
+        Yield memoryviews covering length bytes from offset, at most piece_size each.
+
+        Args:
+            offset (int): First byte to yield
+            length (int, optional): Bytes to yield (default: to the end of the file)
+        """
+        end = self.size if length is None else min(self.size, offset + length)
+        self._advise('MADV_WILLNEED', offset, end)
+
+        view = memoryview(self._map) if self._map is not None else None
+        try:
+            while offset < end:
+                piece = view[offset:min(end, offset + self.piece_size)]
+                self._account(offset, piece)
+                yield piece
+                self._release_before(offset)
+                offset += len(piece)
+        finally:
+            if view is not None:
+                view.release()
+
+    async def stream(self, offset=0, length=None):
+        """
+        pieces() as an async iterator, which is what aiohttp streams request bodies from.
+        """
+        for piece in self.pieces(offset, length):
+            yield piece
+
+    def hexdigest(self, name):
+        """
+        Return the hex digest of the whole file, or None until every byte has been sent.
+        """
+        with self._lock:
+            if self._hashed < self.size:
+                return None
+            return self._hashes[name].hexdigest()
+
+    def _account(self, start, data):
+        # Hash only the part of data that extends what has been hashed so far
+        with self._lock:
+            if start <= self._hashed < start + len(data):
+                new = memoryview(data)[self._hashed - start:]
+                for checksum in self._hashes.values():
+                    checksum.update(new)
+                self._hashed += len(new)
+                new.release()
+
+    def _release_before(self, offset):
+        # Unmap pages that have been sent so they stop counting towards resident
+        # memory; the kernel keeps them in the page cache for a retry
+        offset -= offset % mmap.PAGESIZE
+        if offset - self._released >= self.piece_size:
+            self._advise('MADV_DONTNEED', self._released, offset)
+            self._released = offset
+
+    def _advise(self, name, start, end):
+        # madvise is a hint; platforms without it (or without this advice) just skip it
+        advice = getattr(mmap, name, None)
+        if advice is None or self._map is None or end <= start:
+            return
+        # Ranges must start on a page boundary
+        start -= start % mmap.PAGESIZE
+        try:
+            self._map.madvise(advice, start, end - start)
+        except (OSError, ValueError) as e:
+            logger.debug(f"madvise failed for {self.path}: {str(e)}")
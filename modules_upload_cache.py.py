@@ -0,0 +1,185 @@
+"""
+Content-addressed index of files that have already been uploaded.
+"""
+import os
+import mmap
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Bytes hashed per update() call while streaming a memory-mapped file
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+def file_digest(file_path):
+    """
+    Compute the SHA-256 of a file by streaming over a memory map of it.
+
+    Args:
+        file_path (str): Path to the file
+
+    Returns:
+        str: Hex digest of the file contents
+    """
+    sha256 = hashlib.sha256()
+
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for offset in range(0, size, HASH_CHUNK_SIZE):
+                        sha256.update(view[offset:offset + HASH_CHUNK_SIZE])
+
+    return sha256.hexdigest()
+
+# Digests already computed by this process, keyed by (path, size, mtime)
+MAX_MEMOIZED_DIGESTS = 1000
+_digests = {}
+_digests_lock = threading.Lock()
+
+def memoized_digest(file_path):
+    """
+    Return file_digest(file_path), reusing an earlier result while the file is unchanged.
+
+    The dedup cache and the idempotency keys of posts both identify a video by
+    this digest, so sharing the memo means each video is hashed once per
+    process rather than once per consumer.
+    """
+    stat = os.stat(file_path)
+    stat_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+    digest = _digests.get(stat_key)
+    if digest is None:
+        digest = file_digest(file_path)
+        with _digests_lock:
+            if len(_digests) >= MAX_MEMOIZED_DIGESTS:
+                _digests.clear()
+            _digests[stat_key] = digest
+
+    return digest
+
+class UploadCache:
+    """
+    Persistent LRU map of content digest -> (file_id, share_link).
+
+    Entries expire ttl seconds after they were stored, and the least recently
+    used entries are evicted once there are more than max_entries. Digests are
+    memoized per (path, size, mtime) so an unchanged file is only hashed once
+    per process.
+    """
+
+    def __init__(self, path, max_entries=1000, ttl=30 * 24 * 60 * 60):
+        """
+        Args:
+            path (str): Location of the JSON index file
+            max_entries (int): Maximum number of entries kept
+            ttl (float): Seconds an entry stays valid after it was stored
+        """
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def digest(self, file_path):
+        """
+        Return the SHA-256 of file_path, reusing the last result if the file is unchanged.
+        """
+        return memoized_digest(file_path)
+
+    def get(self, digest):
+        """
+        Look up a digest.
+
+        Returns:
+            dict: {'file_id', 'share_link', 'shared', 'stored'} or None on a miss
+        """
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(digest)
+            if entry is None:
+                return None
+
+            if time.time() - entry['stored'] > self.ttl:
+                del entries[digest]
+                self._save()
+                return None
+
+            entries.move_to_end(digest)
+            return dict(entry)
+
+    def put(self, digest, file_id, share_link, shared=True):
+        """
+        Record an uploaded file, evicting the least recently used entries if needed.
+        """
+        with self._lock:
+            entries = self._load()
+            entries[digest] = {
+                'file_id': file_id,
+                'share_link': share_link,
+                'shared': shared,
+                'stored': time.time()
+            }
+            entries.move_to_end(digest)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._save()
+
+    def mark_shared(self, file_ids):
+        """
+        Flag entries whose Drive files have since been made public.
+        """
+        file_ids = set(file_ids)
+        with self._lock:
+            entries = self._load()
+            for entry in entries.values():
+                if entry['file_id'] in file_ids:
+                    entry['shared'] = True
+            self._save()
+
+    def file_ids(self):
+        """
+        Return the Drive file IDs of every entry.
+        """
+        with self._lock:
+            return [entry['file_id'] for entry in self._load().values()]
+
+    def discard_file_ids(self, file_ids):
+        """
+        Drop every entry pointing at one of file_ids.
+
+        Returns:
+            int: Number of entries removed
+        """
+        file_ids = set(file_ids)
+        with self._lock:
+            entries = self._load()
+            stale = [digest for digest, entry in entries.items() if entry['file_id'] in file_ids]
+            for digest in stale:
+                del entries[digest]
+            if stale:
+                self._save()
+            return len(stale)
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = OrderedDict(json.load(f))
+            except FileNotFoundError:
+                self._entries = OrderedDict()
+            except ValueError:
+                logger.warning(f"Ignoring corrupt upload cache: {self.path}")
+                self._entries = OrderedDict()
+        return self._entries
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
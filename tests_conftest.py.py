@@ -0,0 +1,24 @@
+"""
+Shared fixtures: every test gets its own state files and fresh module singletons.
+"""
+import pytest
+
+from config import CONFIG
+from modules import rate_limit, resumable, results, retry
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    for key, name in (
+        ('IDEMPOTENCY_LEDGER_PATH', 'post_ledger.json'),
+        ('RATE_LIMIT_LEDGER_PATH', 'quota_ledger.json'),
+        ('RESULTS_STORE_PATH', 'post_results.jsonl'),
+        ('UPLOAD_JOURNAL_PATH', 'upload_journal.json')
+    ):
+        monkeypatch.setitem(CONFIG, key, str(tmp_path / name))
+
+    monkeypatch.setattr(retry, '_ledger', None)
+    monkeypatch.setattr(retry, '_breakers', {})
+    monkeypatch.setattr(rate_limit, '_rate_limiter', None)
+    monkeypatch.setattr(results, '_results_store', None)
+    monkeypatch.setattr(resumable, '_journal', None)
+    return tmp_path
@@ -0,0 +1,63 @@
+"""
+Connection reuse of the pooled HTTP sessions, checked against a local stub server.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from modules import http
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the connection stays open between requests
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield server
+    finally:
+        http.close_sessions()
+        server.shutdown()
+        server.server_close()
+
+def test_same_host_reuses_session_and_connection(stub_server):
+    url = f"http://127.0.0.1:{stub_server.server_port}/ping"
+
+    first = http.get_session(url)
+    assert first.get(url).status_code == 200
+    second = http.get_session(url)
+    assert second.get(url).status_code == 200
+
+    assert first is second
+    assert stub_server.connections == 1
+
+def test_different_host_gets_separate_session(stub_server):
+    port = stub_server.server_port
+
+    ip_session = http.get_session(f"http://127.0.0.1:{port}/ping")
+    name_session = http.get_session(f"http://localhost:{port}/ping")
+
+    assert ip_session is not name_session
+    assert ip_session is http.get_session(f"http://127.0.0.1:{port}/other")
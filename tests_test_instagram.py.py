@@ -0,0 +1,113 @@
+"""
+Publishing Instagram Reels: container, processing poll and publish, with the Graph API faked.
+"""
+import asyncio
+
+import pytest
+
+from config import CONFIG
+from modules import retry, social_media
+from modules.retry import NotPublished, PlatformError
+
+GRAPH = 'https://graph.test/v18.0'
+
+class FakeGraph:
+    """
+    Stands in for _graph_request, answering each call from per-endpoint scripts.
+    """
+
+    def __init__(self, statuses=('FINISHED',), container=None):
+        self.calls = []
+        self.statuses = list(statuses)
+        self.container = container or {'id': 'container1'}
+        self.failures = {}
+
+    async def __call__(self, method, url, **kwargs):
+        endpoint = url.rsplit('/', 1)[1]
+        self.calls.append((method, endpoint, kwargs))
+        if endpoint in self.failures:
+            raise self.failures.pop(endpoint)
+        if endpoint == 'media':
+            return self.container
+        if endpoint == 'media_publish':
+            return {'id': 'media1'}
+        if method == 'GET':
+            return {'status_code': self.statuses.pop(0), 'status': 'Processing'}
+        return {'success': True}
+
+    def endpoints(self):
+        return [endpoint for _, endpoint, _ in self.calls]
+
+@pytest.fixture
+def graph(monkeypatch):
+    fake = FakeGraph()
+    monkeypatch.setattr(social_media, '_graph_request', fake)
+    monkeypatch.setattr(social_media, 'GRAPH_API_URL', GRAPH)
+    monkeypatch.setattr(social_media, 'INSTAGRAM_POLL_INITIAL_DELAY', 0.01)
+    monkeypatch.setattr(social_media, 'INSTAGRAM_POLL_MAX_DELAY', 0.01)
+    monkeypatch.setitem(CONFIG, 'INSTAGRAM_ACCESS_TOKEN', 'token')
+    monkeypatch.setitem(CONFIG, 'INSTAGRAM_USER_ID', 'ig1')
+    return fake
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(b'\0' * 1024)
+    return str(path)
+
+def test_reel_from_url_waits_for_processing_then_publishes(graph, video):
+    graph.statuses = ['IN_PROGRESS', 'IN_PROGRESS', 'FINISHED']
+
+    media_id = asyncio.run(social_media.publish_instagram_reel(video, 'caption', 'https://example.com/v.mp4'))
+
+    assert media_id == 'media1'
+    assert graph.endpoints() == ['media', 'container1', 'container1', 'container1', 'media_publish']
+    assert graph.calls[0][2]['data']['video_url'] == 'https://example.com/v.mp4'
+    assert graph.calls[-1][2]['data']['creation_id'] == 'container1'
+
+def test_reel_without_url_uploads_the_file_to_the_container(graph, video):
+    graph.container = {'id': 'container1', 'uri': 'https://rupload.test/ig-api-upload/v18.0/container1'}
+
+    media_id = asyncio.run(social_media.publish_instagram_reel(video, 'caption'))
+
+    assert media_id == 'media1'
+    assert graph.endpoints() == ['media', 'container1', 'container1', 'media_publish']
+    assert graph.calls[0][2]['data']['upload_type'] == 'resumable'
+    method, _, upload = graph.calls[1]
+    assert method == 'POST'
+    assert upload['headers']['file_size'] == '1024'
+
+def test_processing_timeout_is_not_published(graph, video, monkeypatch):
+    monkeypatch.setattr(social_media, 'INSTAGRAM_PROCESSING_TIMEOUT', 0)
+    graph.statuses = ['IN_PROGRESS']
+
+    with pytest.raises(NotPublished):
+        asyncio.run(social_media.publish_instagram_reel(video, 'caption', 'https://example.com/v.mp4'))
+
+    assert 'media_publish' not in graph.endpoints()
+
+def test_processing_error_is_raised(graph, video):
+    graph.statuses = ['ERROR']
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(social_media.publish_instagram_reel(video, 'caption', 'https://example.com/v.mp4'))
+
+    assert 'media_publish' not in graph.endpoints()
+
+@pytest.mark.parametrize('status, raised', [(503, NotPublished), (400, PlatformError)])
+def test_container_failures(graph, video, status, raised):
+    graph.failures['media'] = PlatformError('instagram', status)
+
+    with pytest.raises(raised):
+        asyncio.run(social_media.publish_instagram_reel(video, 'caption', 'https://example.com/v.mp4'))
+
+def test_post_is_retried_after_processing_timeout(graph, video, monkeypatch):
+    monkeypatch.setattr(retry, 'RETRY_POLICIES', dict(retry.RETRY_POLICIES, transient=retry.RetryPolicy(2, 0, 0)))
+    graph.failures['container1'] = NotPublished('container still processing')
+
+    result = social_media.post_to_instagram(video, 'caption', 'https://example.com/v.mp4')
+
+    assert result
+    assert result.remote_id == 'media1'
+    assert result.attempts == 2
+    assert graph.endpoints().count('media_publish') == 1
@@ -0,0 +1,39 @@
+"""
+Post jobs that run out of quota are deferred, not failed.
+"""
+import time
+
+import pytest
+
+from modules import job_queue
+from modules.rate_limit import QuotaExceeded
+from modules.results import PostResult
+
+def _post_stage(poster):
+    handlers = job_queue.publish_handlers(upload=None, caption=None, posters={'youtube': poster})
+    return handlers['post']
+
+def test_quota_failure_defers_the_job():
+    post = _post_stage(lambda payload: PostResult.failed('youtube', 'daily quota used', 'quota'))
+
+    with pytest.raises(QuotaExceeded) as raised:
+        post({'platform': 'youtube'})
+
+    assert raised.value.retry_at > time.time()
+
+def test_other_failures_use_up_an_attempt():
+    post = _post_stage(lambda payload: PostResult.failed('youtube', 'bad request', 'permanent', attempts=1))
+
+    with pytest.raises(RuntimeError):
+        post({'platform': 'youtube'})
+
+def test_quota_deferred_job_keeps_its_attempts(tmp_path):
+    queue = job_queue.JobQueue(tmp_path / 'jobs.sqlite3')
+    handlers = {'post': _post_stage(lambda payload: PostResult.failed('youtube', 'daily quota used', 'quota'))}
+    queue.enqueue('post', {'platform': 'youtube'}, max_attempts=1)
+
+    pool = job_queue.WorkerPool(queue, handlers, workers=1)
+    pool._run('worker', queue.claim('worker'))
+
+    assert queue.counts() == {job_queue.QUEUED: 1}
+    queue.close()
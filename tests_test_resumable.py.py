@@ -0,0 +1,160 @@
+"""
+The upload journal and resuming interrupted uploads, against a local resumable upload stub.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+import pytest
+
+from modules import resumable
+from modules.retry import NotPublished
+from modules.upload_body import UploadBody
+
+CHUNK_SIZE = resumable.CHUNK_ALIGNMENT
+
+class _StubUploadHandler(BaseHTTPRequestHandler):
+    # Follows the Google resumable upload protocol for a single session
+    protocol_version = 'HTTP/1.1'
+
+    def do_PUT(self):
+        server = self.server
+        content_range = self.headers['Content-Range']
+        server.ranges.append(content_range)
+        data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        if not content_range.startswith('bytes */'):
+            start = int(content_range.split(' ')[1].split('-')[0])
+            if start == server.drop_at:
+                # Hang up without answering, as a dropped connection would
+                server.drop_at = None
+                self.close_connection = True
+                return
+            if start == len(server.received):
+                server.received += data
+
+        total = int(content_range.rsplit('/', 1)[1])
+        if len(server.received) == total:
+            self._send(200, json.dumps({'id': 'file1'}).encode())
+        elif server.received:
+            self._send(308, headers={'Range': f"bytes=0-{len(server.received) - 1}"})
+        else:
+            self._send(308)
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def upload_server(monkeypatch):
+    monkeypatch.setattr(resumable, 'RETRY_BASE_DELAY', 0)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubUploadHandler)
+    server.daemon_threads = True
+    server.ranges = []
+    server.received = b''
+    server.drop_at = None
+    server.session_uri = f"http://127.0.0.1:{server.server_port}/upload?upload_id=1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(bytes(range(256)) * (3 * CHUNK_SIZE // 256))
+    return path
+
+def _upload(server, video, journal, max_retries=resumable.MAX_CHUNK_RETRIES):
+    sessions_started = []
+
+    async def start_session():
+        sessions_started.append(1)
+        return server.session_uri
+
+    async def upload():
+        async with aiohttp.ClientSession() as session:
+            with UploadBody(video) as body:
+                return await resumable.run_resumable_upload_async(
+                    session, start_session, body, journal, resumable.journal_key('drive', video),
+                    CHUNK_SIZE, max_retries=max_retries
+                )
+
+    return asyncio.run(upload()), len(sessions_started)
+
+def test_journal_round_trip(tmp_path):
+    path = tmp_path / 'journal.json'
+    resumable.UploadJournal(path).record('drive:a', 'https://upload/1', 1024)
+
+    entry = resumable.UploadJournal(path).get('drive:a')
+    assert entry['session_uri'] == 'https://upload/1'
+    assert entry['offset'] == 1024
+
+    resumable.UploadJournal(path).discard('drive:a')
+    assert resumable.UploadJournal(path).get('drive:a') is None
+
+def test_journal_ignores_expired_and_corrupt_entries(tmp_path, monkeypatch):
+    path = tmp_path / 'journal.json'
+    journal = resumable.UploadJournal(path)
+    journal.record('drive:a', 'https://upload/1', 1024)
+
+    recorded = time.time()
+    monkeypatch.setattr(time, 'time', lambda: recorded + resumable.SESSION_MAX_AGE)
+    assert journal.get('drive:a') is None
+
+    path.write_text('{not json')
+    assert journal.get('drive:a') is None
+
+def test_journal_key_changes_with_the_file(video):
+    key = resumable.journal_key('drive', video)
+
+    video.write_bytes(b'edited')
+
+    assert resumable.journal_key('drive', video) != key
+
+def test_interrupted_upload_resumes_from_the_journaled_session(upload_server, video):
+    journal = resumable.get_upload_journal()
+    key = resumable.journal_key('drive', video)
+    # The second chunk is lost and there are no retries left
+    upload_server.drop_at = CHUNK_SIZE
+
+    with pytest.raises(NotPublished):
+        _upload(upload_server, video, journal, max_retries=0)
+    entry = journal.get(key)
+    assert entry['session_uri'] == upload_server.session_uri
+    assert entry['offset'] == CHUNK_SIZE
+
+    upload_server.ranges.clear()
+    response, sessions_started = _upload(upload_server, video, journal)
+
+    assert response == {'id': 'file1'}
+    assert sessions_started == 0
+    # The server is asked where it got to before anything is sent again
+    assert upload_server.ranges[0] == f"bytes */{3 * CHUNK_SIZE}"
+    assert upload_server.ranges[1] == f"bytes {CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}/{3 * CHUNK_SIZE}"
+    assert upload_server.received == video.read_bytes()
+    assert journal.get(key) is None
+
+def test_dropped_chunk_is_retried_from_the_committed_offset(upload_server, video):
+    journal = resumable.get_upload_journal()
+    upload_server.drop_at = CHUNK_SIZE
+
+    response, sessions_started = _upload(upload_server, video, journal)
+
+    assert response == {'id': 'file1'}
+    assert sessions_started == 1
+    assert upload_server.ranges[2] == f"bytes */{3 * CHUNK_SIZE}"
+    assert upload_server.ranges[3] == f"bytes {CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}/{3 * CHUNK_SIZE}"
+    assert upload_server.received == video.read_bytes()
@@ -0,0 +1,197 @@
+"""
+Error classification, idempotency and circuit breaking of the posting retries.
+"""
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from config import CONFIG
+from modules import http, retry, social_media
+
+def test_async_connect_failure_is_transient():
+    async def connect():
+        async with aiohttp.ClientSession() as session:
+            with pytest.raises(aiohttp.ClientConnectorError) as raised:
+                await session.get('http://127.0.0.1:1/')
+        return raised.value
+
+    assert retry.classify_error(asyncio.run(connect())) == 'transient'
+
+@pytest.mark.parametrize('error', [
+    aiohttp.ServerDisconnectedError(),
+    aiohttp.ClientOSError(104, 'Connection reset by peer'),
+])
+def test_async_failures_mid_request_are_ambiguous(error):
+    assert retry.classify_error(error) == 'ambiguous'
+
+def test_refused_async_post_does_not_leave_key_pending(monkeypatch):
+    # Nothing listens on port 1, so every attempt fails to connect
+    monkeypatch.setattr(social_media, 'GRAPH_API_URL', 'http://127.0.0.1:1/v18.0')
+    monkeypatch.setattr(retry, 'RETRY_POLICIES', dict(retry.RETRY_POLICIES, transient=retry.RetryPolicy(2, 0, 0)))
+    monkeypatch.setitem(CONFIG, 'FACEBOOK_PAGE_ID', 'page')
+    monkeypatch.setitem(CONFIG, 'FACEBOOK_ACCESS_TOKEN', 'token')
+
+    async def post():
+        try:
+            return await social_media.post_to_facebook_async('https://example.com/v.mp4', 'caption')
+        finally:
+            await http.close_async_session()
+
+    result = asyncio.run(post())
+
+    assert not result
+    assert result.error_class == 'transient'
+    assert result.attempts == 2
+    key = retry.idempotency_key('facebook', 'https://example.com/v.mp4', 'caption')
+    assert retry.get_idempotency_ledger().get(key) is None
+
+@pytest.mark.parametrize('status', [500, 502, 504, 408])
+def test_server_errors_are_ambiguous_only_for_publishing_calls(status):
+    error = retry.PlatformError('facebook', status)
+
+    assert retry.classify_error(error) == 'transient'
+    assert retry.classify_error(error, idempotent=False) == 'ambiguous'
+
+def test_gateway_error_on_publish_is_not_resent():
+    attempts = []
+
+    def publish():
+        attempts.append(1)
+        raise retry.PlatformError('facebook', 502, 'Bad Gateway')
+
+    with pytest.raises(retry.PlatformError):
+        retry.run_with_retry('facebook', publish, key='k', idempotent=False)
+
+    assert len(attempts) == 1
+    assert retry.get_idempotency_ledger().get('k')['state'] == 'pending'
+    with pytest.raises(retry.AmbiguousPost):
+        retry.run_with_retry('facebook', publish, key='k', idempotent=False)
+    assert len(attempts) == 1
+
+def test_not_published_is_resent_even_for_publishing_calls():
+    attempts = []
+
+    def publish():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise retry.NotPublished('container still processing')
+        return {'id': 'media1'}
+
+    policies = dict(retry.RETRY_POLICIES, transient=retry.RetryPolicy(4, 0, 0))
+    assert retry.run_with_retry('instagram', publish, key='k', policies=policies, idempotent=False) == {'id': 'media1'}
+    assert len(attempts) == 2
+    assert retry.get_idempotency_ledger().get('k')['state'] == 'done'
+
+def test_ledger_persists_keys(tmp_path):
+    path = tmp_path / 'ledger.json'
+    retry.IdempotencyLedger(path).mark('k', 'pending')
+    retry.IdempotencyLedger(path).mark('done', 'done', {'id': 'post1'})
+
+    ledger = retry.IdempotencyLedger(path)
+    assert ledger.get('k')['state'] == 'pending'
+    assert ledger.get('done')['result'] == {'id': 'post1'}
+    assert ledger.get('other') is None
+
+def test_posted_key_is_not_posted_again():
+    attempts = []
+
+    def publish():
+        attempts.append(1)
+        return {'id': 'post1'}
+
+    assert retry.run_with_retry('facebook', publish, key='k') == {'id': 'post1'}
+    assert retry.run_with_retry('facebook', publish, key='k') == {'id': 'post1'}
+    assert len(attempts) == 1
+
+@pytest.mark.parametrize('posted, expected_attempts', [(True, 0), (False, 1)])
+def test_resolving_pending_key(posted, expected_attempts):
+    ledger = retry.get_idempotency_ledger()
+    ledger.mark('k', 'pending')
+    attempts = []
+
+    def publish():
+        attempts.append(1)
+        return {'id': 'post2'}
+
+    with pytest.raises(retry.AmbiguousPost):
+        retry.run_with_retry('facebook', publish, key='k')
+
+    ledger.resolve('k', posted, {'id': 'post1'})
+
+    retry.run_with_retry('facebook', publish, key='k')
+    assert len(attempts) == expected_attempts
+    assert ledger.get('k')['state'] == 'done'
+
+def test_ledger_forgets_old_keys(tmp_path, monkeypatch):
+    ledger = retry.IdempotencyLedger(tmp_path / 'ledger.json')
+    ledger.mark('old', 'done', {'id': 'post1'})
+
+    recorded = time.time()
+    monkeypatch.setattr(time, 'time', lambda: recorded + retry.IDEMPOTENCY_TTL + 1)
+    ledger.mark('new', 'done', {'id': 'post2'})
+
+    assert retry.IdempotencyLedger(tmp_path / 'ledger.json').get('old') is None
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = retry.CircuitBreaker('facebook', failure_threshold=3, reset_timeout=60)
+
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+
+    with pytest.raises(retry.CircuitOpen):
+        breaker.before_call()
+
+def test_breaker_lets_one_trial_through_after_reset_timeout(clock):
+    breaker = retry.CircuitBreaker('facebook', failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+
+    clock[0] += 60
+    breaker.before_call()
+    # Only one trial at a time
+    with pytest.raises(retry.CircuitOpen):
+        breaker.before_call()
+
+    # A failed trial opens the circuit for another reset_timeout
+    breaker.record_failure()
+    with pytest.raises(retry.CircuitOpen):
+        breaker.before_call()
+
+    clock[0] += 60
+    breaker.before_call()
+    breaker.record_success()
+    breaker.before_call()
+    breaker.before_call()
+
+def test_open_circuit_fails_fast_without_calling():
+    breaker = retry.CircuitBreaker('facebook', failure_threshold=1)
+    breaker.record_failure()
+    attempts = []
+    stats = {}
+
+    with pytest.raises(retry.CircuitOpen):
+        retry.run_with_retry('facebook', lambda: attempts.append(1), key='k', breaker=breaker, stats=stats)
+
+    assert attempts == []
+    assert stats['error_class'] == 'circuit_open'
+    assert retry.get_idempotency_ledger().get('k') is None
+
+def test_bad_requests_do_not_open_the_circuit():
+    breaker = retry.CircuitBreaker('facebook', failure_threshold=2)
+
+    def publish():
+        raise retry.PlatformError('facebook', 400, 'Invalid parameter')
+
+    for _ in range(3):
+        with pytest.raises(retry.PlatformError):
+            retry.run_with_retry('facebook', publish, breaker=breaker)
+
+    breaker.before_call()
@@ -0,0 +1,22 @@
+"""
+Starting tracing from the configuration on first use.
+"""
+import socket
+
+from config import CONFIG
+from modules import tracing
+
+def test_taken_metrics_port_does_not_fail_the_traced_call(tmp_path, monkeypatch):
+    with socket.socket() as taken:
+        taken.bind(('127.0.0.1', 0))
+        taken.listen()
+        monkeypatch.setitem(CONFIG, 'TRACE_PATH', str(tmp_path / 'traces.jsonl'))
+        monkeypatch.setitem(CONFIG, 'METRICS_PORT', str(taken.getsockname()[1]))
+        monkeypatch.setattr(tracing, '_autostart', True)
+
+        with tracing.span('upload', destination='drive'):
+            pass
+        tracing.count('upload_bytes', 1, destination='drive')
+
+    assert not tracing.is_enabled()
+    assert not tracing._autostart
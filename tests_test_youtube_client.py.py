@@ -0,0 +1,45 @@
+"""
+YouTubeClient credential loading and locking.
+"""
+import json
+import datetime
+import threading
+
+from config import CONFIG
+from modules import social_media
+
+def _client_with_token(tmp_path, monkeypatch, expiry):
+    credentials_path = tmp_path / 'youtube.json'
+    credentials_path.write_text(json.dumps({
+        'token': 'access',
+        'refresh_token': 'refresh',
+        'token_uri': 'http://127.0.0.1:1/token',
+        'client_id': 'id',
+        'client_secret': 'secret',
+        'expiry': expiry
+    }))
+    monkeypatch.setitem(CONFIG, 'YOUTUBE_OAUTH_CREDENTIALS', str(credentials_path))
+    return social_media.YouTubeClient()
+
+def test_expiry_with_utc_offset_is_usable(tmp_path, monkeypatch):
+    expiry = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    client = _client_with_token(tmp_path, monkeypatch, expiry.astimezone(
+        datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+    ).isoformat())
+
+    # A valid token is returned as is; refreshing would fail against port 1
+    credentials = client.credentials()
+
+    assert credentials.token == 'access'
+    assert credentials.expiry.tzinfo is None
+    assert abs(credentials.expiry - expiry.replace(tzinfo=None)) < datetime.timedelta(seconds=1)
+
+def test_credentials_do_not_wait_for_a_client_in_use(tmp_path, monkeypatch):
+    expiry = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    client = _client_with_token(tmp_path, monkeypatch, expiry.isoformat().replace('+00:00', 'Z'))
+    got = threading.Event()
+
+    # Stands in for a long sync upload holding the client
+    with client._client_lock:
+        threading.Thread(target=lambda: client.credentials() and got.set(), daemon=True).start()
+        assert got.wait(5)